@@ -0,0 +1,42 @@
+"""Add message timeline index
+
+Revision ID: 4f6b2c1d8e90
+Revises: 1a31ce608336
+Create Date: 2026-10-17 10:12:41.382915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f6b2c1d8e90'
+down_revision = '1a31ce608336'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 全新数据库尚未建表，索引由启动时的 create_all 随表一并创建
+    if not sa.inspect(op.get_bind()).has_table('Message_v2'):
+        return
+    # 在线建索引，避免长时间锁表
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_Message_v2_chat_id_created_at_id',
+            'Message_v2',
+            ['chat_id', 'created_at', 'id'],
+            unique=False,
+            if_not_exists=True,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_Message_v2_chat_id_created_at_id',
+            table_name='Message_v2',
+            if_exists=True,
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,42 @@
+"""Add chat history index
+
+Revision ID: 8d3e5a7b2c14
+Revises: 4f6b2c1d8e90
+Create Date: 2026-10-17 11:05:18.204637
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d3e5a7b2c14'
+down_revision = '4f6b2c1d8e90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 全新数据库尚未建表，索引由启动时的 create_all 随表一并创建
+    if not sa.inspect(op.get_bind()).has_table('Chat'):
+        return
+    # 在线建索引，避免长时间锁表
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_Chat_user_id_created_at_id',
+            'Chat',
+            ['user_id', sa.text('created_at DESC'), sa.text('id DESC')],
+            unique=False,
+            if_not_exists=True,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_Chat_user_id_created_at_id',
+            table_name='Chat',
+            if_exists=True,
+            postgresql_concurrently=True,
+        )
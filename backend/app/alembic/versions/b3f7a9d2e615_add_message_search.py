@@ -0,0 +1,141 @@
+"""Add message full-text search
+
+Revision ID: b3f7a9d2e615
+Revises: 8d3e5a7b2c14
+Create Date: 2026-10-17 14:05:12.604318
+
+"""
+import json
+
+import sqlalchemy as sa
+from alembic import op
+
+from utils.search_text import extract_text, to_search_text
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3f7a9d2e615'
+down_revision = '8d3e5a7b2c14'
+branch_labels = None
+depends_on = None
+
+
+# SQLite 回填检索文本时每批处理的消息数
+BACKFILL_BATCH_SIZE = 1000
+
+# SQLite：以消息表为外部内容的 FTS5 索引，由触发器在写入时维护
+SQLITE_FTS_STATEMENTS = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS "Message_v2_fts" USING fts5('
+    "search_text, content='Message_v2', content_rowid='rowid')",
+    'CREATE TRIGGER IF NOT EXISTS "Message_v2_fts_ai" AFTER INSERT ON "Message_v2" BEGIN '
+    'INSERT INTO "Message_v2_fts"(rowid, search_text) VALUES (new.rowid, new.search_text); END',
+    'CREATE TRIGGER IF NOT EXISTS "Message_v2_fts_ad" AFTER DELETE ON "Message_v2" BEGIN '
+    'INSERT INTO "Message_v2_fts"("Message_v2_fts", rowid, search_text) '
+    "VALUES ('delete', old.rowid, old.search_text); END",
+    'CREATE TRIGGER IF NOT EXISTS "Message_v2_fts_au" AFTER UPDATE OF search_text ON "Message_v2" BEGIN '
+    'INSERT INTO "Message_v2_fts"("Message_v2_fts", rowid, search_text) '
+    "VALUES ('delete', old.rowid, old.search_text); "
+    'INSERT INTO "Message_v2_fts"(rowid, search_text) VALUES (new.rowid, new.search_text); END',
+)
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    # 全新数据库尚未建表，检索列与索引由启动时的 create_all 随表一并创建
+    if not inspector.has_table('Message_v2'):
+        return
+    columns = {column['name'] for column in inspector.get_columns('Message_v2')}
+    if 'search_text' not in columns:
+        op.add_column('Message_v2', sa.Column('search_text', sa.Text(), nullable=True))
+    if op.get_bind().dialect.name == 'sqlite':
+        _upgrade_sqlite()
+    else:
+        _upgrade_postgresql()
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        for trigger in ('Message_v2_fts_ai', 'Message_v2_fts_ad', 'Message_v2_fts_au'):
+            op.execute(f'DROP TRIGGER IF EXISTS "{trigger}"')
+        op.execute('DROP TABLE IF EXISTS "Message_v2_fts"')
+        with op.batch_alter_table('Message_v2') as batch_op:
+            batch_op.drop_column('search_text')
+        return
+
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_Message_v2_search_vector',
+            table_name='Message_v2',
+            if_exists=True,
+            postgresql_concurrently=True,
+        )
+    op.drop_column('Message_v2', 'search_vector')
+    op.drop_column('Message_v2', 'search_text')
+
+
+def _upgrade_postgresql():
+    # 回填检索文本，规则与 utils.search_text.to_search_text 一致：小写、中日韩字符逐字切分
+    op.execute(
+        """
+        UPDATE "Message_v2" SET search_text = btrim(regexp_replace(regexp_replace(
+            lower(coalesce((
+                SELECT string_agg(btrim(part->>'text'), ' ')
+                FROM json_array_elements(parts) AS part
+                WHERE part->>'type' = 'text'
+            ), '')),
+            '([぀-ヿ㐀-䶿一-鿿가-힯豈-﫿])', ' \\1 ', 'g'),
+            '\\s+', ' ', 'g'))
+        WHERE search_text IS NULL
+        """
+    )
+    op.execute(
+        'ALTER TABLE "Message_v2" ADD COLUMN IF NOT EXISTS search_vector tsvector '
+        "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(search_text, ''))) STORED"
+    )
+    # 在线建索引，避免长时间锁表
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_Message_v2_search_vector',
+            'Message_v2',
+            ['search_vector'],
+            unique=False,
+            postgresql_using='gin',
+            if_not_exists=True,
+            postgresql_concurrently=True,
+        )
+
+
+def _upgrade_sqlite():
+    # SQLite 没有正则替换，检索文本按 rowid 分批在 Python 中生成
+    bind = op.get_bind()
+    last_rowid = 0
+    while True:
+        rows = bind.execute(
+            sa.text(
+                'SELECT rowid, parts FROM "Message_v2" '
+                'WHERE rowid > :last AND search_text IS NULL '
+                'ORDER BY rowid LIMIT :limit'
+            ),
+            {'last': last_rowid, 'limit': BACKFILL_BATCH_SIZE},
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            sa.text('UPDATE "Message_v2" SET search_text = :text WHERE rowid = :rowid'),
+            [
+                {'rowid': rowid, 'text': to_search_text(extract_text(_load_parts(parts)))}
+                for rowid, parts in rows
+            ],
+        )
+        last_rowid = rows[-1][0]
+
+    for statement in SQLITE_FTS_STATEMENTS:
+        op.execute(statement)
+    # 由已回填的检索文本重建索引
+    op.execute('INSERT INTO "Message_v2_fts"("Message_v2_fts") VALUES ' "('rebuild')")
+
+
+def _load_parts(parts):
+    if isinstance(parts, str):
+        return json.loads(parts)
+    return parts
@@ -0,0 +1,104 @@
+"""键集分页使用的不透明游标，签名后防止客户端篡改位置。"""
+
+from __future__ import annotations
+
+import uuid
+from datetime import datetime
+from typing import NamedTuple
+
+from itsdangerous import BadData, URLSafeSerializer
+
+from core.config import settings
+
+
+class InvalidCursorError(ValueError):
+    """游标无法解析或签名无效。"""
+
+
+class Cursor(NamedTuple):
+    """解析后的游标。"""
+
+    created_at: datetime
+    id: uuid.UUID
+    # 游标指向的页序号（从0开始），用于判断是否属于可缓存的前几页
+    page: int = 0
+
+    @property
+    def position(self) -> tuple[datetime, uuid.UUID]:
+        """键集比较使用的 ``(created_at, id)``。"""
+
+        return self.created_at, self.id
+
+
+def _serializer(scope: str) -> URLSafeSerializer:
+    """不同接口使用不同 salt，游标不能跨接口复用。"""
+
+    return URLSafeSerializer(settings.SECRET_KEY, salt=f"cursor:{scope}")
+
+
+def encode_cursor(
+    created_at: datetime, item_id: uuid.UUID, *, scope: str, page: int = 0
+) -> str:
+    """
+    将 ``(created_at, id)`` 编码为签名游标
+
+    :param created_at: 记录创建时间
+    :param item_id: 记录ID
+    :param scope: 游标所属接口
+    :param page: 游标指向的页序号
+    :return:
+    """
+    payload: list[str | int] = [created_at.isoformat(), str(item_id)]
+    if page:
+        payload.append(page)
+    return _serializer(scope).dumps(payload)
+
+
+def decode_cursor(cursor: str, *, scope: str) -> Cursor:
+    """
+    校验签名并解析游标
+
+    :param cursor: 由 ``encode_cursor`` 生成的游标
+    :param scope: 游标所属接口
+    :return:
+    """
+    try:
+        created_at, item_id, *rest = _serializer(scope).loads(cursor)
+        page = int(rest[0]) if rest else 0
+        return Cursor(datetime.fromisoformat(created_at), uuid.UUID(item_id), page)
+    except (BadData, ValueError, TypeError) as exc:
+        raise InvalidCursorError(str(exc)) from exc
+
+
+class ScoreCursor(NamedTuple):
+    """按相关度排序时解析后的游标。"""
+
+    score: float
+    id: uuid.UUID
+
+
+def encode_score_cursor(score: float, item_id: uuid.UUID, *, scope: str) -> str:
+    """
+    将 ``(score, id)`` 编码为签名游标
+
+    :param score: 相关度得分
+    :param item_id: 记录ID
+    :param scope: 游标所属接口
+    :return:
+    """
+    return _serializer(scope).dumps([float(score), str(item_id)])
+
+
+def decode_score_cursor(cursor: str, *, scope: str) -> ScoreCursor:
+    """
+    校验签名并解析相关度游标
+
+    :param cursor: 由 ``encode_score_cursor`` 生成的游标
+    :param scope: 游标所属接口
+    :return:
+    """
+    try:
+        score, item_id = _serializer(scope).loads(cursor)
+        return ScoreCursor(float(score), uuid.UUID(item_id))
+    except (BadData, ValueError, TypeError) as exc:
+        raise InvalidCursorError(str(exc)) from exc
@@ -1,14 +1,16 @@
-from collections.abc import AsyncGenerator
-from typing import Annotated
+from collections.abc import AsyncGenerator, Awaitable, Callable
+from typing import Annotated, Any
 
 import jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models import TokenPayload, User
+from app.services.llm import ChatStreamProvider, get_chat_provider
+from app.services.rate_limit import RateLimitExceeded, get_limiter
 from core import security
 from core.config import settings
 from database.db import get_db as get_async_db
@@ -20,6 +22,7 @@ reusable_oauth2 = OAuth2PasswordBearer(
 
 SessionDep = Annotated[AsyncSession, Depends(get_async_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
+ChatProviderDep = Annotated[ChatStreamProvider, Depends(get_chat_provider)]
 
 
 async def get_current_user(session: SessionDep, token: TokenDep) -> User:
@@ -83,3 +86,43 @@ def get_current_active_superuser(current_user: CurrentUser) -> User:
             status_code=403, detail="The user doesn't have enough privileges"
         )
     return current_user
+
+
+def rate_limit(
+    name: str,
+    surface: str | None = None,
+    *,
+    cost: Callable[[Request], Awaitable[int]] | None = None,
+) -> Any:
+    """
+    按 ``RATE_LIMITS[name]`` 对当前用户（JWT sub）限流的路由依赖
+
+    在认证查库之前执行，判定结果保存在 ``request.state.rate_limit`` 中，
+    由 ``RateLimitHeaderMiddleware`` 写入响应头；无效令牌交给认证依赖拒绝。
+
+    :param name: 限流名称
+    :param surface: 超限时错误码 ``rate_limit:<surface>`` 的对象，默认与名称相同
+    :param cost: 按请求计算消耗的令牌数，默认每个请求 1 个
+    :return:
+    """
+
+    async def check_rate_limit(request: Request, token: TokenDep) -> None:
+        limiter = get_limiter(name)
+        if limiter is None:
+            return
+        try:
+            payload = jwt.decode(
+                token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
+            )
+        except InvalidTokenError:
+            return
+        subject = payload.get("sub")
+        if not subject:
+            return
+        tokens = await cost(request) if cost is not None else 1
+        result = await limiter.hit(str(subject), tokens)
+        request.state.rate_limit = result
+        if not result.allowed:
+            raise RateLimitExceeded(surface or name, result)
+
+    return Depends(check_rate_limit)
@@ -5,8 +5,11 @@ from __future__ import annotations
 import logging
 from typing import Final
 
+from fastapi import Request
 from fastapi.responses import JSONResponse
 
+from app.services.rate_limit import RateLimitExceeded
+
 LOGGER = logging.getLogger("chat.errors")
 
 STATUS_CODE_BY_ERROR_TYPE: Final = {
@@ -56,6 +59,8 @@ MESSAGES_BY_CODE: Final = {
     "unauthorized:image_generation": "You need to sign in to generate images. Please sign in and try again.",
     "rate_limit:image_generation": "You have exceeded your image generation limit. Please try again later.",
     "offline:image_generation": "Image generation service is currently unavailable. Please try again later.",
+    "not_found:image_generation": "The requested image job was not found or has expired.",
+    "forbidden:image_generation": "This image job belongs to another user.",
     "unauthorized:content_rewrite": "You need to sign in to rewrite content. Please sign in and try again.",
     "rate_limit:content_rewrite": "You have exceeded your content rewriting limit. Please try again later.",
     "offline:content_rewrite": "Content rewriting service is currently unavailable. Please try again later.",
@@ -85,3 +90,11 @@ def error_response(error_code: str, cause: str | None = None) -> JSONResponse:
         status_code=status_code,
         content={"code": error_code, "message": message, "cause": cause},
     )
+
+
+async def rate_limit_exceeded_handler(
+    _request: Request, exc: RateLimitExceeded
+) -> JSONResponse:
+    """限流依赖抛出 ``RateLimitExceeded`` 时返回 ``rate_limit:<surface>`` 错误。"""
+
+    return error_response(f"rate_limit:{exc.surface}")
@@ -6,6 +6,8 @@ from app.api.routes import (
     chat,
     documents,
     files,
+    metrics,
+    search,
     social,
     suggestions,
     voting,
@@ -28,3 +30,5 @@ api_router.include_router(voting.router, tags=["Voting"])  # /api/vote (GET/PATC
 api_router.include_router(suggestions.router, tags=["Suggestions"])  # /api/suggestions
 api_router.include_router(social.router, tags=["Social"])  # /api/xhs/share-config
 api_router.include_router(auth.router, tags=["Authentication"])  # /api/auth/guest
+api_router.include_router(search.router, tags=["Search"])  # /api/search
+api_router.include_router(metrics.router, tags=["Metrics"])  # /api/metrics
@@ -1,108 +1,49 @@
-import os
+import math
+from collections.abc import AsyncIterator
 from typing import Any
 
-import httpx
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from msgspec import json
+from redis.exceptions import RedisError
 
-from app.api.deps import CurrentUser, SessionDep
+from app.api.deps import CurrentUser, SessionDep, rate_limit
+from app.api.errors import error_response
 from app.models import (
+    ContentRewriteBatchRequest,
     ContentRewriteRequest,
     ContentRewriteResponse,
     ImageGenerationRequest,
     ImageGenerationResponse,
 )
+from app.services import content_rewrite, image_jobs
+from app.services.image_generation import (
+    ImageGenerationError,
+    ImageProviderUnavailable,
+    generate_image_with_ai,
+)
+from common.log import log
+from core.config import settings
+from utils.sse import encode_event, sse_response
 
 router = APIRouter()
 
 
-def enhance_prompt_with_style(prompt: str, style: str) -> str:
-    """根据风格增强提示词"""
-    style_enhancements = {
-        "realistic": "photorealistic, high quality, detailed",
-        "artistic": "artistic, creative, expressive, painterly",
-        "cartoon": "cartoon style, animated, colorful, fun",
-        "abstract": "abstract art, conceptual, modern, artistic interpretation",
-    }
-
-    enhancement = style_enhancements.get(style, "")
-    return f"{prompt}, {enhancement}" if enhancement else prompt
-
-
-def map_size_to_silicon_flow(size: str) -> str:
-    """将尺寸映射到硅基流动支持的格式"""
-    size_map = {
-        "512x512": "768x1024",
-        "768x768": "768x1024",
-        "1024x1024": "1024x1024",
-    }
-    return size_map.get(size, "768x1024")
-
-
-class ImageGenerationError(RuntimeError):
-    """图片生成过程中产生的业务异常。"""
-
-
-async def generate_image_with_ai(prompt: str, style: str, size: str) -> dict[str, Any]:
-    """使用硅基流动API生成图片"""
-    api_key = os.getenv("OPENAI_API_KEY")
-    base_url = os.getenv("OPENAI_BASE_URL")
-
-    if not api_key or not base_url:
-        raise ImageGenerationError("Silicon Flow API key or base URL not configured")
-
-    # 根据style调整prompt
-    styled_prompt = enhance_prompt_with_style(prompt, style)
-
-    # 确保 baseURL 正确格式化，避免重复的 /v1
-    api_url = f"{base_url.rstrip('/v1')}/v1/images/generations"
-
-    # 硅基流动图片生成API调用
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        try:
-            response = await client.post(
-                api_url,
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": os.getenv(
-                        "OPENAI_IMAGE_MODEL_ID", "stabilityai/stable-diffusion-3-medium"
-                    ),
-                    "prompt": styled_prompt,
-                    "negative_prompt": "",
-                    "seed": 222,
-                    "image_size": map_size_to_silicon_flow(size),
-                },
-            )
-
-            if not response.is_success:
-                error_text = await response.aread()
-                raise ImageGenerationError(
-                    f"API错误: HTTP {response.status_code}: {error_text.decode()}"
-                )
-
-            data = response.json()
-            print(data)
-
-            if not data.get("data") or len(data["data"]) == 0:
-                raise ImageGenerationError("No image generated")
-
-            return data
-
-        except httpx.TimeoutException:
-            raise ImageGenerationError("图片生成超时，请稍后重试")
-        except httpx.RequestError as exc:
-            raise ImageGenerationError(f"网络请求错误: {exc}")
-
-
-@router.post("/generate-image", response_model=ImageGenerationResponse)
+@router.post(
+    "/generate-image",
+    response_model=ImageGenerationResponse,
+    dependencies=[rate_limit("image_generation")],
+)
 async def generate_image(
-    *, _db: SessionDep, _current_user: CurrentUser, request: ImageGenerationRequest
+    *,
+    current_user: CurrentUser,
+    request: ImageGenerationRequest,
+    async_job: bool = Query(False, alias="async"),
 ) -> Any:
     """
     根据文本描述生成图片
+
+    ``?async=true`` 时创建后台任务并立即返回 ``202``，通过任务接口查询结果。
     """
     if not request.prompt or request.prompt.strip() == "":
         return JSONResponse(
@@ -110,79 +51,216 @@ async def generate_image(
             content={"error": "Prompt is required"},
         )
 
+    style = request.style or "realistic"
+    size = request.size or "1024x1024"
+
+    if async_job:
+        try:
+            job = await image_jobs.submit(current_user.id, request.prompt, style, size)
+        except image_jobs.ImageJobQueueFull:
+            response = error_response(
+                "rate_limit:image_generation", "Too many pending image jobs."
+            )
+            response.headers["Retry-After"] = str(
+                settings.IMAGE_JOB_RETRY_AFTER_SECONDS
+            )
+            return response
+        except RedisError as exc:
+            log.warning("图片生成任务入队失败: {}", exc)
+            return error_response("offline:image_generation")
+        status_url = f"{settings.API_V1_STR}/generate-image/{job['id']}"
+        return JSONResponse(
+            status_code=202,
+            content={
+                "jobId": job["id"],
+                "status": job["status"],
+                "statusUrl": status_url,
+                "eventsUrl": f"{status_url}/events",
+            },
+            headers={"Location": status_url},
+        )
+
     try:
-        image_data = await generate_image_with_ai(
-            request.prompt,
-            request.style or "realistic",
-            request.size or "1024x1024",
+        image_data = await generate_image_with_ai(request.prompt, style, size)
+    except ImageProviderUnavailable as exc:
+        response = error_response("offline:image_generation", str(exc))
+        response.headers["Retry-After"] = str(
+            math.ceil(settings.IMAGE_PROVIDER_OPEN_SECONDS)
         )
+        return response
     except ImageGenerationError as exc:
         return JSONResponse(status_code=500, content={"error": str(exc)})
 
     response = ImageGenerationResponse(
         result=image_data,
         prompt=request.prompt,
-        style=request.style or "realistic",
-        size=request.size or "1024x1024",
+        style=style,
+        size=size,
     )
     return response
 
 
-@router.post("/rewrite-content", response_model=ContentRewriteResponse)
+async def _load_job(job_id: str, user_id: Any) -> dict[str, Any] | JSONResponse:
+    """读取任务并校验归属，失败时返回错误响应。"""
+
+    try:
+        job = await image_jobs.get_job(job_id)
+    except RedisError as exc:
+        log.warning("读取图片生成任务失败: {}", exc)
+        return error_response("offline:image_generation")
+    if job is None:
+        return error_response("not_found:image_generation")
+    if job["user_id"] != str(user_id):
+        return error_response("forbidden:image_generation")
+    return job
+
+
+@router.get("/generate-image/{job_id}")
+async def get_image_job(*, current_user: CurrentUser, job_id: str) -> Any:
+    """
+    查询图片生成任务的状态与结果
+    """
+    job = await _load_job(job_id, current_user.id)
+    if isinstance(job, JSONResponse):
+        return job
+    return image_jobs.to_public(job)
+
+
+@router.get("/generate-image/{job_id}/events")
+async def stream_image_job(
+    *, request: Request, current_user: CurrentUser, job_id: str
+) -> Any:
+    """
+    以SSE推送图片生成任务的状态变化，任务结束后关闭连接
+    """
+    job = await _load_job(job_id, current_user.id)
+    if isinstance(job, JSONResponse):
+        return job
+
+    async def event_generator() -> AsyncIterator[bytes]:
+        async for update in image_jobs.follow(job_id):
+            yield encode_event({"type": "job-status", **update})
+
+    return sse_response(
+        event_generator(),
+        heartbeat=settings.SSE_HEARTBEAT_SECONDS,
+        retry=settings.SSE_RETRY_MS,
+        request=request,
+    )
+
+
+@router.post(
+    "/rewrite-content",
+    response_model=ContentRewriteResponse,
+    dependencies=[rate_limit("content_rewrite")],
+)
 async def rewrite_content(
     *, _db: SessionDep, _current_user: CurrentUser, request: ContentRewriteRequest
 ) -> Any:
     """
     根据指定要求改写文本内容
     """
-    if not request.originalContent or not request.originalContent.strip():
+    try:
+        return await content_rewrite.rewrite(request)
+    except content_rewrite.ContentRewriteError as exc:
+        return JSONResponse(status_code=400, content={"error": str(exc)})
+    except Exception as exc:  # noqa: BLE001 - 返回统一错误提示
         return JSONResponse(
-            status_code=400,
-            content={"error": "Original content is required"},
+            status_code=500,
+            content={"error": f"文案改写失败: {exc}"},
         )
 
+
+@router.post("/rewrite-content/stream", dependencies=[rate_limit("content_rewrite")])
+async def stream_rewrite_content(
+    *,
+    _db: SessionDep,
+    _current_user: CurrentUser,
+    request: Request,
+    rewrite_request: ContentRewriteRequest,
+) -> Any:
+    """
+    以SSE流式返回改写结果，长文本无需等待全部改写完成即可开始显示
+
+    每段文本为 ``{"type": "text-delta", "delta"}``，结束时发送不含正文的
+    ``{"type": "finish", ...}``，出错时发送 ``{"type": "error", "errorText"}``。
+    """
     try:
-        original_content = request.originalContent
-        rewrite_type = request.rewriteType
-
-        if rewrite_type == "make_professional":
-            rewritten_content = f"专业化版本：{original_content}"
-        elif rewrite_type == "make_casual":
-            rewritten_content = f"口语化版本：{original_content}"
-        elif rewrite_type == "make_concise":
-            rewritten_content = original_content[:200].strip() + (
-                "..." if len(original_content) > 200 else ""
-            )
-        elif rewrite_type == "make_detailed":
-            rewritten_content = (
-                f"详细说明：{original_content}\n\n更多补充内容可在此处追加。"
-            )
-        elif rewrite_type == "improve_clarity":
-            rewritten_content = f"清晰表述：{original_content}"
-        elif rewrite_type == "make_persuasive":
-            rewritten_content = f"说服力增强：{original_content}"
-        elif rewrite_type == "change_tone":
-            tone = request.targetTone or "friendly"
-            rewritten_content = f"{tone} 语气的版本：{original_content}"
-        elif rewrite_type == "fix_grammar":
-            rewritten_content = f"语法优化：{original_content}"
-        elif rewrite_type == "translate_style":
-            rewritten_content = f"风格改写：{original_content}"
-        else:
-            rewritten_content = f"改写内容：{original_content}"
-
-        return ContentRewriteResponse(
-            success=True,
-            rewrittenContent=rewritten_content,
-            originalContent=original_content,
-            rewriteType=rewrite_type,
-            targetTone=request.targetTone,
-            targetAudience=request.targetAudience,
-            originalLength=len(original_content),
-            rewrittenLength=len(rewritten_content),
+        strategy = content_rewrite.resolve(rewrite_request)
+    except content_rewrite.ContentRewriteError as exc:
+        return JSONResponse(status_code=400, content={"error": str(exc)})
+
+    async def event_generator() -> AsyncIterator[bytes]:
+        chunks: list[str] = []
+        try:
+            async for delta in content_rewrite.stream_rewrite(
+                strategy, rewrite_request
+            ):
+                chunks.append(delta)
+                yield encode_event({"type": "text-delta", "delta": delta})
+        except Exception as exc:  # noqa: BLE001 - 以事件通知客户端
+            log.warning("文案流式改写失败: {}", exc)
+            yield encode_event({"type": "error", "errorText": f"文案改写失败: {exc}"})
+            return
+        response = content_rewrite.build_response(rewrite_request, "".join(chunks))
+        yield encode_event(
+            {
+                "type": "finish",
+                **response.model_dump(exclude={"originalContent", "rewrittenContent"}),
+            }
         )
-    except Exception as exc:  # noqa: BLE001 - 返回统一错误提示
+
+    return sse_response(
+        event_generator(),
+        heartbeat=settings.SSE_HEARTBEAT_SECONDS,
+        retry=settings.SSE_RETRY_MS,
+        request=request,
+    )
+
+
+async def _batch_item_count(request: Request) -> int:
+    """批量改写按条目数计入限流；请求体无效时按 1 计，由参数校验返回错误。"""
+
+    try:
+        payload = await request.json()
+    except ValueError:
+        return 1
+    items = payload.get("items") if isinstance(payload, dict) else None
+    if not isinstance(items, list):
+        return 1
+    return min(max(len(items), 1), settings.REWRITE_BATCH_MAX_ITEMS)
+
+
+@router.post(
+    "/rewrite-content/batch",
+    dependencies=[
+        rate_limit("content_rewrite_batch", "content_rewrite", cost=_batch_item_count)
+    ],
+)
+async def rewrite_content_batch(
+    *, _db: SessionDep, _current_user: CurrentUser, request: ContentRewriteBatchRequest
+) -> Any:
+    """
+    批量改写文本内容
+
+    整个批次只做一次认证，条目并发执行（最多 ``REWRITE_BATCH_CONCURRENCY`` 个），
+    结果按完成顺序以 NDJSON 逐行返回，每行带有条目在请求中的 ``index``；
+    单个条目失败时该行为 ``{"index", "success": false, "error"}``，不影响其他条目。
+    """
+    if not request.items:
+        return JSONResponse(status_code=400, content={"error": "Items are required"})
+    if len(request.items) > settings.REWRITE_BATCH_MAX_ITEMS:
         return JSONResponse(
-            status_code=500,
-            content={"error": f"文案改写失败: {exc}"},
+            status_code=400,
+            content={
+                "error": f"At most {settings.REWRITE_BATCH_MAX_ITEMS} items per batch"
+            },
         )
+
+    async def body() -> AsyncIterator[bytes]:
+        async for result in content_rewrite.rewrite_many(
+            request.items, settings.REWRITE_BATCH_CONCURRENCY
+        ):
+            yield json.encode(result) + b"\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
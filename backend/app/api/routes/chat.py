@@ -2,17 +2,27 @@
 
 from __future__ import annotations
 
-import json
+import math
+import re
 import uuid
 from collections.abc import AsyncGenerator
 from datetime import UTC, datetime, timedelta
-from typing import Any
-
-from fastapi import APIRouter, Query
-from fastapi.responses import Response, StreamingResponse
-from sqlalchemy import and_, func, select
-
-from app.api.deps import CurrentUser, SessionDep
+from typing import Any, Literal
+
+from fastapi import APIRouter, Header, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from msgspec import json
+from redis.exceptions import RedisError
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.cursor import (
+    Cursor,
+    InvalidCursorError,
+    decode_cursor,
+    encode_cursor,
+)
+from app.api.deps import ChatProviderDep, CurrentUser, SessionDep, rate_limit
 from app.api.errors import error_response
 from app.models import (
     Chat,
@@ -24,13 +34,33 @@ from app.models import (
     UserType,
     Visibility,
 )
+from app.services import (
+    admission,
+    chat_title,
+    history_cache,
+    quota,
+    response_cache,
+)
+from app.services.admission import AdmissionRejected
+from app.services.chat_generation import ChatGeneration, request_stop
+from app.services.chat_turn import ChatTurn
+from app.services.llm import trim_history
+from app.services.stream_store import RedisEventStream, chat_event_stream
+from app.services.write_behind import write_behind
+from common.log import log
+from core.config import settings
+from database.db import async_db_session
+from utils.search_text import extract_text
+from utils.sse import encode_event, sse_response
+from utils.stream_encoding import accepts_gzip, gzip_stream
+from utils.tokenizer import tokenizer
 
 router = APIRouter()
 
-MAX_MESSAGES_PER_DAY = {
-    "guest": 20,
-    "regular": 100,
-}
+STREAM_EVENT_ID_PATTERN = re.compile(r"\d+-\d+")
+
+HISTORY_CURSOR_SCOPE = "history"
+MESSAGE_CURSOR_SCOPE = "messages"
 
 
 def _utc_now() -> datetime:
@@ -39,30 +69,17 @@ def _utc_now() -> datetime:
     return datetime.now(UTC)
 
 
-def _format_sse(payload: dict[str, Any]) -> str:
-    """将字典序列化为SSE数据行。"""
-
-    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
-
-
-def _extract_text_content(parts: list[dict[str, Any]]) -> str:
-    """提取消息中的文本内容，用于生成标题与简单回复。"""
-
-    texts: list[str] = []
-    for part in parts:
-        if part.get("type") == "text":
-            text = str(part.get("text", "")).strip()
-            if text:
-                texts.append(text)
-    return " ".join(texts)
+def _sse_response(
+    source: AsyncGenerator[bytes, None], request: Request | None = None
+) -> StreamingResponse:
+    """聊天SSE响应，空闲时发送心跳并下发重连间隔，传入请求时检测客户端断开。"""
 
-
-def _generate_chat_title(message_text: str) -> str:
-    """根据首条消息生成聊天标题。"""
-
-    if not message_text:
-        return "新对话"
-    return message_text[:30]
+    return sse_response(
+        source,
+        heartbeat=settings.SSE_HEARTBEAT_SECONDS,
+        retry=settings.SSE_RETRY_MS,
+        request=request,
+    )
 
 
 async def _ensure_message_quota(
@@ -70,33 +87,15 @@ async def _ensure_message_quota(
 ) -> bool:
     """检查24小时内的用户消息数量是否超限。"""
 
-    window_start = _utc_now() - timedelta(hours=24)
-    # 转换为无时区的时间戳，避免PostgreSQL时区比较错误
-    window_start_naive = window_start.replace(tzinfo=None)
-    statement = (
-        select(func.count(Message.id))
-        .join(Chat, Chat.id == Message.chat_id)
-        .where(
-            and_(
-                Chat.user_id == user_id,
-                Message.role == MessageRole.USER,
-                Message.created_at >= window_start_naive,
-            )
-        )
-    )
-    result = await db.execute(statement)
-    count = result.scalar_one()
-    limit = MAX_MESSAGES_PER_DAY.get(user_type, MAX_MESSAGES_PER_DAY["regular"])
-    return count < limit
+    return await quota.has_message_quota(db, user_id, user_type)
 
 
 def _build_usage_payload(
-    model: ChatModelId, prompt: str, completion: str
+    model: ChatModelId, prompt_tokens: int, completion: str
 ) -> dict[str, Any]:
     """构造用量信息结构，字段与NextJS保持一致。"""
 
-    prompt_tokens = len(prompt.split())
-    completion_tokens = len(completion.split())
+    completion_tokens = tokenizer.count(completion)
     total_tokens = prompt_tokens + completion_tokens
     return {
         "modelId": model.value,
@@ -106,34 +105,44 @@ def _build_usage_payload(
     }
 
 
-async def _persist_assistant_message(
-    db: SessionDep,
-    chat_id: uuid.UUID,
-    text: str,
-) -> tuple[uuid.UUID, datetime]:
-    """保存AI回复消息并返回元数据。"""
-
-    message_id = uuid.uuid4()
-    created_at = _utc_now().replace(tzinfo=None)
-    assistant_message = Message(
-        id=message_id,
-        chat_id=chat_id,
-        role=MessageRole.ASSISTANT,
-        parts=[{"type": "text", "text": text}],
-        attachments=[],
-        created_at=created_at,
+async def _load_context_history(
+    db: SessionDep, chat_id: uuid.UUID
+) -> list[dict[str, Any]]:
+    """按时间正序读取聊天最近的消息，用于构造模型上下文。"""
+
+    result = await db.execute(
+        select(Message)
+        .where(Message.chat_id == chat_id)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(settings.CHAT_CONTEXT_MAX_MESSAGES)
     )
-    db.add(assistant_message)
-    await db.commit()
-    return message_id, created_at
+    history: list[dict[str, Any]] = []
+    messages = {message.id: message for message in result.scalars().all()}
+    for message in await write_behind.pending_messages(chat_id):
+        messages.setdefault(message.id, message)
+    recent = sorted(messages.values(), key=lambda item: (item.created_at, item.id))
+    for message in recent[-settings.CHAT_CONTEXT_MAX_MESSAGES :]:
+        content = extract_text(message.parts)
+        if content:
+            history.append(
+                {
+                    "id": message.id,
+                    "role": MessageRole(message.role).value,
+                    "content": content,
+                }
+            )
+    return history
 
 
-@router.post("/chat")
+@router.post("/chat", dependencies=[rate_limit("chat")])
 async def send_chat_message(
     *,
+    request: Request,
     db: SessionDep,
     current_user: CurrentUser,
+    provider: ChatProviderDep,
     chat_request: ChatRequest,
+    x_chat_cache: str | None = Header(None, alias=response_cache.BYPASS_HEADER),
 ) -> Response:
     """处理聊天消息并以SSE推送AI回复。"""
 
@@ -147,15 +156,19 @@ async def send_chat_message(
     if not await _ensure_message_quota(db, current_user.id, user_type):
         return error_response("rate_limit:chat")
 
-    message_text = _extract_text_content(chat_request.message.parts)
+    message_text = extract_text(chat_request.message.parts)
 
-    chat = await db.get(Chat, chat_request.id)
+    # 异步写入模式下聊天可能尚未落库
+    chat = await write_behind.pending_chat(chat_request.id) or await db.get(
+        Chat, chat_request.id
+    )
     if chat:
         if chat.user_id != current_user.id:
             return error_response("forbidden:chat")
+        turn = ChatTurn(db, chat, is_new=False)
     else:
         chat_create = ChatCreate(
-            title=_generate_chat_title(message_text),
+            title=chat_title.placeholder_title(message_text),
             visibility=chat_request.selectedVisibilityType,
         )
         chat = Chat.model_validate(
@@ -166,54 +179,128 @@ async def send_chat_message(
                 "created_at": _utc_now().replace(tzinfo=None),
             },
         )
-        db.add(chat)
-        await db.commit()
-
-    user_message = Message(
-        id=chat_request.message.id,
-        chat_id=chat.id,
-        role=chat_request.message.role,
-        parts=chat_request.message.parts,
-        attachments=[],
-        created_at=_utc_now().replace(tzinfo=None),
-    )
-    db.add(user_message)
-    await db.commit()
+        turn = ChatTurn(db, chat, is_new=True)
+
+    # 名额在保存用户消息前申请，排队失败时不会留下没有回复的消息
+    model = chat_request.selectedChatModel
+    try:
+        slot = await admission.admit(model, user_type)
+    except AdmissionRejected as exc:
+        response = error_response(
+            "rate_limit:chat", f"The selected model is busy ({exc.reason})."
+        )
+        response.headers["Retry-After"] = str(
+            math.ceil(settings.CHAT_ADMISSION_TIMEOUT_SECONDS)
+        )
+        return response
+
+    try:
+        user_message = Message(
+            id=chat_request.message.id,
+            chat_id=chat.id,
+            role=chat_request.message.role,
+            parts=chat_request.message.parts,
+            attachments=[],
+            created_at=_utc_now().replace(tzinfo=None),
+        )
+        turn.add_message(user_message)
+
+        # 聊天与用户消息在同一事务中提交，AI回复在生成结束后一次提交
+        await turn.commit()
+        if turn.is_new:
+            await history_cache.invalidate(current_user.id, "chat_created")
+            # 占位标题已随聊天保存，正式标题由后台任务生成，不影响本轮延迟
+            chat_title.schedule_title(
+                chat.id, current_user.id, message_text, chat.title, provider
+            )
+        await quota.record_user_message(
+            current_user.id, user_message.id, user_message.created_at
+        )
 
-    assistant_text = (
-        "收到消息：" + message_text if message_text else "我已收到你的消息。"
-    )
-    assistant_message_id, assistant_created_at = await _persist_assistant_message(
-        db, chat.id, assistant_text
-    )
+        event_stream: RedisEventStream | None = chat_event_stream(chat.id)
+        try:
+            await event_stream.reset(
+                {
+                    "user_id": str(chat.user_id),
+                    "visibility": Visibility(chat.visibility).value,
+                }
+            )
+        except RedisError as exc:
+            log.warning("聊天流续传记录不可用: {}", exc)
+            event_stream = None
+
+        if turn.is_new:
+            history = [
+                {
+                    "id": user_message.id,
+                    "role": MessageRole.USER.value,
+                    "content": message_text,
+                }
+            ]
+        else:
+            history = await _load_context_history(db, chat.id)
+        prompt_messages, prompt_tokens = trim_history(
+            history, settings.CHAT_CONTEXT_TOKENS
+        )
 
-    usage_payload = _build_usage_payload(
-        chat_request.selectedChatModel, message_text, assistant_text
-    )
-    chat.last_context = usage_payload
-    db.add(chat)
-    await db.commit()
+        cache_status: str | None = None
+        if settings.CHAT_RESPONSE_CACHE:
+            provider, cache_status = await response_cache.resolve_provider(
+                provider,
+                model,
+                prompt_messages,
+                bypass=(x_chat_cache or "").strip().lower() == "bypass",
+            )
 
-    assistant_payload = {
-        "id": str(assistant_message_id),
-        "role": "assistant",
-        "parts": [{"type": "text", "text": assistant_text}],
-        "metadata": {"createdAt": assistant_created_at.isoformat()},
-    }
+        generation = ChatGeneration(
+            chat_id=chat.id,
+            user_id=chat.user_id,
+            model=model,
+            provider=provider,
+            messages=prompt_messages,
+            usage_builder=lambda completion: _build_usage_payload(
+                model, prompt_tokens, completion
+            ),
+            buffer_size=settings.CHAT_STREAM_BUFFER_SIZE,
+            stream=event_stream,
+            disconnect_grace=settings.CHAT_DISCONNECT_GRACE_SECONDS,
+            on_finish=slot.release,
+        )
+        generation.start()
+    except BaseException:
+        slot.release()
+        raise
 
-    async def event_generator() -> AsyncGenerator[str, None]:
-        """逐步推送SSE事件。"""
+    async def event_generator() -> AsyncGenerator[bytes, None]:
+        """随模型生成逐步推送SSE事件。"""
 
-        yield _format_sse(
-            {"type": "data-appendMessage", "data": json.dumps(assistant_payload)}
-        )
-        yield _format_sse({"type": "data-usage", "data": usage_payload})
+        async for event_id, frame in generation.events():
+            yield encode_event(frame, event_id=event_id)
 
-    return StreamingResponse(
-        event_generator(),
-        media_type="text/event-stream",
-        headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
-    )
+    response = _sse_response(event_generator(), request)
+    if cache_status:
+        response.headers[response_cache.BYPASS_HEADER] = cache_status
+    return response
+
+
+@router.post("/chat/{chat_id}/stop")
+async def stop_chat_generation(
+    *,
+    db: SessionDep,
+    current_user: CurrentUser,
+    chat_id: uuid.UUID,
+) -> Any:
+    """停止聊天正在进行的AI回复，已生成的部分会被保存。"""
+
+    chat = await db.get(Chat, chat_id)
+    if not chat:
+        return error_response("not_found:chat")
+    if chat.user_id != current_user.id:
+        return error_response("forbidden:chat")
+
+    # 生成可能运行在其他进程，通过 Redis 广播停止请求
+    await request_stop(chat_id)
+    return JSONResponse(status_code=202, content={"chatId": str(chat_id)})
 
 
 @router.delete("/chat")
@@ -225,6 +312,10 @@ async def delete_chat(
 ) -> Any:
     """删除聊天并返回删除前的数据。"""
 
+    if settings.CHAT_WRITE_BEHIND:
+        # 先让排队中的写入落库，避免删除后再插入该聊天的消息
+        await write_behind.wait_idle(timeout=5)
+
     chat = await db.get(Chat, id)
     if not chat:
         return error_response("not_found:chat")
@@ -243,9 +334,47 @@ async def delete_chat(
     }
     await db.delete(chat)
     await db.commit()
+    await history_cache.invalidate(current_user.id, "chat_deleted")
+    try:
+        await chat_event_stream(id).clear()
+    except RedisError as exc:
+        log.warning("聊天流续传记录清理失败: {}", exc)
     return chat_public
 
 
+async def _history_position(
+    db: AsyncSession, value: str, parameter: str
+) -> tuple[tuple[Any, Any], int | None] | JSONResponse:
+    """
+    将分页参数解析为 ``(created_at, id)`` 位置与页序号
+
+    兼容旧版的聊天ID参数：查询锚点聊天的创建时间，聊天不存在时返回 ``not_found:chat``；
+    此时页序号未知，返回 None。
+
+    :param db: 数据库会话
+    :param value: 签名游标或聊天ID
+    :param parameter: 参数名，用于错误提示
+    :return:
+    """
+    try:
+        cursor = decode_cursor(value, scope=HISTORY_CURSOR_SCOPE)
+        return cursor.position, cursor.page
+    except InvalidCursorError:
+        pass
+
+    try:
+        anchor_id = uuid.UUID(value)
+    except ValueError:
+        return error_response("bad_request:api", f"Invalid {parameter} parameter.")
+
+    anchor_created_at = await db.scalar(
+        select(Chat.created_at).where(Chat.id == anchor_id)
+    )
+    if anchor_created_at is None:
+        return error_response("not_found:chat")
+    return (anchor_created_at, anchor_id), None
+
+
 @router.get("/history")
 async def get_chat_history(
     *,
@@ -255,7 +384,13 @@ async def get_chat_history(
     starting_after: str | None = None,
     ending_before: str | None = None,
 ) -> Any:
-    """分页返回用户聊天列表，与NextJS分页策略一致。"""
+    """
+    分页返回用户聊天列表，与NextJS分页策略一致
+
+    ``starting_after``/``ending_before`` 接受上一页返回的 ``nextCursor``，也兼容聊天ID；
+    分页条件为 ``(created_at, id)`` 行比较，命中 ``(user_id, created_at DESC, id DESC)`` 索引。
+    向后翻页的前几页结果缓存在 Redis 中。
+    """
 
     if starting_after and ending_before:
         return error_response(
@@ -263,33 +398,39 @@ async def get_chat_history(
             "Only one of starting_after or ending_before can be provided.",
         )
 
-    base_query = select(Chat).where(Chat.user_id == current_user.id)
+    statement = select(Chat).where(Chat.user_id == current_user.id)
+    position = tuple_(Chat.created_at, Chat.id)
+    page: int | None = 0
 
     if starting_after:
-        try:
-            anchor_id = uuid.UUID(starting_after)
-        except ValueError:
-            return error_response(
-                "bad_request:api", "Invalid starting_after parameter."
-            )
-        anchor_chat = await db.get(Chat, anchor_id)
-        if not anchor_chat:
-            return error_response("not_found:chat")
-        base_query = base_query.where(Chat.created_at > anchor_chat.created_at)
+        anchor = await _history_position(db, starting_after, "starting_after")
+        if isinstance(anchor, JSONResponse):
+            return anchor
+        statement = statement.where(position > tuple_(*anchor[0]))
+        page = None
 
     if ending_before:
-        try:
-            anchor_id = uuid.UUID(ending_before)
-        except ValueError:
-            return error_response("bad_request:api", "Invalid ending_before parameter.")
-        anchor_chat = await db.get(Chat, anchor_id)
-        if not anchor_chat:
-            return error_response("not_found:chat")
-        base_query = base_query.where(Chat.created_at < anchor_chat.created_at)
-
-    statement = base_query.order_by(Chat.created_at.desc()).limit(limit + 1)
+        anchor = await _history_position(db, ending_before, "ending_before")
+        if isinstance(anchor, JSONResponse):
+            return anchor
+        statement = statement.where(position < tuple_(*anchor[0]))
+        page = anchor[1]
+
+    cache_field = history_cache.page_field(limit, ending_before)
+    cacheable = history_cache.is_cacheable_page(page)
+    cache_version = None
+    if cacheable:
+        cached, cache_version = await history_cache.get_page(
+            current_user.id, cache_field
+        )
+        if cached is not None:
+            return Response(content=cached, media_type="application/json")
+
+    statement = statement.order_by(Chat.created_at.desc(), Chat.id.desc()).limit(
+        limit + 1
+    )
     result = await db.execute(statement)
-    chats = result.all()
+    chats = result.scalars().all()
 
     has_more = len(chats) > limit
     limited_chats = chats[:limit]
@@ -306,7 +447,22 @@ async def get_chat_history(
         }
         for item in limited_chats
     ]
-    return {"chats": payload, "hasMore": has_more}
+    next_cursor = (
+        encode_cursor(
+            limited_chats[-1].created_at,
+            limited_chats[-1].id,
+            scope=HISTORY_CURSOR_SCOPE,
+            page=page + 1 if page is not None else 0,
+        )
+        if limited_chats
+        else None
+    )
+    response = {"chats": payload, "hasMore": has_more, "nextCursor": next_cursor}
+    if cache_version is not None:
+        await history_cache.set_page(
+            current_user.id, cache_field, response, cache_version
+        )
+    return response
 
 
 @router.get("/chat/{chat_id}/stream")
@@ -315,8 +471,37 @@ async def resume_chat_stream(
     db: SessionDep,
     current_user: CurrentUser,
     chat_id: uuid.UUID,
+    last_event_id: str | None = Header(None, alias="Last-Event-ID"),
 ) -> Response:
-    """恢复最近一次AI回复的流式数据。"""
+    """恢复进行中或刚结束的AI回复流，支持从 Last-Event-ID 之后续传。"""
+
+    if last_event_id and not STREAM_EVENT_ID_PATTERN.fullmatch(last_event_id):
+        return error_response("bad_request:api", "Invalid Last-Event-ID header.")
+
+    event_stream = chat_event_stream(chat_id)
+    try:
+        stream_meta = await event_stream.get_meta()
+    except RedisError as exc:
+        log.warning("聊天流续传记录不可用: {}", exc)
+        stream_meta = {}
+
+    if stream_meta:
+        # 续传只依赖 Redis 中的归属信息，不查询聊天与消息
+        is_private = stream_meta.get("visibility") == Visibility.PRIVATE.value
+        if is_private and stream_meta.get("user_id") != str(current_user.id):
+            return error_response("forbidden:chat")
+
+        async def follow() -> AsyncGenerator[bytes, None]:
+            """从客户端最后收到的事件之后继续推送。"""
+
+            async for event_id, frame in event_stream.follow(
+                last_event_id,
+                block_ms=settings.CHAT_STREAM_BLOCK_MS,
+                idle_timeout=settings.CHAT_STREAM_IDLE_SECONDS,
+            ):
+                yield encode_event(frame, event_id=event_id)
+
+        return _sse_response(follow())
 
     chat = await db.get(Chat, chat_id)
     if not chat:
@@ -325,21 +510,23 @@ async def resume_chat_stream(
     if chat.visibility == Visibility.PRIVATE and chat.user_id != current_user.id:
         return error_response("forbidden:chat")
 
+    # 借助 (chat_id, created_at, id) 索引只读取最新一条消息
     message_stmt = (
         select(Message)
         .where(Message.chat_id == chat_id)
-        .order_by(Message.created_at.asc())
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(1)
     )
-    result = await db.execute(message_stmt)
-    messages = result.all()
-    if not messages:
+    last_message = (await db.execute(message_stmt)).scalars().first()
+    if not last_message:
         return Response(status_code=204)
 
-    last_message = messages[-1]
     if last_message.role != MessageRole.ASSISTANT:
         return Response(status_code=204)
 
-    if _utc_now() - last_message.created_at > timedelta(seconds=15):
+    if _utc_now().replace(tzinfo=None) - last_message.created_at > timedelta(
+        seconds=15
+    ):
         return Response(status_code=204)
 
     assistant_payload = {
@@ -349,11 +536,217 @@ async def resume_chat_stream(
         "metadata": {"createdAt": last_message.created_at.isoformat()},
     }
 
-    async def stream() -> AsyncGenerator[str, None]:
+    async def stream() -> AsyncGenerator[bytes, None]:
         """重播最近的AI消息。"""
 
-        yield _format_sse(
-            {"type": "data-appendMessage", "data": json.dumps(assistant_payload)}
+        yield encode_event(
+            {
+                "type": "data-appendMessage",
+                "data": json.encode(assistant_payload).decode(),
+            }
+        )
+
+    return _sse_response(stream())
+
+
+def _serialize_message(message: Message) -> dict[str, Any]:
+    """将消息转换为与NextJS一致的结构。"""
+
+    return {
+        "id": str(message.id),
+        "chatId": str(message.chat_id),
+        "role": message.role.value
+        if isinstance(message.role, MessageRole)
+        else message.role,
+        "parts": message.parts,
+        "attachments": message.attachments,
+        "createdAt": message.created_at.isoformat(),
+    }
+
+
+def _merge_pending_messages(
+    messages: list[Message],
+    pending: list[Message],
+    *,
+    cursor: Cursor | None,
+    ascending: bool,
+    limit: int,
+) -> list[Message]:
+    """将尚未落库的消息合并进分页结果，保证同一聊天读到自己的写入。"""
+
+    if not pending:
+        return messages
+    known = {message.id for message in messages}
+    for message in pending:
+        if message.id in known:
+            continue
+        # 与数据库查询一致的严格比较，游标指向的消息本身不再返回
+        position = (message.created_at, message.id)
+        if cursor and not (
+            position > cursor.position if ascending else position < cursor.position
+        ):
+            continue
+        messages.append(message)
+    messages.sort(key=lambda item: (item.created_at, item.id), reverse=not ascending)
+    return messages[:limit]
+
+
+@router.get("/chat/{chat_id}/messages")
+async def get_chat_messages(
+    *,
+    db: SessionDep,
+    current_user: CurrentUser,
+    chat_id: uuid.UUID,
+    limit: int = Query(50, ge=1, le=200, description="每页数量"),
+    before: str | None = Query(None, description="返回该游标之前（更早）的消息"),
+    after: str | None = Query(None, description="返回该游标之后（更新）的消息"),
+) -> Any:
+    """按 (created_at, id) 键集分页返回聊天消息，结果按时间正序排列。"""
+
+    if before and after:
+        return error_response(
+            "bad_request:api", "Only one of before or after can be provided."
+        )
+
+    chat = await write_behind.pending_chat(chat_id) or await db.get(Chat, chat_id)
+    if not chat:
+        return error_response("not_found:chat")
+    if chat.visibility == Visibility.PRIVATE and chat.user_id != current_user.id:
+        return error_response("forbidden:chat")
+
+    try:
+        cursor = (
+            decode_cursor(before or after, scope=MESSAGE_CURSOR_SCOPE)
+            if before or after
+            else None
+        )
+    except InvalidCursorError:
+        return error_response("bad_request:api", "Invalid pagination cursor.")
+
+    position = tuple_(Message.created_at, Message.id)
+    statement = select(Message).where(Message.chat_id == chat_id)
+    if after and cursor:
+        statement = statement.where(position > tuple_(*cursor.position)).order_by(
+            Message.created_at.asc(), Message.id.asc()
         )
+    else:
+        if cursor:
+            statement = statement.where(position < tuple_(*cursor.position))
+        statement = statement.order_by(Message.created_at.desc(), Message.id.desc())
+
+    result = await db.execute(statement.limit(limit + 1))
+    messages = _merge_pending_messages(
+        list(result.scalars().all()),
+        await write_behind.pending_messages(chat_id),
+        cursor=cursor,
+        ascending=bool(after),
+        limit=limit + 1,
+    )
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if not after:
+        messages.reverse()
+
+    return {
+        "messages": [_serialize_message(message) for message in messages],
+        "hasMore": has_more,
+        "beforeCursor": encode_cursor(
+            messages[0].created_at, messages[0].id, scope=MESSAGE_CURSOR_SCOPE
+        )
+        if messages
+        else None,
+        "afterCursor": encode_cursor(
+            messages[-1].created_at, messages[-1].id, scope=MESSAGE_CURSOR_SCOPE
+        )
+        if messages
+        else None,
+    }
+
+
+@router.get("/chat/{chat_id}/export")
+async def export_chat(
+    *,
+    db: SessionDep,
+    current_user: CurrentUser,
+    chat_id: uuid.UUID,
+    format: Literal["ndjson", "json"] = Query("ndjson", description="导出格式"),
+    accept_encoding: str | None = Header(None, alias="Accept-Encoding"),
+) -> Response:
+    """
+    导出聊天及其全部消息
+
+    消息通过服务端游标按批读取并逐批写出，内存占用与消息数量无关。
+    NDJSON 首行为聊天信息，其后每行一条消息；JSON 为 ``{"chat", "messages"}`` 对象。
+    """
 
-    return StreamingResponse(stream(), media_type="text/event-stream")
+    if settings.CHAT_WRITE_BEHIND:
+        await write_behind.wait_idle(timeout=5)
+
+    chat = await db.get(Chat, chat_id)
+    if not chat:
+        return error_response("not_found:chat")
+    if chat.visibility == Visibility.PRIVATE and chat.user_id != current_user.id:
+        return error_response("forbidden:chat")
+
+    chat_payload = {
+        "id": str(chat.id),
+        "title": chat.title,
+        "visibility": Visibility(chat.visibility).value,
+        "userId": str(chat.user_id),
+        "createdAt": chat.created_at.isoformat(),
+        "lastContext": chat.last_context,
+    }
+    ndjson = format == "ndjson"
+
+    async def body() -> AsyncGenerator[bytes, None]:
+        """逐批读取消息并编码。"""
+
+        if ndjson:
+            yield json.encode({"type": "chat", **chat_payload}) + b"\n"
+        else:
+            yield b'{"chat":' + json.encode(chat_payload) + b',"messages":['
+
+        first = True
+        # 请求级会话在响应体发送前已经关闭，导出使用独立会话
+        async with async_db_session() as export_db:
+            statement = (
+                select(Message)
+                .where(Message.chat_id == chat_id)
+                .order_by(Message.created_at.asc(), Message.id.asc())
+                .execution_options(yield_per=settings.CHAT_EXPORT_BATCH_SIZE)
+            )
+            result = await export_db.stream_scalars(statement)
+            async for partition in result.partitions():
+                if ndjson:
+                    yield b"".join(
+                        json.encode({"type": "message", **_serialize_message(message)})
+                        + b"\n"
+                        for message in partition
+                    )
+                else:
+                    encoded = b",".join(
+                        json.encode(_serialize_message(message))
+                        for message in partition
+                    )
+                    yield encoded if first else b"," + encoded
+                    first = False
+                # 已写出的消息不再保留在会话中
+                export_db.expunge_all()
+
+        if not ndjson:
+            yield b"]}"
+
+    extension = "ndjson" if ndjson else "json"
+    headers = {
+        "Content-Disposition": f'attachment; filename="chat-{chat_id}.{extension}"',
+        "Vary": "Accept-Encoding",
+    }
+    source: AsyncGenerator[bytes, None] = body()
+    if accepts_gzip(accept_encoding):
+        source = gzip_stream(source)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        source,
+        media_type="application/x-ndjson" if ndjson else "application/json",
+        headers=headers,
+    )
@@ -0,0 +1,16 @@
+from typing import Any
+
+from fastapi import APIRouter
+
+from app.api.deps import CurrentUser
+from utils.metrics import metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def get_metrics(*, _current_user: CurrentUser) -> Any:
+    """
+    导出当前进程的运行指标
+    """
+    return metrics.snapshot()
@@ -0,0 +1,84 @@
+"""聊天消息全文检索接口。"""
+
+from __future__ import annotations
+
+from typing import Any
+
+from fastapi import APIRouter
+
+from app.api.cursor import (
+    InvalidCursorError,
+    decode_score_cursor,
+    encode_score_cursor,
+)
+from app.api.deps import CurrentUser, SessionDep
+from app.api.errors import error_response
+from app.models import MessageRole
+from app.services.search import query_phrases, search_messages
+from utils.search_text import build_snippet, extract_text, split_query
+
+router = APIRouter()
+
+SEARCH_CURSOR_SCOPE = "search"
+MAX_QUERY_LENGTH = 200
+
+
+@router.get("/search")
+async def search_chat_messages(
+    *,
+    db: SessionDep,
+    current_user: CurrentUser,
+    q: str,
+    limit: int = 20,
+    cursor: str | None = None,
+) -> Any:
+    """
+    检索当前用户的聊天消息
+
+    多个关键词以空格分隔，需同时命中；结果按相关度排序，并返回高亮片段。
+    """
+
+    query = q.strip()
+    if not query or len(query) > MAX_QUERY_LENGTH:
+        return error_response("bad_request:api", "Invalid q parameter.")
+    if not 1 <= limit <= 50:
+        return error_response("bad_request:api", "Limit must be between 1 and 50.")
+
+    after = None
+    if cursor:
+        try:
+            after = decode_score_cursor(cursor, scope=SEARCH_CURSOR_SCOPE)
+        except InvalidCursorError:
+            return error_response("bad_request:api", "Invalid cursor parameter.")
+
+    phrases = query_phrases(query)
+    if not phrases:
+        return {"results": [], "hasMore": False, "nextCursor": None}
+
+    rows = await search_messages(
+        db, current_user.id, phrases, limit=limit + 1, after=after
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    terms = split_query(query)
+
+    results = [
+        {
+            "messageId": str(message.id),
+            "chatId": str(message.chat_id),
+            "chatTitle": title,
+            "role": message.role.value
+            if isinstance(message.role, MessageRole)
+            else message.role,
+            "createdAt": message.created_at.isoformat(),
+            "score": score,
+            "snippet": build_snippet(extract_text(message.parts), terms),
+        }
+        for message, title, score in rows
+    ]
+    next_cursor = (
+        encode_score_cursor(rows[-1][2], rows[-1][0].id, scope=SEARCH_CURSOR_SCOPE)
+        if has_more
+        else None
+    )
+    return {"results": results, "hasMore": has_more, "nextCursor": next_cursor}
@@ -4,8 +4,11 @@ from enum import Enum
 from typing import Any, Literal
 
 from pydantic import AnyUrl, EmailStr, field_validator
+from sqlalchemy import DDL, Index, Text, event
 from sqlmodel import JSON, Column, Field, Relationship, SQLModel
 
+from utils.search_text import extract_text, to_search_text
+
 
 def utc_now():
     return datetime.now(UTC)
@@ -104,6 +107,15 @@ class Chat(ChatBase, table=True):
     votes: list["Vote"] = Relationship(back_populates="chat", cascade_delete=True)
 
 
+# 侧边栏聊天历史分页的键集索引
+Index(
+    "ix_Chat_user_id_created_at_id",
+    Chat.user_id,
+    Chat.created_at.desc(),
+    Chat.id.desc(),
+)
+
+
 class ChatPublic(ChatBase):
     id: uuid.UUID
     user_id: uuid.UUID
@@ -198,12 +210,65 @@ class Message(MessageBase, table=True):
         foreign_key="Chat.id", nullable=False, ondelete="CASCADE"
     )
     created_at: datetime = Field(default_factory=utc_now)
+    # 全文检索使用的规范化文本，由 parts 中的文本片段生成
+    search_text: str | None = Field(default=None, sa_column=Column(Text))
 
     # Relationships
     chat: Chat | None = Relationship(back_populates="messages")
     votes: list["Vote"] = Relationship(back_populates="message", cascade_delete=True)
 
 
+# 按聊天分页消息时的键集索引
+Index(
+    "ix_Message_v2_chat_id_created_at_id",
+    Message.chat_id,
+    Message.created_at,
+    Message.id,
+)
+
+
+@event.listens_for(Message, "before_insert")
+@event.listens_for(Message, "before_update")
+def _fill_message_search_text(_mapper: Any, _connection: Any, target: Message) -> None:
+    """写入消息时同步生成检索文本。"""
+
+    target.search_text = to_search_text(extract_text(target.parts))
+
+
+# PostgreSQL：由检索文本生成的 tsvector 列与 GIN 索引
+for _statement in (
+    'ALTER TABLE "Message_v2" ADD COLUMN IF NOT EXISTS search_vector tsvector '
+    "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(search_text, ''))) STORED",
+    'CREATE INDEX IF NOT EXISTS "ix_Message_v2_search_vector" '
+    'ON "Message_v2" USING gin (search_vector)',
+):
+    event.listen(
+        Message.__table__,
+        "after_create",
+        DDL(_statement).execute_if(dialect="postgresql"),
+    )
+
+# SQLite：以消息表为外部内容的 FTS5 索引，由触发器在写入时维护
+for _statement in (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS "Message_v2_fts" USING fts5('
+    "search_text, content='Message_v2', content_rowid='rowid')",
+    'CREATE TRIGGER IF NOT EXISTS "Message_v2_fts_ai" AFTER INSERT ON "Message_v2" BEGIN '
+    'INSERT INTO "Message_v2_fts"(rowid, search_text) VALUES (new.rowid, new.search_text); END',
+    'CREATE TRIGGER IF NOT EXISTS "Message_v2_fts_ad" AFTER DELETE ON "Message_v2" BEGIN '
+    'INSERT INTO "Message_v2_fts"("Message_v2_fts", rowid, search_text) '
+    "VALUES ('delete', old.rowid, old.search_text); END",
+    'CREATE TRIGGER IF NOT EXISTS "Message_v2_fts_au" AFTER UPDATE OF search_text ON "Message_v2" BEGIN '
+    'INSERT INTO "Message_v2_fts"("Message_v2_fts", rowid, search_text) '
+    "VALUES ('delete', old.rowid, old.search_text); "
+    'INSERT INTO "Message_v2_fts"(rowid, search_text) VALUES (new.rowid, new.search_text); END',
+):
+    event.listen(
+        Message.__table__,
+        "after_create",
+        DDL(_statement).execute_if(dialect="sqlite"),
+    )
+
+
 class MessagePublic(MessageBase):
     id: uuid.UUID
     chat_id: uuid.UUID
@@ -272,6 +337,10 @@ class ContentRewriteRequest(SQLModel):
     additionalInstructions: str | None = None
 
 
+class ContentRewriteBatchRequest(SQLModel):
+    items: list[ContentRewriteRequest] = Field(description="改写条目，按完成顺序返回")
+
+
 class ContentRewriteResponse(SQLModel):
     success: bool
     originalContent: str
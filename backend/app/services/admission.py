@@ -0,0 +1,166 @@
+"""按聊天模型限制并发生成数，超出时按用户类型优先级排队。"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+
+from app.models import ChatModelId, UserType
+from core.config import settings
+from utils.metrics import metrics
+
+queue_depth = metrics.gauge(
+    "chat_admission_queue_depth", "等待生成名额的请求数，按模型区分"
+)
+in_flight = metrics.gauge(
+    "chat_admission_in_flight", "占用生成名额的请求数，按模型区分"
+)
+wait_seconds = metrics.histogram(
+    "chat_admission_wait_seconds", "获取生成名额的等待时间"
+)
+rejected = metrics.counter(
+    "chat_admission_rejected_total", "未获得生成名额的请求数，按模型与原因区分"
+)
+
+# 数值越小越优先
+PRIORITY_BY_USER_TYPE = {UserType.REGULAR: 0, UserType.GUEST: 1}
+
+
+class AdmissionRejected(Exception):
+    """排队已满或等待超时。"""
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(reason)
+        self.reason = reason
+
+
+class AdmissionSlot:
+    """已获得的生成名额，``release`` 可重复调用。"""
+
+    def __init__(self, gate: ModelGate) -> None:
+        self._gate = gate
+        self._released = False
+
+    def release(self) -> None:
+        """归还名额。"""
+
+        if not self._released:
+            self._released = True
+            self._gate._release()
+
+
+class ModelGate:
+    """
+    单个模型的准入控制
+
+    正在生成的请求不超过 ``limit``，其余按 ``(优先级, 到达顺序)`` 排队；
+    名额释放时直接交给队首请求，不会被新到达的请求抢占。
+    """
+
+    def __init__(self, model: str, *, limit: int, max_queue: int) -> None:
+        self.model = model
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting = 0
+        self._waiters: list[tuple[int, int, asyncio.Future[None]]] = []
+        self._sequence = itertools.count()
+
+    def _update_metrics(self) -> None:
+        queue_depth.set(self.waiting, model=self.model)
+        in_flight.set(self.active, model=self.model)
+
+    async def acquire(self, priority: int, timeout: float) -> AdmissionSlot:
+        """
+        获取生成名额
+
+        :param priority: 优先级，数值越小越优先
+        :param timeout: 最长排队时间（秒）
+        :return:
+        """
+        if self.active < self.limit and not self.waiting:
+            self.active += 1
+            self._update_metrics()
+            wait_seconds.observe(0, model=self.model)
+            return AdmissionSlot(self)
+
+        if self.waiting >= self.max_queue:
+            rejected.inc(model=self.model, reason="queue_full")
+            raise AdmissionRejected("queue_full")
+
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self.waiting += 1
+        self._update_metrics()
+        started = time.monotonic()
+        try:
+            async with asyncio.timeout(timeout):
+                await asyncio.shield(future)
+        except TimeoutError:
+            if not future.done():
+                future.cancel()
+                self.waiting -= 1
+                self._update_metrics()
+                rejected.inc(model=self.model, reason="timeout")
+                raise AdmissionRejected("timeout") from None
+        except asyncio.CancelledError:
+            # 调用方被取消：已分配的名额归还，未分配的退出队列
+            if future.done() and not future.cancelled():
+                self._release()
+            else:
+                future.cancel()
+                self.waiting -= 1
+                self._update_metrics()
+            raise
+        wait_seconds.observe(time.monotonic() - started, model=self.model)
+        return AdmissionSlot(self)
+
+    def _release(self) -> None:
+        """归还名额，优先交给队首仍在等待的请求。"""
+
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            # 名额直接转交，active 不变
+            self.waiting -= 1
+            future.set_result(None)
+            self._update_metrics()
+            return
+        self.active -= 1
+        self._update_metrics()
+
+
+_gates: dict[ChatModelId, ModelGate] = {}
+
+
+def get_gate(model: ChatModelId) -> ModelGate:
+    """返回模型对应的准入控制，首次使用时按配置创建。"""
+
+    gate = _gates.get(model)
+    if gate is None:
+        gate = ModelGate(
+            model.value,
+            limit=settings.CHAT_MODEL_CONCURRENCY.get(
+                model.value, settings.CHAT_MODEL_DEFAULT_CONCURRENCY
+            ),
+            max_queue=settings.CHAT_MODEL_QUEUE_SIZE,
+        )
+        _gates[model] = gate
+    return gate
+
+
+async def admit(model: ChatModelId, user_type: str) -> AdmissionSlot:
+    """
+    为一次生成申请名额
+
+    :param model: 聊天模型ID
+    :param user_type: 用户类型
+    :return:
+    """
+    priority = PRIORITY_BY_USER_TYPE.get(user_type, len(PRIORITY_BY_USER_TYPE))
+    return await get_gate(model).acquire(
+        priority, timeout=settings.CHAT_ADMISSION_TIMEOUT_SECONDS
+    )
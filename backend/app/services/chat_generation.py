@@ -0,0 +1,345 @@
+"""聊天回复的流式生成，在后台任务中拉取模型增量并推送给SSE消费者。"""
+
+from __future__ import annotations
+
+import asyncio
+import uuid
+from collections.abc import AsyncIterator, Callable, Sequence
+from datetime import UTC, datetime
+from typing import Any
+
+from msgspec import json
+from redis.exceptions import RedisError
+
+from app.models import ChatModelId, Message, MessageRole
+from app.services import history_cache
+from app.services.chat_turn import persist_assistant_reply
+from app.services.llm import ChatProviderError, ChatStreamProvider
+from app.services.stream_store import RedisEventStream
+from common.log import log
+from core.config import settings
+from database.redis import redis_client
+from utils.metrics import metrics
+
+UsageBuilder = Callable[[str], dict[str, Any]]
+
+# 持有后台任务的引用，避免任务在运行中被回收
+_background_tasks: set[asyncio.Task[None]] = set()
+# 当前进程中正在进行的生成，按聊天ID索引
+_active_generations: dict[uuid.UUID, ChatGeneration] = {}
+
+generations_active = metrics.gauge(
+    "chat_generations_active", "当前进程中正在进行的聊天回复生成数"
+)
+generations_cancelled = metrics.counter(
+    "chat_generations_cancelled_total", "被取消的聊天回复生成数，按原因区分"
+)
+
+
+class ChatGeneration:
+    """
+    一次AI回复的生成过程
+
+    模型增量写入有界队列：客户端读取缓慢时 ``put`` 阻塞，进而暂停读取上游响应，
+    形成端到端的背压。生成结束后AI消息只持久化一次。
+
+    客户端断开后，若在 ``disconnect_grace`` 秒内没有续传连接接管，则取消上游调用；
+    被取消的回复同样保存已生成的部分。
+    """
+
+    def __init__(
+        self,
+        *,
+        chat_id: uuid.UUID,
+        user_id: uuid.UUID,
+        model: ChatModelId,
+        provider: ChatStreamProvider,
+        messages: Sequence[dict[str, str]],
+        usage_builder: UsageBuilder,
+        buffer_size: int,
+        stream: RedisEventStream | None = None,
+        disconnect_grace: float | None = None,
+        on_finish: Callable[[], None] | None = None,
+    ) -> None:
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.model = model
+        self.provider = provider
+        self.messages = list(messages)
+        self.usage_builder = usage_builder
+        self.message_id = uuid.uuid4()
+        self.created_at = datetime.now(UTC).replace(tzinfo=None)
+        self.usage: dict[str, Any] | None = None
+        self.error: str | None = None
+        self._chunks: list[str] = []
+        self.stream = stream
+        self._queue: asyncio.Queue[tuple[str | None, bytes, bool]] = asyncio.Queue(
+            maxsize=buffer_size
+        )
+        self.disconnect_grace = disconnect_grace
+        self.on_finish = on_finish
+        self.cancel_reason: str | None = None
+        self._detached = False
+        self._task: asyncio.Task[None] | None = None
+        self._provider_task: asyncio.Task[None] | None = None
+        self._watchdog: asyncio.Task[None] | None = None
+
+    @property
+    def text(self) -> str:
+        """当前已生成的回复文本。"""
+
+        return "".join(self._chunks)
+
+    @property
+    def done(self) -> bool:
+        """生成任务是否已经结束。"""
+
+        return self._task is not None and self._task.done()
+
+    def start(self) -> None:
+        """在后台启动生成任务。"""
+
+        self._task = _spawn(self._run())
+        _active_generations[self.chat_id] = self
+        generations_active.inc()
+
+    def detach(self) -> None:
+        """
+        客户端离开后解除队列，生成任务继续运行直至完成或被取消
+
+        :return:
+        """
+        self._detached = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        if self.disconnect_grace is not None and self._watchdog is None:
+            self._watchdog = _spawn(self._cancel_when_abandoned(self.disconnect_grace))
+
+    def cancel(self, reason: str) -> bool:
+        """
+        取消上游模型调用，已生成的部分照常收尾并保存
+
+        :param reason: 取消原因
+        :return: 是否取消了进行中的调用
+        """
+        if self._provider_task is None or self._provider_task.done():
+            return False
+        self.cancel_reason = reason
+        self._provider_task.cancel()
+        return True
+
+    async def _cancel_when_abandoned(self, grace: float) -> None:
+        """客户端断开后等待续传连接接管，无人接管时取消生成。"""
+
+        while not self.done:
+            await asyncio.sleep(grace)
+            if self.done:
+                return
+            if self.stream is not None:
+                try:
+                    if await self.stream.has_listener():
+                        continue
+                except RedisError as exc:
+                    log.warning("无法确认续传连接: {}", exc)
+            self.cancel("disconnect")
+            return
+
+    async def _emit(self, frame: dict[str, Any], *, final: bool = False) -> None:
+        """
+        推送一个SSE帧
+
+        帧只编码一次：同一份 JSON 先追加到 Redis Stream 以获得事件ID，再交给当前连接的消费者；
+        Redis 写入失败时降级为不可续传的普通流。
+
+        :param frame: 帧数据
+        :param final: 是否为最后一帧
+        :return:
+        """
+        payload = json.encode(frame)
+        event_id: str | None = None
+        if self.stream is not None:
+            try:
+                event_id = await self.stream.append(payload, final=final)
+            except RedisError as exc:
+                log.warning("聊天流写入 Redis 失败，停止续传记录: {}", exc)
+                self.stream = None
+        if not self._detached:
+            await self._queue.put((event_id, payload, final))
+
+    async def _pull(self, text_id: str) -> None:
+        """拉取模型增量，取消时上游响应随之关闭。"""
+
+        try:
+            async for delta in self.provider.stream(self.model, self.messages):
+                if not delta:
+                    continue
+                self._chunks.append(delta)
+                await self._emit({"type": "text-delta", "id": text_id, "delta": delta})
+        except ChatProviderError as exc:
+            self.error = str(exc)
+            log.warning("聊天模型调用失败: {}", exc)
+        except Exception as exc:  # noqa: BLE001 - 异常也需要结束流
+            self.error = "Unexpected error while generating the reply."
+            log.exception("聊天回复生成异常: {}", exc)
+
+    async def _run(self) -> None:
+        """拉取模型增量并在结束时持久化回复。"""
+
+        try:
+            await self._generate()
+        finally:
+            if _active_generations.get(self.chat_id) is self:
+                del _active_generations[self.chat_id]
+            generations_active.dec()
+            if self._watchdog is not None:
+                self._watchdog.cancel()
+            if self.on_finish is not None:
+                self.on_finish()
+
+    async def _generate(self) -> None:
+        text_id = str(self.message_id)
+        await self._emit({"type": "text-start", "id": text_id})
+        self._provider_task = asyncio.create_task(self._pull(text_id))
+        # 等待而不直接 await，避免把拉取任务的取消误当作本任务被取消
+        await asyncio.wait({self._provider_task})
+        if self._provider_task.cancelled():
+            generations_cancelled.inc(reason=self.cancel_reason or "unknown")
+            log.info("聊天回复生成已取消: {} ({})", self.chat_id, self.cancel_reason)
+            await self._emit({"type": "abort"})
+
+        if self.error:
+            await self._emit({"type": "error", "errorText": self.error})
+        await self._emit({"type": "text-end", "id": text_id})
+
+        try:
+            await self._persist()
+        except Exception as exc:  # noqa: BLE001 - 记录异常即可
+            log.exception("AI回复持久化失败: {}", exc)
+
+        if self.usage is not None:
+            await self._emit(
+                {
+                    "type": "data-appendMessage",
+                    "data": json.encode(self.message_payload()).decode(),
+                }
+            )
+            await self._emit({"type": "data-usage", "data": self.usage})
+        await self._emit({"type": "finish"}, final=True)
+
+    async def _persist(self) -> None:
+        """保存AI消息与用量信息。"""
+
+        text = self.text
+        if not text:
+            return
+        self.usage = self.usage_builder(text)
+        await persist_assistant_reply(
+            self.chat_id, self.build_message(), self.usage, user_id=self.user_id
+        )
+        # 历史列表中包含 lastContext，需要随之失效
+        await history_cache.invalidate(self.user_id, "context_updated")
+
+    def build_message(self) -> Message:
+        """根据已生成的文本构造AI消息。"""
+
+        return Message(
+            id=self.message_id,
+            chat_id=self.chat_id,
+            role=MessageRole.ASSISTANT,
+            parts=[{"type": "text", "text": self.text}],
+            attachments=[],
+            created_at=self.created_at,
+        )
+
+    def message_payload(self) -> dict[str, Any]:
+        """AI消息的前端结构。"""
+
+        return {
+            "id": str(self.message_id),
+            "role": "assistant",
+            "parts": [{"type": "text", "text": self.text}],
+            "metadata": {"createdAt": self.created_at.isoformat()},
+        }
+
+    async def events(self) -> AsyncIterator[tuple[str | None, bytes]]:
+        """
+        逐个返回 ``(事件ID, 已编码的帧)``，直到最后一帧
+
+        消费者退出时自动解除队列。
+
+        :return:
+        """
+        try:
+            while True:
+                event_id, frame, final = await self._queue.get()
+                yield event_id, frame
+                if final:
+                    return
+        finally:
+            if self._task is not None and not self._task.done():
+                self.detach()
+
+
+def _spawn(coroutine: Any) -> asyncio.Task[Any]:
+    """创建后台任务并保持引用直至结束。"""
+
+    task = asyncio.create_task(coroutine)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+def _stop_channel() -> str:
+    return f"{settings.CHAT_STREAM_REDIS_PREFIX}:stop"
+
+
+def cancel_local_generation(chat_id: uuid.UUID, reason: str) -> bool:
+    """
+    取消当前进程中该聊天正在进行的生成
+
+    :param chat_id: 聊天ID
+    :param reason: 取消原因
+    :return: 是否取消了生成
+    """
+    generation = _active_generations.get(chat_id)
+    return generation is not None and generation.cancel(reason)
+
+
+async def request_stop(chat_id: uuid.UUID) -> bool:
+    """
+    请求停止聊天的生成，通过 Redis 通知所有进程
+
+    :param chat_id: 聊天ID
+    :return: 本进程是否持有该生成
+    """
+    stopped = cancel_local_generation(chat_id, "stop")
+    try:
+        await redis_client.publish(_stop_channel(), str(chat_id))
+    except RedisError as exc:
+        log.warning("停止生成的通知发送失败: {}", exc)
+    return stopped
+
+
+async def listen_for_stop_requests() -> None:
+    """订阅停止通知并取消本进程中的对应生成，随应用生命周期运行。"""
+
+    while True:
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(_stop_channel())
+            while True:
+                message = await pubsub.get_message(timeout=1.0)
+                if message is None:
+                    continue
+                try:
+                    chat_id = uuid.UUID(message["data"])
+                except (TypeError, ValueError):
+                    continue
+                cancel_local_generation(chat_id, "stop")
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:  # noqa: BLE001 - 断线后重新订阅
+            log.warning("停止通知订阅中断，稍后重试: {}", exc)
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
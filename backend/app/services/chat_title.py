@@ -0,0 +1,182 @@
+"""聊天标题：首条消息提交时使用截断文本占位，后台任务调用模型生成正式标题。"""
+
+from __future__ import annotations
+
+import asyncio
+import uuid
+
+from sqlalchemy import update
+
+from app.models import Chat, ChatModelId, MessageRole
+from app.services import history_cache
+from app.services.llm import ChatProviderError, ChatStreamProvider
+from app.services.write_behind import write_behind
+from common.log import log
+from core.config import settings
+from database.db import async_db_session
+from utils.metrics import metrics
+
+TITLE_PROMPT = (
+    "Generate a short title for a conversation that starts with the user's message. "
+    "Reply with the title only, in the same language as the message, "
+    "without quotes or trailing punctuation."
+)
+
+DEFAULT_TITLE = "新对话"
+
+title_jobs = metrics.counter(
+    "chat_title_jobs_total", "后台标题生成结果，按 updated/skipped/failed 区分"
+)
+
+_semaphore: asyncio.Semaphore | None = None
+_tasks: set[asyncio.Task[None]] = set()
+
+
+def placeholder_title(message_text: str) -> str:
+    """
+    根据首条消息生成占位标题
+
+    :param message_text: 首条消息文本
+    :return:
+    """
+    text = " ".join(message_text.split())
+    if not text:
+        return DEFAULT_TITLE
+    return text[: settings.CHAT_TITLE_MAX_LENGTH]
+
+
+def clean_title(raw: str) -> str:
+    """
+    规范化模型输出的标题：取首个非空行，去掉引号与结尾标点并截断
+
+    :param raw: 模型输出
+    :return: 清理后的标题，无有效内容时返回空字符串
+    """
+    line = next((line for line in raw.splitlines() if line.strip()), "")
+    line = line.strip().removeprefix("Title:").strip()
+    quotes = "\"'“”‘’「」《》` "
+    line = line.strip(quotes).rstrip("。.!！?？,，;；:：").strip(quotes)
+    return " ".join(line.split())[: settings.CHAT_TITLE_MAX_LENGTH]
+
+
+async def generate_title(provider: ChatStreamProvider, message_text: str) -> str | None:
+    """
+    调用模型生成标题
+
+    :param provider: 聊天模型提供方
+    :param message_text: 首条消息文本
+    :return: 标题，模型未给出有效内容时返回 None
+    """
+    messages = [
+        {"role": MessageRole.SYSTEM.value, "content": TITLE_PROMPT},
+        {"role": MessageRole.USER.value, "content": message_text},
+    ]
+    chunks = [
+        delta
+        async for delta in provider.stream(
+            ChatModelId(settings.CHAT_TITLE_MODEL), messages
+        )
+    ]
+    return clean_title("".join(chunks)) or None
+
+
+async def _update_title(
+    chat_id: uuid.UUID, user_id: uuid.UUID, placeholder: str, title: str
+) -> bool:
+    """
+    更新聊天标题，仅当标题仍为占位标题时生效
+
+    :param chat_id: 聊天ID
+    :param user_id: 聊天所属用户
+    :param placeholder: 占位标题
+    :param title: 新标题
+    :return: 是否已更新
+    """
+    pending = await write_behind.pending_chat(chat_id)
+    if pending is not None:
+        # 异步写入模式下聊天可能尚未落库：先更新覆盖层，再等待落库后更新数据库
+        if pending.title == placeholder:
+            pending.title = title
+        await write_behind.wait_idle(settings.CHAT_TITLE_TIMEOUT_SECONDS)
+
+    async with async_db_session() as db:
+        result = await db.execute(
+            update(Chat)
+            .where(Chat.id == chat_id, Chat.title == placeholder)
+            .values(title=title)
+        )
+        await db.commit()
+    if not result.rowcount:
+        return False
+    await history_cache.invalidate(user_id, "chat_title")
+    return True
+
+
+async def _run(
+    chat_id: uuid.UUID,
+    user_id: uuid.UUID,
+    message_text: str,
+    placeholder: str,
+    provider: ChatStreamProvider,
+) -> None:
+    """后台标题任务，失败时保留占位标题。"""
+
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(settings.CHAT_TITLE_CONCURRENCY)
+    try:
+        async with _semaphore:
+            async with asyncio.timeout(settings.CHAT_TITLE_TIMEOUT_SECONDS):
+                title = await generate_title(provider, message_text)
+            if not title or title == placeholder:
+                title_jobs.inc(result="skipped")
+                return
+            updated = await _update_title(chat_id, user_id, placeholder, title)
+    except (ChatProviderError, TimeoutError) as exc:
+        log.warning("聊天 {} 标题生成失败: {}", chat_id, exc)
+        title_jobs.inc(result="failed")
+        return
+    except Exception as exc:  # noqa: BLE001 - 后台任务不影响聊天
+        log.exception("聊天 {} 标题更新失败: {}", chat_id, exc)
+        title_jobs.inc(result="failed")
+        return
+    title_jobs.inc(result="updated" if updated else "skipped")
+
+
+def schedule_title(
+    chat_id: uuid.UUID,
+    user_id: uuid.UUID,
+    message_text: str,
+    placeholder: str,
+    provider: ChatStreamProvider,
+) -> asyncio.Task[None] | None:
+    """
+    在后台生成聊天标题，调用方无需等待
+
+    :param chat_id: 聊天ID
+    :param user_id: 聊天所属用户
+    :param message_text: 首条消息文本
+    :param placeholder: 已保存的占位标题
+    :param provider: 聊天模型提供方
+    :return: 后台任务，未开启 ``CHAT_TITLE_GENERATION`` 或消息为空时返回 None
+    """
+    if not settings.CHAT_TITLE_GENERATION or not message_text.strip():
+        return None
+    task = asyncio.create_task(
+        _run(chat_id, user_id, message_text, placeholder, provider)
+    )
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+async def shutdown() -> None:
+    """
+    取消尚未完成的标题任务，用于关闭应用前
+
+    :return:
+    """
+    tasks = list(_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,87 @@
+"""聊天轮次的工作单元，将一次对话产生的写操作合并为单个事务。"""
+
+from __future__ import annotations
+
+import uuid
+from typing import Any
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Chat, Message
+from app.services.write_behind import write_behind
+from core.config import settings
+from database.db import async_db_session
+
+
+class ChatTurn:
+    """
+    聊天轮次工作单元
+
+    暂存新建的聊天、用户与AI消息以及用量信息，在 ``commit`` 时一次 flush 并提交。
+    SQLAlchemy 会按外键依赖先写入聊天，再以批量 INSERT 写入同一张表的多条消息。
+    """
+
+    def __init__(self, db: AsyncSession, chat: Chat, *, is_new: bool) -> None:
+        self.db = db
+        self.chat = chat
+        self.is_new = is_new
+        self.messages: list[Message] = []
+
+    def add_message(self, message: Message) -> None:
+        """暂存一条消息。"""
+
+        self.messages.append(message)
+
+    async def commit(self) -> None:
+        """
+        一次性提交本轮暂存的全部数据，失败时回滚
+
+        开启 ``CHAT_WRITE_BEHIND`` 时只入队，由后台任务批量落库。
+        """
+
+        if settings.CHAT_WRITE_BEHIND:
+            await write_behind.submit(
+                chat=self.chat if self.is_new else None, messages=self.messages
+            )
+            self.messages = []
+            return
+
+        self.db.add(self.chat)
+        self.db.add_all(self.messages)
+        try:
+            await self.db.commit()
+        except Exception:
+            await self.db.rollback()
+            raise
+        self.messages = []
+
+
+async def persist_assistant_reply(
+    chat_id: uuid.UUID,
+    message: Message,
+    usage: dict[str, Any],
+    *,
+    user_id: uuid.UUID | None = None,
+) -> None:
+    """
+    在流式回复结束后保存AI消息与用量信息
+
+    响应体发送时请求级会话已经关闭，因此使用独立会话，并在同一事务中提交。
+
+    :param chat_id: 聊天ID
+    :param message: AI消息
+    :param usage: 用量信息
+    :param user_id: 聊天所属用户，异步写入落库后据此刷新历史缓存
+    :return:
+    """
+    if settings.CHAT_WRITE_BEHIND:
+        await write_behind.submit(messages=[message], context=usage, user_id=user_id)
+        return
+
+    async with async_db_session() as db:
+        db.add(message)
+        await db.execute(
+            update(Chat).where(Chat.id == chat_id).values(last_context=usage)
+        )
+        await db.commit()
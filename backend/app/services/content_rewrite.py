@@ -0,0 +1,375 @@
+"""文案改写：按改写类型分派到内置模板或模型策略，支持流式输出、结果缓存与批量改写。"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import hashlib
+import time
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator, Callable, Sequence
+from typing import Any
+
+from msgspec import json
+from redis.exceptions import RedisError
+
+from app.models import (
+    ChatModelId,
+    ContentRewriteRequest,
+    ContentRewriteResponse,
+    MessageRole,
+)
+from app.services.llm import ChatStreamProvider, get_chat_provider
+from common.log import log
+from core.config import settings
+from database.redis import redis_client
+from utils.metrics import metrics
+
+REWRITE_PROMPT = (
+    "Rewrite the user's text. {instruction} "
+    "Reply with the rewritten text only, in the same language as the text."
+)
+
+# 命中缓存时按该长度分段输出
+REPLAY_CHUNK_SIZE = 256
+
+batch_items = metrics.counter(
+    "rewrite_batch_items_total", "批量改写的条目数，按 succeeded/failed 区分"
+)
+rewrite_seconds = metrics.histogram(
+    "rewrite_strategy_seconds", "完整改写的耗时，按策略区分（不含缓存命中）"
+)
+first_chunk_seconds = metrics.histogram(
+    "rewrite_first_chunk_seconds", "改写输出首段文本的耗时，按策略区分"
+)
+cache_requests = metrics.counter(
+    "rewrite_cache_requests_total", "改写结果缓存查询次数，按 hit/miss/error 区分"
+)
+
+
+class ContentRewriteError(ValueError):
+    """改写请求无效。"""
+
+
+class RewriteStrategy(ABC):
+    """改写策略"""
+
+    name: str
+    kind: str = "base"
+    # 结果是否写入缓存，计算成本低的策略无需缓存
+    cacheable: bool = False
+
+    @abstractmethod
+    def stream(self, request: ContentRewriteRequest) -> AsyncIterator[str]:
+        """
+        按生成顺序逐段返回改写后的文本
+
+        :param request: 改写请求
+        :return:
+        """
+
+
+class TemplateStrategy(RewriteStrategy):
+    """内置模板策略，同步生成完整文本。"""
+
+    kind = "template"
+
+    def __init__(
+        self, name: str, render: Callable[[ContentRewriteRequest], str]
+    ) -> None:
+        self.name = name
+        self.render = render
+
+    async def stream(self, request: ContentRewriteRequest) -> AsyncIterator[str]:
+        yield self.render(request)
+
+
+class ModelStrategy(RewriteStrategy):
+    """调用聊天模型改写，增量文本随生成输出。"""
+
+    kind = "model"
+    cacheable = True
+
+    def __init__(
+        self,
+        name: str,
+        instruction: str,
+        provider_factory: Callable[[], ChatStreamProvider] = get_chat_provider,
+    ) -> None:
+        self.name = name
+        self.instruction = instruction
+        self.provider_factory = provider_factory
+
+    def build_messages(self, request: ContentRewriteRequest) -> list[dict[str, str]]:
+        """构造发送给模型的上下文。"""
+
+        lines = [REWRITE_PROMPT.format(instruction=self.instruction)]
+        if request.targetTone:
+            lines.append(f"Target tone: {request.targetTone}")
+        if request.targetAudience:
+            lines.append(f"Target audience: {request.targetAudience}")
+        if request.additionalInstructions:
+            lines.append(f"Additional instructions: {request.additionalInstructions}")
+        return [
+            {"role": MessageRole.SYSTEM.value, "content": "\n".join(lines)},
+            {"role": MessageRole.USER.value, "content": request.originalContent},
+        ]
+
+    async def stream(self, request: ContentRewriteRequest) -> AsyncIterator[str]:
+        provider = self.provider_factory()
+        async for delta in provider.stream(
+            ChatModelId(settings.REWRITE_MODEL), self.build_messages(request)
+        ):
+            yield delta
+
+
+def _concise(request: ContentRewriteRequest) -> str:
+    content = request.originalContent
+    return content[:200].strip() + ("..." if len(content) > 200 else "")
+
+
+TEMPLATE_STRATEGIES: dict[str, RewriteStrategy] = {
+    strategy.name: strategy
+    for strategy in (
+        TemplateStrategy(
+            "make_professional", lambda r: f"专业化版本：{r.originalContent}"
+        ),
+        TemplateStrategy("make_casual", lambda r: f"口语化版本：{r.originalContent}"),
+        TemplateStrategy("make_concise", _concise),
+        TemplateStrategy(
+            "make_detailed",
+            lambda r: f"详细说明：{r.originalContent}\n\n更多补充内容可在此处追加。",
+        ),
+        TemplateStrategy("improve_clarity", lambda r: f"清晰表述：{r.originalContent}"),
+        TemplateStrategy(
+            "make_persuasive", lambda r: f"说服力增强：{r.originalContent}"
+        ),
+        TemplateStrategy(
+            "change_tone",
+            lambda r: f"{r.targetTone or 'friendly'} 语气的版本：{r.originalContent}",
+        ),
+        TemplateStrategy("fix_grammar", lambda r: f"语法优化：{r.originalContent}"),
+        TemplateStrategy("translate_style", lambda r: f"风格改写：{r.originalContent}"),
+    )
+}
+
+DEFAULT_TEMPLATE = TemplateStrategy(
+    "default", lambda r: f"改写内容：{r.originalContent}"
+)
+
+MODEL_STRATEGIES: dict[str, RewriteStrategy] = {
+    strategy.name: strategy
+    for strategy in (
+        ModelStrategy("make_professional", "Make it formal and professional."),
+        ModelStrategy("make_casual", "Make it casual and conversational."),
+        ModelStrategy(
+            "make_concise", "Make it as short as possible while keeping the key points."
+        ),
+        ModelStrategy(
+            "make_detailed", "Expand it with more detail and supporting explanation."
+        ),
+        ModelStrategy("improve_clarity", "Improve its clarity and readability."),
+        ModelStrategy("make_persuasive", "Make it more persuasive."),
+        ModelStrategy("change_tone", "Change its tone to the target tone."),
+        ModelStrategy(
+            "fix_grammar",
+            "Fix grammar, spelling and punctuation without changing the meaning.",
+        ),
+        ModelStrategy(
+            "translate_style", "Adapt its style to suit the target audience."
+        ),
+    )
+}
+
+DEFAULT_MODEL = ModelStrategy(
+    "default", "Follow the additional instructions, or improve the text if none."
+)
+
+
+def get_strategy(rewrite_type: str) -> RewriteStrategy:
+    """
+    按改写类型查找策略，未知类型使用默认策略
+
+    :param rewrite_type: 改写类型
+    :return:
+    """
+    if settings.REWRITE_USE_MODEL:
+        return MODEL_STRATEGIES.get(rewrite_type, DEFAULT_MODEL)
+    return TEMPLATE_STRATEGIES.get(rewrite_type, DEFAULT_TEMPLATE)
+
+
+def resolve(request: ContentRewriteRequest) -> RewriteStrategy:
+    """
+    校验改写请求并返回对应策略
+
+    :param request: 改写请求
+    :return:
+    """
+    if not request.originalContent or not request.originalContent.strip():
+        raise ContentRewriteError("Original content is required")
+    return get_strategy(request.rewriteType)
+
+
+def cache_key(strategy: RewriteStrategy, request: ContentRewriteRequest) -> str:
+    """
+    根据策略、语气、受众与内容摘要计算缓存键
+
+    :param strategy: 改写策略
+    :param request: 改写请求
+    :return:
+    """
+    content = hashlib.sha256(
+        json.encode([request.originalContent, request.additionalInstructions])
+    ).hexdigest()
+    digest = hashlib.sha256(
+        json.encode(
+            [
+                strategy.kind,
+                strategy.name,
+                settings.REWRITE_MODEL,
+                request.targetTone,
+                request.targetAudience,
+                content,
+            ]
+        )
+    ).hexdigest()
+    return f"{settings.REWRITE_CACHE_REDIS_PREFIX}:{digest}"
+
+
+async def _get_cached(key: str) -> str | None:
+    try:
+        cached = await redis_client.get(key)
+    except RedisError as exc:
+        log.warning("改写结果缓存读取失败: {}", exc)
+        cache_requests.inc(result="error")
+        return None
+    cache_requests.inc(result="hit" if cached is not None else "miss")
+    return cached
+
+
+async def _store(key: str, text: str) -> None:
+    if len(text.encode()) > settings.REWRITE_CACHE_MAX_BYTES:
+        return
+    try:
+        await redis_client.set(key, text, ex=settings.REWRITE_CACHE_TTL_SECONDS)
+    except RedisError as exc:
+        log.warning("改写结果缓存写入失败: {}", exc)
+
+
+async def stream_rewrite(
+    strategy: RewriteStrategy, request: ContentRewriteRequest
+) -> AsyncIterator[str]:
+    """
+    执行策略并逐段返回改写后的文本
+
+    可缓存的策略先查缓存，完整生成后写入；中途出错或被关闭的结果不缓存。
+
+    :param strategy: ``resolve`` 返回的策略
+    :param request: 改写请求
+    :return:
+    """
+    key = None
+    if strategy.cacheable and settings.REWRITE_CACHE:
+        key = cache_key(strategy, request)
+        cached = await _get_cached(key)
+        if cached is not None:
+            for start in range(0, len(cached), REPLAY_CHUNK_SIZE):
+                yield cached[start : start + REPLAY_CHUNK_SIZE]
+            return
+
+    started = time.perf_counter()
+    chunks: list[str] = []
+    async for delta in strategy.stream(request):
+        if not chunks:
+            first_chunk_seconds.observe(
+                time.perf_counter() - started,
+                strategy=strategy.name,
+                kind=strategy.kind,
+            )
+        chunks.append(delta)
+        yield delta
+    rewrite_seconds.observe(
+        time.perf_counter() - started, strategy=strategy.name, kind=strategy.kind
+    )
+    if key is not None:
+        await _store(key, "".join(chunks))
+
+
+def build_response(
+    request: ContentRewriteRequest, rewritten_content: str
+) -> ContentRewriteResponse:
+    """构造改写结果。"""
+
+    return ContentRewriteResponse(
+        success=True,
+        rewrittenContent=rewritten_content,
+        originalContent=request.originalContent,
+        rewriteType=request.rewriteType,
+        targetTone=request.targetTone,
+        targetAudience=request.targetAudience,
+        originalLength=len(request.originalContent),
+        rewrittenLength=len(rewritten_content),
+    )
+
+
+async def rewrite(request: ContentRewriteRequest) -> ContentRewriteResponse:
+    """
+    根据指定要求改写文本内容
+
+    :param request: 改写请求
+    :return:
+    """
+    strategy = resolve(request)
+    chunks = [delta async for delta in stream_rewrite(strategy, request)]
+    return build_response(request, "".join(chunks))
+
+
+async def _rewrite_item(index: int, request: ContentRewriteRequest) -> dict[str, Any]:
+    """改写一个条目，失败时返回该条目的错误而不影响其他条目。"""
+
+    try:
+        response = await rewrite(request)
+    except ContentRewriteError as exc:
+        batch_items.inc(result="failed")
+        return {"index": index, "success": False, "error": str(exc)}
+    except Exception as exc:  # noqa: BLE001 - 单个条目失败不中断批次
+        log.exception("批量改写第 {} 条失败: {}", index, exc)
+        batch_items.inc(result="failed")
+        return {"index": index, "success": False, "error": "文案改写失败，请稍后重试"}
+    batch_items.inc(result="succeeded")
+    return {"index": index, **response.model_dump()}
+
+
+async def rewrite_many(
+    requests: Sequence[ContentRewriteRequest], concurrency: int
+) -> AsyncIterator[dict[str, Any]]:
+    """
+    并发改写多个条目，按完成顺序逐条产出结果
+
+    固定数量的工作协程依次领取条目，同时执行的条目数不超过 ``concurrency``；
+    调用方停止迭代（如客户端断开）时取消未完成的条目。
+
+    :param requests: 改写请求列表
+    :param concurrency: 同时执行的条目数
+    :return: 带 ``index`` 的单条改写结果，失败的条目为 ``{"index", "success": False, "error"}``
+    """
+    pending = iter(enumerate(requests))
+    results: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+
+    async def worker() -> None:
+        for index, request in pending:
+            await results.put(await _rewrite_item(index, request))
+
+    workers = [
+        asyncio.create_task(worker())
+        for _ in range(max(1, min(concurrency, len(requests))))
+    ]
+    try:
+        for _ in range(len(requests)):
+            yield await results.get()
+    finally:
+        for task in workers:
+            task.cancel()
+        for task in workers:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
@@ -0,0 +1,134 @@
+"""聊天历史分页缓存，侧边栏的前几页保存在 Redis，写操作时整体失效并递增版本号。"""
+
+from __future__ import annotations
+
+import uuid
+from typing import Any
+
+from msgspec import json
+from redis.exceptions import RedisError
+
+from common.log import log
+from core.config import settings
+from database.redis import redis_client
+from utils.metrics import metrics
+
+history_cache_requests = metrics.counter(
+    "history_cache_requests_total", "聊天历史缓存查询次数，按 hit/miss/error 区分"
+)
+history_cache_invalidations = metrics.counter(
+    "history_cache_invalidations_total", "聊天历史缓存失效次数，按触发原因区分"
+)
+history_cache_stale_writes = metrics.counter(
+    "history_cache_stale_writes_total", "读取后缓存已失效而放弃的写入次数"
+)
+
+# 版本号的保留时间，远长于一次读取到写回的间隔
+VERSION_TTL_SECONDS = 60 * 60 * 24 * 7
+
+# 仅当版本号与读取时一致才写入，避免失效前读到的旧数据在失效后写回
+_SET_IF_VERSION_SCRIPT = """
+if (redis.call('get', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('hset', KEYS[1], ARGV[2], ARGV[3])
+redis.call('expire', KEYS[1], ARGV[4])
+return 1
+"""
+
+
+def _cache_key(user_id: uuid.UUID) -> str:
+    """用户的历史缓存哈希，字段为各页的查询参数。"""
+
+    return f"{settings.HISTORY_CACHE_REDIS_PREFIX}:{user_id}"
+
+
+def _version_key(user_id: uuid.UUID) -> str:
+    """用户历史缓存的版本号，每次失效时递增。"""
+
+    return f"{settings.HISTORY_CACHE_REDIS_PREFIX}:{user_id}:version"
+
+
+def page_field(limit: int, cursor: str | None) -> str:
+    """缓存字段名。"""
+
+    return f"{limit}:{cursor or ''}"
+
+
+def is_cacheable_page(page: int | None) -> bool:
+    """只缓存前 ``HISTORY_CACHE_PAGES`` 页。"""
+
+    return page is not None and page < settings.HISTORY_CACHE_PAGES
+
+
+async def get_page(user_id: uuid.UUID, field: str) -> tuple[str | None, str | None]:
+    """
+    读取缓存的分页结果与当前版本号
+
+    未命中时需在查询数据库之前取得版本号，写回时以此判断缓存是否已被失效。
+
+    :param user_id: 用户ID
+    :param field: 缓存字段
+    :return: ``(已序列化的JSON, 版本号)``，未命中时JSON为 None，Redis 不可用时版本号为 None
+    """
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.hget(_cache_key(user_id), field)
+            pipe.get(_version_key(user_id))
+            cached, version = await pipe.execute()
+    except RedisError as exc:
+        log.warning("聊天历史缓存读取失败: {}", exc)
+        history_cache_requests.inc(result="error")
+        return None, None
+    history_cache_requests.inc(result="hit" if cached is not None else "miss")
+    return cached, version or "0"
+
+
+async def set_page(
+    user_id: uuid.UUID, field: str, payload: dict[str, Any], version: str
+) -> bool:
+    """
+    写入分页结果，读取后缓存已失效时放弃写入
+
+    :param user_id: 用户ID
+    :param field: 缓存字段
+    :param payload: 分页结果
+    :param version: ``get_page`` 返回的版本号
+    :return: 是否已写入
+    """
+    try:
+        stored = await redis_client.eval(
+            _SET_IF_VERSION_SCRIPT,
+            2,
+            _cache_key(user_id),
+            _version_key(user_id),
+            version,
+            field,
+            json.encode(payload).decode(),
+            settings.HISTORY_CACHE_TTL_SECONDS,
+        )
+    except RedisError as exc:
+        log.warning("聊天历史缓存写入失败: {}", exc)
+        return False
+    if not stored:
+        history_cache_stale_writes.inc()
+    return bool(stored)
+
+
+async def invalidate(user_id: uuid.UUID, reason: str) -> None:
+    """
+    使用户的全部历史缓存失效
+
+    :param user_id: 用户ID
+    :param reason: 触发原因，用于指标统计
+    :return:
+    """
+    history_cache_invalidations.inc(reason=reason)
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.incr(_version_key(user_id))
+            pipe.expire(_version_key(user_id), VERSION_TTL_SECONDS)
+            pipe.delete(_cache_key(user_id))
+            await pipe.execute()
+    except RedisError as exc:
+        log.warning("聊天历史缓存失效失败: {}", exc)
@@ -0,0 +1,183 @@
+"""生成图片的内容寻址缓存：相同参数的请求复用已保存到本地的图片，按总字节数淘汰。"""
+
+from __future__ import annotations
+
+import hashlib
+import time
+from typing import Any
+
+from msgspec import json
+from redis.exceptions import RedisError
+
+from app.services import image_storage
+from common.log import log
+from core.config import settings
+from core.path_config import UPLOAD_DIR
+from database.redis import redis_client
+from utils.metrics import metrics
+
+cache_requests = metrics.counter(
+    "image_cache_requests_total", "图片缓存查询次数，按 hit/miss/error 区分"
+)
+cache_hit_ratio = metrics.gauge("image_cache_hit_ratio", "图片缓存命中率")
+bytes_saved = metrics.counter(
+    "image_cache_bytes_saved_total", "命中缓存而无需再次生成与下载的图片字节数"
+)
+cache_bytes = metrics.gauge("image_cache_bytes", "缓存图片占用的总字节数")
+evictions = metrics.counter("image_cache_evictions_total", "按容量淘汰的缓存条目数")
+
+# 条目不存在时登记并累加总字节数，已存在时只刷新最近使用时间并返回已登记的结果
+_REGISTER_SCRIPT = """
+if redis.call('hsetnx', KEYS[1], 'bytes', ARGV[3]) == 0 then
+    redis.call('zadd', KEYS[2], ARGV[4], ARGV[5])
+    return {0, redis.call('hget', KEYS[1], 'result')}
+end
+redis.call('hset', KEYS[1], 'result', ARGV[1], 'files', ARGV[2])
+redis.call('zadd', KEYS[2], ARGV[4], ARGV[5])
+return {1, redis.call('incrby', KEYS[3], ARGV[3])}
+"""
+
+# 删除条目并扣减总字节数，返回释放的字节数与文件列表；条目已被删除时返回 0
+_EVICT_SCRIPT = """
+local entry = redis.call('hmget', KEYS[1], 'bytes', 'files')
+redis.call('del', KEYS[1])
+redis.call('zrem', KEYS[2], ARGV[1])
+if not entry[1] then
+    return {0, '[]'}
+end
+redis.call('decrby', KEYS[3], entry[1])
+return {tonumber(entry[1]), entry[2]}
+"""
+
+
+def record(result: str) -> None:
+    """记录一次查询结果并更新命中率。"""
+
+    cache_requests.inc(result=result)
+    hits = cache_requests.value(result="hit")
+    lookups = hits + cache_requests.value(result="miss")
+    if lookups:
+        cache_hit_ratio.set(hits / lookups)
+
+
+def cache_key(styled_prompt: str, image_size: str, model: str, seed: int) -> str:
+    """
+    计算缓存键：图片由风格化后的提示词、上游尺寸、模型与固定种子唯一决定
+
+    :param styled_prompt: ``enhance_prompt_with_style`` 处理后的提示词
+    :param image_size: ``map_size_to_silicon_flow`` 映射后的尺寸
+    :param model: 上游模型ID
+    :param seed: 随机种子
+    :return:
+    """
+    return hashlib.sha256(
+        json.encode([styled_prompt, image_size, model, seed])
+    ).hexdigest()
+
+
+def _entry_key(digest: str) -> str:
+    return f"{settings.IMAGE_CACHE_REDIS_PREFIX}:entry:{digest}"
+
+
+def _lru_key() -> str:
+    return f"{settings.IMAGE_CACHE_REDIS_PREFIX}:lru"
+
+
+def _bytes_key() -> str:
+    return f"{settings.IMAGE_CACHE_REDIS_PREFIX}:bytes"
+
+
+async def get(digest: str) -> dict[str, Any] | None:
+    """
+    读取缓存结果并刷新其最近使用时间
+
+    :param digest: 缓存键
+    :return: 图片地址已替换为本地地址的上游结果，未命中时返回 None
+    """
+    try:
+        entry = await redis_client.hgetall(_entry_key(digest))
+        if not entry:
+            record("miss")
+            return None
+        files = json.decode(entry["files"])
+        if not all((UPLOAD_DIR / path).is_file() for path in files):
+            # 文件已被外部清理，删除条目后按未命中处理
+            await _evict(digest)
+            record("miss")
+            return None
+        await redis_client.zadd(_lru_key(), {digest: time.time()})
+    except RedisError as exc:
+        log.warning("图片缓存读取失败: {}", exc)
+        record("error")
+        return None
+
+    record("hit")
+    bytes_saved.inc(int(entry["bytes"]))
+    return json.decode(entry["result"])
+
+
+async def store(
+    digest: str, result: dict[str, Any], files: list[str], size: int
+) -> dict[str, Any] | None:
+    """
+    登记已保存到本地的图片，超出容量时按最近使用时间淘汰
+
+    登记是原子的，其他进程已登记同一缓存键时不重复计入总字节数。
+
+    :param digest: 缓存键
+    :param result: 本地化后的结果
+    :param files: 相对 ``UPLOAD_DIR`` 的文件列表
+    :param size: 文件总字节数
+    :return: 应返回给客户端的结果：登记成功时为 ``result``，已有登记时为已登记的结果，
+        Redis 不可用时为 None；后两种情况下 ``files`` 未登记、不会被淘汰，由调用方删除
+    """
+    try:
+        created, value = await redis_client.eval(
+            _REGISTER_SCRIPT,
+            3,
+            _entry_key(digest),
+            _lru_key(),
+            _bytes_key(),
+            json.encode(result).decode(),
+            json.encode(files).decode(),
+            size,
+            time.time(),
+            digest,
+        )
+    except RedisError as exc:
+        log.warning("图片缓存写入失败: {}", exc)
+        return None
+    if not created:
+        return json.decode(value)
+
+    total = int(value)
+    cache_bytes.set(total)
+    try:
+        await _enforce_capacity(total)
+    except RedisError as exc:
+        log.warning("图片缓存淘汰失败: {}", exc)
+    return result
+
+
+async def _evict(digest: str) -> int:
+    """删除一个条目及其登记的文件，返回释放的字节数。"""
+
+    size, files = await redis_client.eval(
+        _EVICT_SCRIPT, 3, _entry_key(digest), _lru_key(), _bytes_key(), digest
+    )
+    # 只删除条目登记的文件，同一缓存键下正在写入的其他目录不受影响
+    await image_storage.discard(json.decode(files))
+    return int(size)
+
+
+async def _enforce_capacity(total: int) -> None:
+    """总字节数超过 ``IMAGE_CACHE_MAX_BYTES`` 时淘汰最久未使用的条目。"""
+
+    while total > settings.IMAGE_CACHE_MAX_BYTES:
+        oldest = await redis_client.zpopmin(_lru_key(), 1)
+        if not oldest:
+            break
+        digest, _ = oldest[0]
+        total -= await _evict(digest)
+        evictions.inc()
+    cache_bytes.set(max(total, 0))
@@ -0,0 +1,218 @@
+"""图片生成：调用 OpenAI 兼容（硅基流动）图片接口。"""
+
+from __future__ import annotations
+
+import os
+import time
+from typing import Any
+
+import httpx
+
+from app.services import image_cache, image_storage
+from app.services.resilience import CircuitBreaker, CircuitOpenError, ResiliencePolicy
+from app.services.single_flight import SingleFlight
+from common.log import log
+from core.config import settings
+from utils.http_client import http_clients
+
+# 固定种子，相同参数生成相同的图片
+IMAGE_SEED = 222
+
+
+def enhance_prompt_with_style(prompt: str, style: str) -> str:
+    """根据风格增强提示词"""
+    style_enhancements = {
+        "realistic": "photorealistic, high quality, detailed",
+        "artistic": "artistic, creative, expressive, painterly",
+        "cartoon": "cartoon style, animated, colorful, fun",
+        "abstract": "abstract art, conceptual, modern, artistic interpretation",
+    }
+
+    enhancement = style_enhancements.get(style, "")
+    return f"{prompt}, {enhancement}" if enhancement else prompt
+
+
+def map_size_to_silicon_flow(size: str) -> str:
+    """将尺寸映射到硅基流动支持的格式"""
+    size_map = {
+        "512x512": "768x1024",
+        "768x768": "768x1024",
+        "1024x1024": "1024x1024",
+    }
+    return size_map.get(size, "768x1024")
+
+
+class ImageGenerationError(RuntimeError):
+    """图片生成过程中产生的业务异常。"""
+
+    def __init__(self, message: str, *, retryable: bool = False) -> None:
+        super().__init__(message)
+        # 上游超时、网络错误、限流与 5xx 可以重试，并计入熔断统计
+        self.retryable = retryable
+
+
+class ImageProviderUnavailable(ImageGenerationError):
+    """熔断器打开，图片服务暂不可用。"""
+
+
+# 上游图片服务的熔断与重试，熔断状态由所有进程共享
+image_policy = ResiliencePolicy(
+    CircuitBreaker(
+        "image_generation",
+        prefix=settings.CIRCUIT_BREAKER_REDIS_PREFIX,
+        failure_threshold=settings.IMAGE_PROVIDER_FAILURE_THRESHOLD,
+        window_seconds=settings.IMAGE_PROVIDER_FAILURE_WINDOW_SECONDS,
+        open_seconds=settings.IMAGE_PROVIDER_OPEN_SECONDS,
+    ),
+    max_attempts=settings.IMAGE_PROVIDER_MAX_ATTEMPTS,
+    backoff_base=settings.IMAGE_PROVIDER_BACKOFF_BASE_SECONDS,
+    backoff_cap=settings.IMAGE_PROVIDER_BACKOFF_CAP_SECONDS,
+    hedge_percentile=settings.IMAGE_PROVIDER_HEDGE_PERCENTILE,
+    hedge_min_samples=settings.IMAGE_PROVIDER_HEDGE_MIN_SAMPLES,
+)
+
+
+# 相同参数的并发请求共享一次上游调用
+image_flight = SingleFlight(
+    "image_generation",
+    prefix=settings.IMAGE_SINGLE_FLIGHT_REDIS_PREFIX,
+    lock_seconds=settings.IMAGE_SINGLE_FLIGHT_LOCK_SECONDS,
+    result_seconds=settings.IMAGE_SINGLE_FLIGHT_RESULT_SECONDS,
+    error_type=ImageGenerationError,
+    error_types=(ImageGenerationError, ImageProviderUnavailable),
+)
+
+
+def image_model_id() -> str:
+    """上游图片模型ID。"""
+
+    return os.getenv("OPENAI_IMAGE_MODEL_ID", "stabilityai/stable-diffusion-3-medium")
+
+
+async def generate_image_with_ai(
+    prompt: str, style: str, size: str, *, timeout: float | None = None
+) -> dict[str, Any]:
+    """
+    使用硅基流动API生成图片
+
+    种子固定，相同参数生成的图片相同：开启 ``IMAGE_CACHE`` 时优先返回本地缓存的图片，
+    并发的相同请求（含其他进程）合并为一次上游调用。生成的图片保存到本地并附带缩放版本，
+    保存失败时返回上游地址。
+
+    :param prompt: 图片描述
+    :param style: 风格
+    :param size: 尺寸
+    :param timeout: 本次请求的最长等待时间（秒），默认 ``IMAGE_GENERATION_TIMEOUT_SECONDS``；
+        超时只结束本次等待，不会取消其他请求共享的上游调用
+    :return:
+    """
+    api_key = os.getenv("OPENAI_API_KEY")
+    base_url = os.getenv("OPENAI_BASE_URL")
+
+    if not api_key or not base_url:
+        raise ImageGenerationError("Silicon Flow API key or base URL not configured")
+
+    # 根据style调整prompt
+    styled_prompt = enhance_prompt_with_style(prompt, style)
+    image_size = map_size_to_silicon_flow(size)
+    model = image_model_id()
+    digest = image_cache.cache_key(styled_prompt, image_size, model, IMAGE_SEED)
+
+    if settings.IMAGE_CACHE:
+        cached = await image_cache.get(digest)
+        if cached is not None:
+            return cached
+
+    # 熔断期间直接失败，不等待上游
+    try:
+        await image_policy.breaker.ensure_closed()
+    except CircuitOpenError:
+        raise ImageProviderUnavailable("图片服务暂不可用，请稍后重试") from None
+
+    # 确保 baseURL 正确格式化，避免重复的 /v1
+    api_url = f"{base_url.rstrip('/').removesuffix('/v1')}/v1/images/generations"
+
+    payload = {
+        "model": model,
+        "prompt": styled_prompt,
+        "negative_prompt": "",
+        "seed": IMAGE_SEED,
+        "image_size": image_size,
+    }
+
+    async def call() -> dict[str, Any]:
+        try:
+            data = await image_policy.run(
+                lambda: _request_image(api_url, api_key, payload),
+                deadline=time.monotonic() + settings.IMAGE_PROVIDER_DEADLINE_SECONDS,
+                is_retryable=_is_retryable,
+            )
+        except CircuitOpenError:
+            raise ImageProviderUnavailable("图片服务暂不可用，请稍后重试") from None
+        except TimeoutError:
+            raise ImageGenerationError("图片生成超时，请稍后重试") from None
+        # 图片只在执行者处下载一次，登记到缓存索引后按容量统一淘汰
+        try:
+            stored = await image_storage.localize(digest, data)
+        except image_storage.UnsafeImageError:
+            raise ImageGenerationError("上游返回的图片无效，请稍后重试") from None
+        if stored is None:
+            return data
+        localized, files, size = stored
+        registered = await image_cache.store(digest, localized, files, size)
+        if registered is localized:
+            return localized
+        # 未登记的文件不会被淘汰，删除后返回已登记的结果或上游地址
+        await image_storage.discard(files)
+        return data if registered is None else registered
+
+    try:
+        return await image_flight.do(
+            digest,
+            call,
+            timeout=timeout or settings.IMAGE_GENERATION_TIMEOUT_SECONDS,
+        )
+    except TimeoutError:
+        raise ImageGenerationError("图片生成超时，请稍后重试") from None
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    return isinstance(exc, ImageGenerationError) and exc.retryable
+
+
+async def _request_image(
+    api_url: str, api_key: str, payload: dict[str, Any]
+) -> dict[str, Any]:
+    """调用上游图片接口。"""
+
+    # 硅基流动图片生成API调用，复用应用级连接池
+    client = http_clients.get(api_url)
+    try:
+        response = await client.post(
+            api_url,
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json",
+            },
+            json=payload,
+        )
+
+        if not response.is_success:
+            error_text = await response.aread()
+            raise ImageGenerationError(
+                f"API错误: HTTP {response.status_code}: {error_text.decode()}",
+                retryable=response.status_code == 429 or response.status_code >= 500,
+            )
+
+        data = response.json()
+        log.debug("图片生成结果: {}", data)
+
+        if not data.get("data") or len(data["data"]) == 0:
+            raise ImageGenerationError("No image generated")
+
+        return data
+
+    except httpx.TimeoutException:
+        raise ImageGenerationError("图片生成超时，请稍后重试", retryable=True)
+    except httpx.RequestError as exc:
+        raise ImageGenerationError(f"网络请求错误: {exc}", retryable=True)
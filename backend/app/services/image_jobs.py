@@ -0,0 +1,327 @@
+"""异步图片生成任务：请求入队后立即返回，后台工作协程生成并将状态写入 Redis。"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import os
+import socket
+import time
+import uuid
+from collections.abc import AsyncIterator
+from typing import Any
+
+from msgspec import json
+from redis.exceptions import RedisError
+
+from app.services.image_generation import ImageGenerationError, generate_image_with_ai
+from common.log import log
+from core.config import settings
+from database.redis import redis_client
+from utils.metrics import metrics
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+TERMINAL_STATUSES = frozenset({SUCCEEDED, FAILED})
+
+jobs_total = metrics.counter(
+    "image_jobs_total",
+    "图片生成任务结果，按 succeeded/failed/requeued/recovered 区分",
+)
+jobs_active = metrics.gauge("image_jobs_active", "本进程正在执行的图片生成任务数")
+job_seconds = metrics.histogram("image_job_seconds", "图片生成任务从开始到结束的耗时")
+queue_wait_seconds = metrics.histogram(
+    "image_job_queue_wait_seconds", "图片生成任务在队列中的等待时间"
+)
+
+
+class ImageJobQueueFull(Exception):
+    """等待中的任务数已达上限。"""
+
+
+def _job_key(job_id: str) -> str:
+    return f"{settings.IMAGE_JOB_REDIS_PREFIX}:job:{job_id}"
+
+
+def _queue_key() -> str:
+    return f"{settings.IMAGE_JOB_REDIS_PREFIX}:queue"
+
+
+def _channel(job_id: str) -> str:
+    return f"{settings.IMAGE_JOB_REDIS_PREFIX}:events:{job_id}"
+
+
+def _consumers_key() -> str:
+    return f"{settings.IMAGE_JOB_REDIS_PREFIX}:consumers"
+
+
+def _processing_key(consumer: str) -> str:
+    return f"{settings.IMAGE_JOB_REDIS_PREFIX}:processing:{consumer}"
+
+
+def _heartbeat_key(consumer: str) -> str:
+    return f"{settings.IMAGE_JOB_REDIS_PREFIX}:heartbeat:{consumer}"
+
+
+def to_public(job: dict[str, Any]) -> dict[str, Any]:
+    """
+    将 Redis 中的任务记录转换为接口返回结构
+
+    :param job: 任务记录
+    :return:
+    """
+    payload: dict[str, Any] = {
+        "jobId": job["id"],
+        "status": job["status"],
+        "prompt": job["prompt"],
+        "style": job["style"],
+        "size": job["size"],
+        "createdAt": float(job["created_at"]),
+        "updatedAt": float(job["updated_at"]),
+    }
+    if job.get("result"):
+        payload["result"] = json.decode(job["result"])
+    if job.get("error"):
+        payload["error"] = job["error"]
+    return payload
+
+
+async def get_job(job_id: str) -> dict[str, Any] | None:
+    """
+    读取任务记录
+
+    :param job_id: 任务ID
+    :return: 任务记录，不存在或已过期时返回 None
+    """
+    job = await redis_client.hgetall(_job_key(job_id))
+    return job or None
+
+
+async def _update(job_id: str, **fields: Any) -> dict[str, Any]:
+    """更新任务状态并向订阅方广播最新记录。"""
+
+    fields["updated_at"] = time.time()
+    key = _job_key(job_id)
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.hset(key, mapping=fields)
+        pipe.expire(key, settings.IMAGE_JOB_TTL_SECONDS)
+        pipe.hgetall(key)
+        *_, job = await pipe.execute()
+    await redis_client.publish(_channel(job_id), json.encode(to_public(job)))
+    return job
+
+
+async def submit(
+    user_id: uuid.UUID, prompt: str, style: str, size: str
+) -> dict[str, str]:
+    """
+    创建任务并加入队列
+
+    :param user_id: 提交任务的用户
+    :param prompt: 图片描述
+    :param style: 风格
+    :param size: 尺寸
+    :return: 任务记录
+    """
+    queue_key = _queue_key()
+    if await redis_client.llen(queue_key) >= settings.IMAGE_JOB_QUEUE_SIZE:
+        raise ImageJobQueueFull
+
+    now = time.time()
+    job = {
+        "id": uuid.uuid4().hex,
+        "user_id": str(user_id),
+        "status": QUEUED,
+        "prompt": prompt,
+        "style": style,
+        "size": size,
+        "created_at": now,
+        "updated_at": now,
+    }
+    key = _job_key(job["id"])
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.hset(key, mapping=job)
+        pipe.expire(key, settings.IMAGE_JOB_TTL_SECONDS)
+        pipe.lpush(queue_key, job["id"])
+        await pipe.execute()
+    return {name: str(value) for name, value in job.items()}
+
+
+async def _process(job_id: str, processing_key: str) -> None:
+    """
+    执行一个任务，结束后移出处理中列表；进程关闭导致的取消会把任务放回队列
+
+    :param job_id: 任务ID
+    :param processing_key: 本进程的处理中列表
+    :return:
+    """
+    job = await get_job(job_id)
+    if job is None or job["status"] != QUEUED:
+        await redis_client.lrem(processing_key, 1, job_id)
+        return
+
+    started = time.monotonic()
+    queue_wait_seconds.observe(max(0.0, time.time() - float(job["created_at"])))
+    jobs_active.inc()
+    await _update(job_id, status=RUNNING)
+    try:
+        result = await generate_image_with_ai(
+            job["prompt"],
+            job["style"],
+            job["size"],
+            timeout=settings.IMAGE_JOB_TIMEOUT_SECONDS,
+        )
+    except asyncio.CancelledError:
+        await _update(job_id, status=QUEUED)
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.lrem(processing_key, 1, job_id)
+            pipe.rpush(_queue_key(), job_id)
+            await pipe.execute()
+        jobs_total.inc(result="requeued")
+        raise
+    except ImageGenerationError as exc:
+        await _update(job_id, status=FAILED, error=str(exc))
+        jobs_total.inc(result="failed")
+    except Exception as exc:  # noqa: BLE001 - 单个任务失败不影响工作协程
+        log.exception("图片生成任务 {} 失败: {}", job_id, exc)
+        await _update(job_id, status=FAILED, error="图片生成失败，请稍后重试")
+        jobs_total.inc(result="failed")
+    else:
+        await _update(job_id, status=SUCCEEDED, result=json.encode(result).decode())
+        jobs_total.inc(result="succeeded")
+    finally:
+        jobs_active.dec()
+        job_seconds.observe(time.monotonic() - started)
+    await redis_client.lrem(processing_key, 1, job_id)
+
+
+async def _worker(consumer: str) -> None:
+    """循环从队列取出任务执行，取出的任务在执行期间保存在本进程的处理中列表。"""
+
+    queue_key = _queue_key()
+    processing_key = _processing_key(consumer)
+    while True:
+        try:
+            job_id = await redis_client.blmove(
+                queue_key,
+                processing_key,
+                settings.IMAGE_JOB_POLL_SECONDS,
+                src="RIGHT",
+                dest="LEFT",
+            )
+            if job_id is None:
+                continue
+            await _process(job_id, processing_key)
+        except asyncio.CancelledError:
+            raise
+        except RedisError as exc:
+            log.warning("图片生成任务队列读取失败，稍后重试: {}", exc)
+            await asyncio.sleep(1)
+
+
+async def reap_stale_consumers() -> int:
+    """
+    将心跳已过期的进程的处理中任务放回队列
+
+    进程崩溃时不会执行取消分支，其处理中列表由仍存活的进程接管。
+
+    :return: 放回队列的任务数
+    """
+    recovered = 0
+    for consumer in await redis_client.smembers(_consumers_key()):
+        if await redis_client.exists(_heartbeat_key(consumer)):
+            continue
+        processing_key = _processing_key(consumer)
+        # 先改回排队状态再放回队列，工作协程取出后才会执行
+        for job_id in await redis_client.lrange(processing_key, 0, -1):
+            if await get_job(job_id) is not None:
+                await _update(job_id, status=QUEUED)
+        moved = 0
+        while await redis_client.lmove(
+            processing_key, _queue_key(), src="LEFT", dest="RIGHT"
+        ):
+            moved += 1
+        await redis_client.srem(_consumers_key(), consumer)
+        log.warning("图片生成任务进程 {} 心跳超时，已放回 {} 个任务", consumer, moved)
+        recovered += moved
+    if recovered:
+        jobs_total.inc(recovered, result="recovered")
+    return recovered
+
+
+async def _keepalive(consumer: str) -> None:
+    """定期刷新本进程的心跳，并回收其他进程遗留的任务。"""
+
+    interval = settings.IMAGE_JOB_HEARTBEAT_SECONDS / 3
+    while True:
+        try:
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.set(
+                    _heartbeat_key(consumer),
+                    1,
+                    ex=settings.IMAGE_JOB_HEARTBEAT_SECONDS,
+                )
+                pipe.sadd(_consumers_key(), consumer)
+                await pipe.execute()
+            await reap_stale_consumers()
+        except RedisError as exc:
+            log.warning("图片生成任务心跳刷新失败: {}", exc)
+        await asyncio.sleep(interval)
+
+
+async def run_workers() -> None:
+    """启动 ``IMAGE_JOB_WORKERS`` 个工作协程，随应用生命周期运行。"""
+
+    consumer = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    tasks = [
+        asyncio.create_task(_worker(consumer))
+        for _ in range(settings.IMAGE_JOB_WORKERS)
+    ]
+    tasks.append(asyncio.create_task(_keepalive(consumer)))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # 处理中的任务已在取消时放回队列；放回失败的任务由其他进程在心跳过期后回收
+        with contextlib.suppress(RedisError):
+            await redis_client.delete(_heartbeat_key(consumer))
+
+
+async def follow(job_id: str) -> AsyncIterator[dict[str, Any]]:
+    """
+    订阅任务进度，依次产出任务记录直至任务结束
+
+    先订阅再读取当前状态，订阅前发生的状态变化不会丢失。
+    任务不存在或已过期时不产出任何记录。
+
+    :param job_id: 任务ID
+    :return:
+    """
+    pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+    try:
+        await pubsub.subscribe(_channel(job_id))
+        job = await get_job(job_id)
+        if job is None:
+            return
+        current = to_public(job)
+        yield current
+        while current["status"] not in TERMINAL_STATUSES:
+            message = await pubsub.get_message(timeout=1.0)
+            if message is not None:
+                update = json.decode(message["data"])
+            else:
+                # 空闲时回读记录，兼容订阅中断与任务过期
+                job = await get_job(job_id)
+                if job is None:
+                    return
+                update = to_public(job)
+            if update["updatedAt"] <= current["updatedAt"]:
+                continue
+            current = update
+            yield current
+    finally:
+        await pubsub.aclose()
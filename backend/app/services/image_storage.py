@@ -0,0 +1,237 @@
+"""生成图片的本地存储：上游图片只下载一次，保存到 UPLOAD_DIR 并生成 WebP 缩放版本。"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import copy
+import shutil
+import uuid
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any
+
+import httpx
+from PIL import Image
+
+from common.log import log
+from core.config import settings
+from core.path_config import UPLOAD_DIR
+from utils.http_client import http_clients
+from utils.image_variants import build_variants
+from utils.metrics import metrics
+
+CONTENT_TYPE_SUFFIXES = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/webp": ".webp",
+    "image/gif": ".gif",
+}
+
+stored_images = metrics.counter(
+    "image_storage_images_total", "保存到本地的生成图片数，按 stored/failed 区分"
+)
+variant_seconds = metrics.histogram(
+    "image_variant_seconds", "单张图片生成全部缩放版本的耗时"
+)
+
+_executor: ProcessPoolExecutor | None = None
+
+
+class UnsafeImageError(ValueError):
+    """上游返回的图片像素数超出 Pillow 的解压炸弹上限。"""
+
+
+def image_dir(digest: str) -> Path:
+    """图片参数摘要对应的存储目录，每次保存写入其下独立的子目录。"""
+
+    return UPLOAD_DIR / settings.IMAGE_STORAGE_DIR_NAME / digest
+
+
+def public_url(path: Path) -> str:
+    """通过 ``/static/upload`` 访问本地文件的地址。"""
+
+    return f"/static/upload/{path.relative_to(UPLOAD_DIR).as_posix()}"
+
+
+def image_items(result: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    """遍历上游结果中带 ``url`` 的图片条目（``images`` 与 ``data`` 两种字段）。"""
+
+    for field in ("images", "data"):
+        for item in result.get(field) or []:
+            if isinstance(item, dict) and item.get("url"):
+                yield item
+
+
+def _media_type(content_type: str | None) -> str:
+    return (content_type or "").split(";")[0].strip().lower()
+
+
+async def _download(url: str) -> tuple[bytes, str]:
+    """下载一张图片，超过大小上限时抛出异常，返回内容与媒体类型。"""
+
+    client = http_clients.get(url)
+    async with client.stream("GET", url) as response:
+        response.raise_for_status()
+        chunks: list[bytes] = []
+        size = 0
+        async for chunk in response.aiter_bytes():
+            size += len(chunk)
+            if size > settings.IMAGE_DOWNLOAD_MAX_BYTES:
+                raise ValueError(f"图片超过 {settings.IMAGE_DOWNLOAD_MAX_BYTES} 字节")
+            chunks.append(chunk)
+    return b"".join(chunks), _media_type(response.headers.get("content-type"))
+
+
+def _prune(directory: Path) -> None:
+    """删除已空的保存目录及其所在的图片参数摘要目录。"""
+
+    root = UPLOAD_DIR / settings.IMAGE_STORAGE_DIR_NAME
+    with contextlib.suppress(OSError):
+        while directory != root and directory.is_relative_to(root):
+            directory.rmdir()
+            directory = directory.parent
+
+
+def _remove(directory: Path) -> None:
+    """删除一次保存的目录。"""
+
+    shutil.rmtree(directory, ignore_errors=True)
+    _prune(directory.parent)
+
+
+def _unlink(files: list[str]) -> None:
+    """逐个删除文件，不删除目录中其他请求写入的文件。"""
+
+    directories = set()
+    for path in files:
+        file = UPLOAD_DIR / path
+        file.unlink(missing_ok=True)
+        directories.add(file.parent)
+    for directory in directories:
+        _prune(directory)
+
+
+async def discard(files: list[str]) -> None:
+    """
+    删除一次保存的本地文件，同一摘要下其他请求写入的文件不受影响
+
+    :param files: ``localize`` 返回的相对 ``UPLOAD_DIR`` 的文件列表
+    :return:
+    """
+    await asyncio.to_thread(_unlink, files)
+
+
+def _pool() -> ProcessPoolExecutor:
+    """图片缩放使用的进程池，首次使用时创建。"""
+
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_VARIANT_WORKERS)
+    return _executor
+
+
+def shutdown() -> None:
+    """
+    关闭进程池，用于关闭应用前
+
+    :return:
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def _store_one(
+    directory: Path, index: int, url: str, content: bytes, media_type: str
+) -> dict[str, Any]:
+    """保存原图并在进程池中生成缩放版本，返回图片元数据。"""
+
+    original = directory / f"{index}{CONTENT_TYPE_SUFFIXES.get(media_type, '.png')}"
+    await asyncio.to_thread(original.write_bytes, content)
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    info = await loop.run_in_executor(
+        _pool(),
+        build_variants,
+        str(original),
+        str(directory),
+        settings.IMAGE_VARIANT_SIZES,
+        settings.IMAGE_VARIANT_QUALITY,
+    )
+    variant_seconds.observe(loop.time() - started)
+
+    return {
+        "url": public_url(original),
+        "sourceUrl": url,
+        "contentType": media_type or "image/png",
+        "width": info["width"],
+        "height": info["height"],
+        "bytes": len(content),
+        "variants": {
+            name: {
+                "url": public_url(directory / variant["file"]),
+                "width": variant["width"],
+                "height": variant["height"],
+                "bytes": variant["bytes"],
+            }
+            for name, variant in info["variants"].items()
+        },
+    }
+
+
+async def localize(
+    digest: str, result: dict[str, Any]
+) -> tuple[dict[str, Any], list[str], int] | None:
+    """
+    下载上游结果中的图片并保存到本地
+
+    返回的结果中每个图片条目的 ``url`` 替换为本地地址，并附带原图与各缩放版本的尺寸与字节数。
+
+    :param digest: 图片参数摘要，决定存储目录
+    :param result: 上游结果
+    :return: ``(本地化后的结果, 相对 UPLOAD_DIR 的文件列表, 总字节数)``，失败时返回 None
+    :raises UnsafeImageError: 图片像素数超出上限，不能把上游地址返回给客户端
+    """
+    urls = list(dict.fromkeys(item["url"] for item in image_items(result)))
+    if not urls:
+        return None
+
+    # 并发的请求与缓存淘汰只会删除各自的子目录
+    directory = image_dir(digest) / uuid.uuid4().hex
+    try:
+        blobs = [await _download(url) for url in urls]
+        await asyncio.to_thread(directory.mkdir, parents=True, exist_ok=True)
+        images = {
+            url: await _store_one(directory, index, url, content, media_type)
+            for index, (url, (content, media_type)) in enumerate(
+                zip(urls, blobs, strict=True)
+            )
+        }
+    except Image.DecompressionBombError as exc:
+        log.warning("生成图片像素数超出上限: {}", exc)
+        stored_images.inc(len(urls), result="failed")
+        await asyncio.to_thread(_remove, directory)
+        raise UnsafeImageError(str(exc)) from None
+    except (httpx.HTTPError, ValueError, OSError, BrokenProcessPool) as exc:
+        log.warning("生成图片保存失败，返回上游地址: {}", exc)
+        stored_images.inc(len(urls), result="failed")
+        await asyncio.to_thread(_remove, directory)
+        return None
+
+    localized = copy.deepcopy(result)
+    for item in image_items(localized):
+        item.update(images[item["url"]])
+
+    files: list[str] = []
+    total = 0
+    for image in images.values():
+        for entry in (image, *image["variants"].values()):
+            files.append(entry["url"].removeprefix("/static/upload/"))
+            total += entry["bytes"]
+    stored_images.inc(len(urls), result="stored")
+    return localized, files, total
@@ -0,0 +1,241 @@
+"""聊天模型的流式调用接口，兼容 OpenAI Chat Completions 协议。"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator, Sequence
+from typing import Any
+
+import httpx
+
+from app.models import ChatModelId, MessageRole
+from core.config import settings
+from utils.http_client import http_clients
+from utils.tokenizer import tokenizer
+
+SYSTEM_PROMPT = "You are a friendly assistant! Keep your responses concise and helpful."
+
+# 聊天模板为每条消息附加的角色与分隔符词元
+MESSAGE_OVERHEAD_TOKENS = 4
+
+DEFAULT_MODEL_IDS = {
+    ChatModelId.CHAT_MODEL: ("OPENAI_CHAT_MODEL_ID", "Qwen/Qwen2.5-7B-Instruct"),
+    ChatModelId.CHAT_MODEL_REASONING: (
+        "OPENAI_REASONING_MODEL_ID",
+        "deepseek-ai/DeepSeek-R1-Distill-Qwen-7B",
+    ),
+}
+
+
+class ChatProviderError(RuntimeError):
+    """聊天模型调用过程中产生的业务异常。"""
+
+
+class ChatStreamProvider(ABC):
+    """流式聊天模型提供方"""
+
+    name: str = "base"
+
+    @abstractmethod
+    def stream(
+        self, model: ChatModelId, messages: Sequence[dict[str, str]]
+    ) -> AsyncIterator[str]:
+        """
+        按生成顺序逐段返回回复文本
+
+        :param model: 聊天模型ID
+        :param messages: ``{"role", "content"}`` 格式的上下文消息
+        :return:
+        """
+
+
+def _last_user_text(messages: Sequence[dict[str, str]]) -> str:
+    """返回上下文中最后一条用户消息的文本。"""
+
+    for message in reversed(messages):
+        if message.get("role") == MessageRole.USER.value:
+            return message.get("content", "")
+    return ""
+
+
+class EchoChatProvider(ChatStreamProvider):
+    """回显用户消息的本地提供方，未接入模型时使用。"""
+
+    name = "echo"
+
+    def __init__(self, chunk_size: int = 8) -> None:
+        self.chunk_size = chunk_size
+
+    async def stream(
+        self, model: ChatModelId, messages: Sequence[dict[str, str]]
+    ) -> AsyncIterator[str]:
+        text = _last_user_text(messages)
+        reply = "收到消息：" + text if text else "我已收到你的消息。"
+        for start in range(0, len(reply), self.chunk_size):
+            yield reply[start : start + self.chunk_size]
+
+
+class FakeChatProvider(ChatStreamProvider):
+    """按预设分片输出的进程内提供方，用于测试。"""
+
+    name = "fake"
+
+    def __init__(
+        self,
+        chunks: Sequence[str],
+        *,
+        delay: float = 0.0,
+        error: Exception | None = None,
+    ) -> None:
+        self.chunks = list(chunks)
+        self.delay = delay
+        self.error = error
+        self.calls: list[tuple[ChatModelId, list[dict[str, str]]]] = []
+
+    async def stream(
+        self, model: ChatModelId, messages: Sequence[dict[str, str]]
+    ) -> AsyncIterator[str]:
+        self.calls.append((model, list(messages)))
+        for chunk in self.chunks:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            yield chunk
+        if self.error is not None:
+            raise self.error
+
+
+class OpenAICompatibleChatProvider(ChatStreamProvider):
+    """OpenAI 兼容接口的流式提供方，读取与图片生成相同的环境变量。"""
+
+    name = "openai"
+
+    def __init__(
+        self,
+        *,
+        api_key: str | None = None,
+        base_url: str | None = None,
+        timeout: float | None = None,
+    ) -> None:
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL")
+        self.timeout = timeout
+
+    @staticmethod
+    def resolve_model(model: ChatModelId) -> str:
+        """将前端模型ID映射为上游模型名称。"""
+
+        env_name, default = DEFAULT_MODEL_IDS[model]
+        return os.getenv(env_name, default)
+
+    async def stream(
+        self, model: ChatModelId, messages: Sequence[dict[str, str]]
+    ) -> AsyncIterator[str]:
+        if not self.api_key or not self.base_url:
+            raise ChatProviderError(
+                "OpenAI compatible API key or base URL not configured"
+            )
+
+        # 确保 baseURL 正确格式化，避免重复的 /v1
+        api_url = f"{self.base_url.rstrip('/').removesuffix('/v1')}/v1/chat/completions"
+        payload: dict[str, Any] = {
+            "model": self.resolve_model(model),
+            "messages": list(messages),
+            "stream": True,
+        }
+
+        try:
+            client = http_clients.get(api_url)
+            async with client.stream(
+                "POST",
+                api_url,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json",
+                },
+                json=payload,
+                timeout=self.timeout or httpx.USE_CLIENT_DEFAULT,
+            ) as response:
+                if not response.is_success:
+                    error_text = await response.aread()
+                    raise ChatProviderError(
+                        f"API错误: HTTP {response.status_code}: {error_text.decode()}"
+                    )
+                async for line in response.aiter_lines():
+                    delta = self._parse_line(line)
+                    if delta is None:
+                        break
+                    if delta:
+                        yield delta
+        except httpx.TimeoutException:
+            raise ChatProviderError("模型响应超时，请稍后重试")
+        except httpx.RequestError as exc:
+            raise ChatProviderError(f"网络请求错误: {exc}")
+
+    @staticmethod
+    def _parse_line(line: str) -> str | None:
+        """解析一行SSE数据，返回增量文本；遇到结束标记时返回 None。"""
+
+        if not line.startswith("data:"):
+            return ""
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return None
+        try:
+            chunk = json.loads(data)
+        except ValueError:
+            return ""
+        texts: list[str] = []
+        for choice in chunk.get("choices") or []:
+            content = (choice.get("delta") or {}).get("content")
+            if content:
+                texts.append(content)
+        return "".join(texts)
+
+
+def build_prompt_messages(
+    history: Sequence[dict[str, str]], system_prompt: str = SYSTEM_PROMPT
+) -> list[dict[str, str]]:
+    """在上下文前加入系统提示词。"""
+
+    return [{"role": MessageRole.SYSTEM.value, "content": system_prompt}, *history]
+
+
+def trim_history(
+    history: Sequence[dict[str, Any]],
+    budget: int,
+    system_prompt: str = SYSTEM_PROMPT,
+) -> tuple[list[dict[str, str]], int]:
+    """
+    从最新的消息开始保留，直到超出上下文预算
+
+    最后一条消息总会保留；每条消息的词元数按消息ID缓存，重复构造上下文时无需重新计数。
+
+    :param history: 按时间正序排列的 ``{"id", "role", "content"}`` 消息
+    :param budget: 上下文预算（词元）
+    :param system_prompt: 系统提示词
+    :return: 加入系统提示词后的上下文与其词元数
+    """
+    used = tokenizer.count(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+    kept: list[dict[str, str]] = []
+    for message in reversed(history):
+        tokens = (
+            tokenizer.count_message(message["id"], message["content"])
+            + MESSAGE_OVERHEAD_TOKENS
+        )
+        if kept and used + tokens > budget:
+            break
+        used += tokens
+        kept.append({"role": message["role"], "content": message["content"]})
+    kept.reverse()
+    return build_prompt_messages(kept, system_prompt), used
+
+
+def get_chat_provider() -> ChatStreamProvider:
+    """按配置返回聊天模型提供方，可通过依赖覆盖替换为测试实现。"""
+
+    if settings.CHAT_PROVIDER == "openai":
+        return OpenAICompatibleChatProvider()
+    return EchoChatProvider()
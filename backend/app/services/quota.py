@@ -0,0 +1,172 @@
+"""聊天消息配额，基于 Redis 有序集合实现24小时滑动窗口计数。"""
+
+from __future__ import annotations
+
+import uuid
+from datetime import UTC, datetime, timedelta
+
+from redis.exceptions import RedisError
+from sqlalchemy import ColumnElement, and_, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Chat, Message, MessageRole
+from common.log import log
+from core.config import settings
+from database.redis import redis_client
+
+MAX_MESSAGES_PER_DAY = {
+    "guest": 20,
+    "regular": 100,
+}
+
+QUOTA_WINDOW = timedelta(hours=24)
+
+
+def _window_key(user_id: uuid.UUID) -> str:
+    """用户消息窗口的有序集合 key。"""
+
+    return f"{settings.CHAT_QUOTA_REDIS_PREFIX}:window:{user_id}"
+
+
+def _synced_key(user_id: uuid.UUID) -> str:
+    """标记窗口最近一次与数据库对账的 key。"""
+
+    return f"{settings.CHAT_QUOTA_REDIS_PREFIX}:synced:{user_id}"
+
+
+def _to_score(moment: datetime) -> float:
+    """将（无时区的UTC）时间转换为有序集合分值。"""
+
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=UTC)
+    return moment.timestamp()
+
+
+def get_message_limit(user_type: str) -> int:
+    """返回用户类型对应的每日消息上限。"""
+
+    return MAX_MESSAGES_PER_DAY.get(user_type, MAX_MESSAGES_PER_DAY["regular"])
+
+
+def _user_messages_since(user_id: uuid.UUID, since: datetime) -> ColumnElement[bool]:
+    """构造用户在窗口内发送消息的过滤条件。"""
+
+    # 转换为无时区的时间戳，避免PostgreSQL时区比较错误
+    since_naive = since.replace(tzinfo=None)
+    return and_(
+        Chat.user_id == user_id,
+        Message.role == MessageRole.USER,
+        Message.created_at >= since_naive,
+    )
+
+
+async def count_messages_from_db(
+    db: AsyncSession, user_id: uuid.UUID, since: datetime
+) -> int:
+    """使用数据库统计窗口内的用户消息数量。"""
+
+    statement = (
+        select(func.count(Message.id))
+        .join(Chat, Chat.id == Message.chat_id)
+        .where(_user_messages_since(user_id, since))
+    )
+    result = await db.execute(statement)
+    return result.scalar_one()
+
+
+async def reconcile_user_window(
+    db: AsyncSession, user_id: uuid.UUID, limit: int
+) -> int:
+    """
+    以数据库为准重建用户的消息窗口
+
+    只需加载最近的 ``limit`` 条消息：更早的消息会先于它们滑出窗口，
+    因此判断是否超限的结果与完整加载一致。
+
+    :param db: 数据库会话
+    :param user_id: 用户ID
+    :param limit: 用户的每日消息上限
+    :return: 重建后窗口内的消息数量
+    """
+    window_start = datetime.now(UTC) - QUOTA_WINDOW
+    statement = (
+        select(Message.id, Message.created_at)
+        .join(Chat, Chat.id == Message.chat_id)
+        .where(_user_messages_since(user_id, window_start))
+        .order_by(Message.created_at.desc())
+        .limit(limit)
+    )
+    rows = (await db.execute(statement)).all()
+
+    window_key = _window_key(user_id)
+    ttl = int(QUOTA_WINDOW.total_seconds())
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.delete(window_key)
+        if rows:
+            pipe.zadd(
+                window_key,
+                {
+                    str(message_id): _to_score(created_at)
+                    for message_id, created_at in rows
+                },
+            )
+            pipe.expire(window_key, ttl)
+        pipe.set(_synced_key(user_id), 1, ex=settings.CHAT_QUOTA_RECONCILE_SECONDS)
+        await pipe.execute()
+    return len(rows)
+
+
+async def has_message_quota(
+    db: AsyncSession, user_id: uuid.UUID, user_type: str
+) -> bool:
+    """
+    检查24小时内的用户消息数量是否超限
+
+    优先读取 Redis 窗口；窗口未对账或已过对账周期时以数据库重建，
+    Redis 不可用时退回数据库计数。
+
+    :param db: 数据库会话
+    :param user_id: 用户ID
+    :param user_type: 用户类型
+    :return:
+    """
+    limit = get_message_limit(user_type)
+    window_key = _window_key(user_id)
+    window_start = datetime.now(UTC) - QUOTA_WINDOW
+
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(window_key, "-inf", f"({_to_score(window_start)}")
+            pipe.zcard(window_key)
+            pipe.exists(_synced_key(user_id))
+            _, count, synced = await pipe.execute()
+        if not synced:
+            count = await reconcile_user_window(db, user_id, limit)
+    except RedisError as e:
+        log.warning("聊天配额 Redis 不可用，回退数据库计数: {}", e)
+        count = await count_messages_from_db(db, user_id, window_start)
+
+    return count < limit
+
+
+async def record_user_message(
+    user_id: uuid.UUID, message_id: uuid.UUID, created_at: datetime
+) -> None:
+    """
+    在用户消息持久化后计入滑动窗口
+
+    写入失败只记录日志，下次对账时会以数据库为准修正。
+
+    :param user_id: 用户ID
+    :param message_id: 消息ID
+    :param created_at: 消息创建时间
+    :return:
+    """
+    window_key = _window_key(user_id)
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.zadd(window_key, {str(message_id): _to_score(created_at)})
+            pipe.expire(window_key, int(QUOTA_WINDOW.total_seconds()))
+            await pipe.execute()
+    except RedisError as e:
+        log.warning("聊天配额计数写入失败: {}", e)
@@ -0,0 +1,194 @@
+"""按用户的令牌桶限流：桶状态保存在 Redis 中由所有进程共享，进程内预检提前拒绝。"""
+
+from __future__ import annotations
+
+import math
+import time
+from typing import NamedTuple
+
+from redis.exceptions import RedisError
+
+from common.log import log
+from core.config import settings
+from database.redis import redis_client
+from utils.metrics import metrics
+
+PERIOD_SECONDS = {"second": 1, "minute": 60, "hour": 60 * 60, "day": 60 * 60 * 24}
+
+# 每个限流器在进程内保留估计值的最大用户数，超出时丢弃最早的
+LOCAL_MAX_SUBJECTS = 10000
+
+decisions = metrics.counter(
+    "rate_limit_decisions_total",
+    "限流判定次数，按名称、结果（allowed/limited）与来源（redis/local）区分",
+)
+
+# 按经过时间补充令牌并尝试取出，使用 Redis 服务器时间保证各进程一致
+_TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('time')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('hmget', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('hset', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('pexpire', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RateLimitResult(NamedTuple):
+    """一次限流判定的结果，用于生成 ``X-RateLimit-*`` 响应头。"""
+
+    allowed: bool
+    limit: int
+    remaining: int
+    # 桶恢复满额所需秒数
+    reset: int
+    # 被限流时下次可放行的等待秒数
+    retry_after: int
+
+
+class RateLimitExceeded(Exception):
+    """请求超出限流。"""
+
+    def __init__(self, surface: str, result: RateLimitResult) -> None:
+        super().__init__(surface)
+        self.surface = surface
+        self.result = result
+
+
+def parse_rate(rate: str) -> tuple[int, float]:
+    """
+    解析 ``"次数/时间单位"`` 格式的限额
+
+    :param rate: 如 ``"10/minute"``
+    :return: ``(桶容量, 每秒补充的令牌数)``
+    """
+    count, _, period = rate.partition("/")
+    capacity = int(count)
+    seconds = PERIOD_SECONDS.get(period.strip().removesuffix("s"))
+    if capacity <= 0 or seconds is None:
+        raise ValueError(f"无效的限额: {rate}")
+    return capacity, capacity / seconds
+
+
+class _LocalBucket(NamedTuple):
+    """进程内最近一次 Redis 判定后的剩余令牌。"""
+
+    tokens: float
+    synced_at: float
+
+
+class TokenBucketLimiter:
+    """
+    令牌桶限流器，桶容量为 ``capacity``，每秒补充 ``rate`` 个令牌
+
+    每个键的桶由 Redis 脚本原子地补充与扣减。进程内记录最近一次判定后的剩余令牌，
+    估计值加上此后的补充仍不足时直接拒绝（其他进程只会让令牌更少，判定是准确的）；
+    放行总是经过 Redis，多个进程合计不会超出限额。Redis 不可用时放行全部请求。
+    """
+
+    def __init__(self, name: str, *, capacity: int, rate: float, prefix: str) -> None:
+        self.name = name
+        self.capacity = capacity
+        self.rate = rate
+        self.prefix = prefix
+        self._local: dict[str, _LocalBucket] = {}
+
+    def _key(self, subject: str) -> str:
+        return f"{self.prefix}:{self.name}:{subject}"
+
+    def _result(self, allowed: bool, tokens: float, cost: int) -> RateLimitResult:
+        return RateLimitResult(
+            allowed=allowed,
+            limit=self.capacity,
+            remaining=max(0, math.floor(tokens)),
+            reset=math.ceil(max(0.0, self.capacity - tokens) / self.rate),
+            retry_after=0 if allowed else math.ceil((cost - tokens) / self.rate),
+        )
+
+    def _precheck(self, subject: str, cost: int, now: float) -> RateLimitResult | None:
+        """进程内预检，确定会被拒绝时返回结果，否则返回 None。"""
+
+        local = self._local.get(subject)
+        if local is None:
+            return None
+        # 其他进程的消耗未知，估计值是剩余令牌的上限
+        upper = min(self.capacity, local.tokens + (now - local.synced_at) * self.rate)
+        if upper < cost:
+            return self._result(False, upper, cost)
+        return None
+
+    async def hit(self, subject: str, cost: int = 1) -> RateLimitResult:
+        """
+        为一次请求取出令牌
+
+        :param subject: 限流对象（用户）
+        :param cost: 消耗的令牌数
+        :return: 判定结果
+        """
+        now = time.monotonic()
+        result = self._precheck(subject, cost, now)
+        if result is not None:
+            decisions.inc(name=self.name, result="limited", source="local")
+            return result
+
+        try:
+            allowed, tokens = await redis_client.eval(
+                _TOKEN_BUCKET_SCRIPT,
+                1,
+                self._key(subject),
+                self.capacity,
+                self.rate,
+                cost,
+            )
+        except RedisError as exc:
+            log.warning("限流 {} 不可用，放行请求: {}", self.name, exc)
+            return self._result(True, self.capacity, cost)
+
+        tokens = float(tokens)
+        self._local.pop(subject, None)
+        if len(self._local) >= LOCAL_MAX_SUBJECTS:
+            self._local.pop(next(iter(self._local)))
+        self._local[subject] = _LocalBucket(tokens, now)
+        decisions.inc(
+            name=self.name,
+            result="allowed" if allowed else "limited",
+            source="redis",
+        )
+        return self._result(bool(allowed), tokens, cost)
+
+
+_limiters: dict[str, TokenBucketLimiter] = {}
+
+
+def get_limiter(name: str) -> TokenBucketLimiter | None:
+    """
+    按名称返回 ``RATE_LIMITS`` 中配置的限流器
+
+    :param name: 限流名称
+    :return: 未配置时返回 None
+    """
+    rate = settings.RATE_LIMITS.get(name)
+    if rate is None:
+        return None
+    limiter = _limiters.get(name)
+    if limiter is None:
+        capacity, per_second = parse_rate(rate)
+        limiter = TokenBucketLimiter(
+            name,
+            capacity=capacity,
+            rate=per_second,
+            prefix=settings.RATE_LIMIT_REDIS_PREFIX,
+        )
+        _limiters[name] = limiter
+    return limiter
@@ -0,0 +1,309 @@
+"""出站调用的容错策略：跨进程共享状态的熔断器、带抖动的有限重试与对冲请求。"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import random
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from redis.exceptions import RedisError
+
+from common.log import log
+from database.redis import redis_client
+from utils.metrics import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATE_VALUES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+breaker_state = metrics.gauge(
+    "circuit_breaker_state", "熔断器状态（0 关闭，1 打开，2 半开），按名称区分"
+)
+breaker_rejections = metrics.counter(
+    "circuit_breaker_rejections_total", "熔断器打开期间直接拒绝的调用数"
+)
+retries_total = metrics.counter("resilience_retries_total", "失败后重试的次数")
+hedges_total = metrics.counter(
+    "resilience_hedges_total", "发出的对冲请求数，按 won/lost 区分"
+)
+
+# 窗口内失败次数达到阈值或半开探测失败时打开熔断器
+_RECORD_FAILURE_SCRIPT = """
+local failures = redis.call('incr', KEYS[2])
+if failures == 1 then
+    redis.call('pexpire', KEYS[2], ARGV[1])
+end
+if failures >= tonumber(ARGV[2]) or ARGV[3] == '1' then
+    redis.call('hset', KEYS[1], 'state', 'open', 'opened_at', ARGV[4])
+    redis.call('del', KEYS[2], KEYS[3])
+    return 1
+end
+return 0
+"""
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开，调用未发出。"""
+
+
+class CircuitBreaker:
+    """
+    熔断器，状态保存在 Redis 中由所有进程共享
+
+    关闭状态下统计窗口内的失败次数，达到阈值后打开；打开 ``open_seconds`` 后进入半开，
+    此时只有获得探测锁的一个调用可以发出，成功则关闭，失败则重新打开。
+    Redis 不可用时放行全部调用。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        prefix: str,
+        failure_threshold: int,
+        window_seconds: float,
+        open_seconds: float,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self._state_key = f"{prefix}:{name}"
+        self._failures_key = f"{prefix}:{name}:failures"
+        self._probe_key = f"{prefix}:{name}:probe"
+
+    async def _read(self) -> tuple[str, float]:
+        state = await redis_client.hgetall(self._state_key)
+        return state.get("state", CLOSED), float(state.get("opened_at", 0))
+
+    async def ensure_closed(self) -> None:
+        """
+        打开且仍在冷却期时立即拒绝，不占用半开探测名额
+
+        :return:
+        """
+        try:
+            state, opened_at = await self._read()
+        except RedisError as exc:
+            log.warning("熔断器 {} 状态读取失败: {}", self.name, exc)
+            return
+        if state == OPEN and time.time() < opened_at + self.open_seconds:
+            breaker_rejections.inc(name=self.name)
+            raise CircuitOpenError(self.name)
+
+    async def acquire(self) -> bool:
+        """
+        申请发出一次调用
+
+        :return: 是否为半开状态下的探测调用
+        """
+        try:
+            state, opened_at = await self._read()
+            if state != OPEN:
+                breaker_state.set(STATE_VALUES[CLOSED], name=self.name)
+                return False
+            if time.time() >= opened_at + self.open_seconds:
+                acquired = await redis_client.set(
+                    self._probe_key, "1", nx=True, px=int(self.open_seconds * 1000)
+                )
+                if acquired:
+                    breaker_state.set(STATE_VALUES[HALF_OPEN], name=self.name)
+                    return True
+        except RedisError as exc:
+            log.warning("熔断器 {} 状态读取失败: {}", self.name, exc)
+            return False
+        breaker_state.set(STATE_VALUES[OPEN], name=self.name)
+        breaker_rejections.inc(name=self.name)
+        raise CircuitOpenError(self.name)
+
+    async def record_success(self, probe: bool) -> None:
+        """记录一次成功，探测成功时关闭熔断器。"""
+
+        try:
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.delete(self._failures_key)
+                if probe:
+                    pipe.hset(self._state_key, "state", CLOSED)
+                    pipe.delete(self._probe_key)
+                await pipe.execute()
+        except RedisError as exc:
+            log.warning("熔断器 {} 状态写入失败: {}", self.name, exc)
+            return
+        if probe:
+            log.info("熔断器 {} 探测成功，已关闭", self.name)
+            breaker_state.set(STATE_VALUES[CLOSED], name=self.name)
+
+    async def record_failure(self, probe: bool) -> None:
+        """记录一次失败，必要时打开熔断器。"""
+
+        try:
+            opened = await redis_client.eval(
+                _RECORD_FAILURE_SCRIPT,
+                3,
+                self._state_key,
+                self._failures_key,
+                self._probe_key,
+                int(self.window_seconds * 1000),
+                self.failure_threshold,
+                "1" if probe else "0",
+                time.time(),
+            )
+        except RedisError as exc:
+            log.warning("熔断器 {} 状态写入失败: {}", self.name, exc)
+            return
+        if opened:
+            log.warning("熔断器 {} 已打开", self.name)
+            breaker_state.set(STATE_VALUES[OPEN], name=self.name)
+
+
+class LatencyTracker:
+    """进程内最近若干次成功调用的耗时，用于计算对冲阈值。"""
+
+    def __init__(self, size: int = 200) -> None:
+        self._samples: deque[float] = deque(maxlen=size)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, percent: float, min_samples: int) -> float | None:
+        """
+        计算耗时分位数
+
+        :param percent: 百分位（0~100）
+        :param min_samples: 样本数少于该值时返回 None
+        :return:
+        """
+        if len(self._samples) < max(min_samples, 1):
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+        return ordered[index]
+
+
+class ResiliencePolicy:
+    """
+    组合熔断、重试与对冲的调用策略
+
+    可重试的失败按指数退避加全抖动重试，退避与重试都不会超出调用的截止时间；
+    开启对冲时，首个请求超过历史耗时的 ``hedge_percentile`` 分位仍未返回，
+    再发出一个相同请求，先成功者生效，另一个被取消。
+    """
+
+    def __init__(
+        self,
+        breaker: CircuitBreaker,
+        *,
+        max_attempts: int,
+        backoff_base: float,
+        backoff_cap: float,
+        hedge_percentile: float | None = None,
+        hedge_min_samples: int = 20,
+    ) -> None:
+        self.breaker = breaker
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.latency = LatencyTracker()
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2**attempt))
+
+    async def run(
+        self,
+        fn: Callable[[], Awaitable[Any]],
+        *,
+        deadline: float,
+        is_retryable: Callable[[BaseException], bool],
+    ) -> Any:
+        """
+        按策略执行调用
+
+        :param fn: 单次调用
+        :param deadline: 截止时间（``time.monotonic()`` 时刻），超出时抛出 ``TimeoutError``
+        :param is_retryable: 判断失败是否可重试，可重试的失败同时计入熔断统计
+        :return: 调用结果
+        """
+        attempt = 0
+        while True:
+            probe = await self.breaker.acquire()
+            try:
+                async with asyncio.timeout_at(_loop_time(deadline)):
+                    result = await self._attempt(fn, hedge=not probe)
+            except Exception as exc:
+                retryable = isinstance(exc, TimeoutError) or is_retryable(exc)
+                if retryable:
+                    await self.breaker.record_failure(probe)
+                else:
+                    # 不可重试的失败（如参数错误）说明上游可以正常响应
+                    await self.breaker.record_success(probe)
+                attempt += 1
+                delay = self._backoff(attempt)
+                if (
+                    not retryable
+                    or probe
+                    or attempt >= self.max_attempts
+                    or time.monotonic() + delay >= deadline
+                ):
+                    raise
+                retries_total.inc(name=self.breaker.name)
+                await asyncio.sleep(delay)
+                continue
+            await self.breaker.record_success(probe)
+            return result
+
+    async def _attempt(self, fn: Callable[[], Awaitable[Any]], *, hedge: bool) -> Any:
+        """发出一次调用，满足条件时追加一个对冲请求。"""
+
+        delay = None
+        if hedge and self.hedge_percentile is not None:
+            delay = self.latency.percentile(
+                self.hedge_percentile, self.hedge_min_samples
+            )
+        started = time.monotonic()
+        primary = asyncio.ensure_future(fn())
+        if delay is None:
+            result = await primary
+            self.latency.observe(time.monotonic() - started)
+            return result
+
+        tasks = {primary}
+        hedged: asyncio.Future[Any] | None = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                hedged = asyncio.ensure_future(fn())
+                tasks.add(hedged)
+            while True:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+                if winner is not None:
+                    if hedged is not None:
+                        hedges_total.inc(
+                            name=self.breaker.name,
+                            outcome="won" if winner is hedged else "lost",
+                        )
+                    self.latency.observe(time.monotonic() - started)
+                    return winner.result()
+                tasks -= done
+                if not tasks:
+                    # 全部失败时抛出首个请求的异常
+                    return (primary if primary.done() else done.pop()).result()
+        finally:
+            for task in (primary, hedged):
+                if task is not None and not task.done():
+                    task.cancel()
+                    with contextlib.suppress(BaseException):
+                        await task
+
+
+def _loop_time(deadline: float) -> float:
+    """将 ``time.monotonic()`` 截止时刻换算为事件循环时间。"""
+
+    return asyncio.get_running_loop().time() + (deadline - time.monotonic())
@@ -0,0 +1,172 @@
+"""完全相同上下文的模型回复缓存，命中时按原有SSE帧重放。"""
+
+from __future__ import annotations
+
+import hashlib
+import time
+from collections.abc import AsyncIterator, Sequence
+
+from msgspec import json
+from redis.exceptions import RedisError
+
+from app.models import ChatModelId
+from app.services.llm import ChatStreamProvider
+from common.log import log
+from core.config import settings
+from database.redis import redis_client
+from utils.metrics import metrics
+
+BYPASS_HEADER = "X-Chat-Cache"
+
+cache_requests = metrics.counter(
+    "chat_response_cache_requests_total",
+    "模型回复缓存查询次数，按 hit/miss/bypass/error 区分",
+)
+cache_hit_ratio = metrics.gauge("chat_response_cache_hit_ratio", "模型回复缓存命中率")
+cache_stores = metrics.counter(
+    "chat_response_cache_stores_total", "模型回复缓存写入结果，按 stored/too_large 区分"
+)
+
+
+def record(result: str) -> None:
+    """记录一次查询结果并更新命中率。"""
+
+    cache_requests.inc(result=result)
+    hits = cache_requests.value(result="hit")
+    lookups = hits + cache_requests.value(result="miss")
+    if lookups:
+        cache_hit_ratio.set(hits / lookups)
+
+
+def _index_key() -> str:
+    """按写入时间排序的缓存键集合，用于限制条目数。"""
+
+    return f"{settings.CHAT_RESPONSE_CACHE_REDIS_PREFIX}:index"
+
+
+def cache_key(model: ChatModelId, messages: Sequence[dict[str, str]]) -> str:
+    """
+    根据模型与完整上下文（含系统提示词）计算缓存键
+
+    内容中的连续空白规范化为单个空格，避免格式差异导致未命中。
+
+    :param model: 聊天模型ID
+    :param messages: 发送给模型的上下文
+    :return:
+    """
+    normalized = [
+        [message["role"], " ".join(message["content"].split())] for message in messages
+    ]
+    digest = hashlib.sha256(json.encode([model.value, normalized])).hexdigest()
+    return f"{settings.CHAT_RESPONSE_CACHE_REDIS_PREFIX}:{digest}"
+
+
+async def get_reply(key: str) -> str | None:
+    """
+    读取缓存的回复
+
+    :param key: 缓存键
+    :return: 回复文本，未命中时返回 None
+    """
+    try:
+        reply = await redis_client.get(key)
+    except RedisError as exc:
+        log.warning("模型回复缓存读取失败: {}", exc)
+        record("error")
+        return None
+    record("hit" if reply is not None else "miss")
+    return reply
+
+
+async def store_reply(key: str, reply: str) -> None:
+    """
+    写入回复，超过单条大小上限时跳过，超过条目上限时淘汰最早写入的条目
+
+    :param key: 缓存键
+    :param reply: 回复文本
+    :return:
+    """
+    if len(reply.encode()) > settings.CHAT_RESPONSE_CACHE_MAX_BYTES:
+        cache_stores.inc(result="too_large")
+        return
+    index_key = _index_key()
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.set(key, reply, ex=settings.CHAT_RESPONSE_CACHE_TTL_SECONDS)
+            pipe.zadd(index_key, {key: time.time()})
+            # 清理已过期条目的索引
+            pipe.zremrangebyscore(
+                index_key, 0, time.time() - settings.CHAT_RESPONSE_CACHE_TTL_SECONDS
+            )
+            pipe.zcard(index_key)
+            *_, size = await pipe.execute()
+            overflow = size - settings.CHAT_RESPONSE_CACHE_MAX_ENTRIES
+            if overflow > 0:
+                evicted = await redis_client.zpopmin(index_key, overflow)
+                if evicted:
+                    await redis_client.delete(*(item for item, _ in evicted))
+    except RedisError as exc:
+        log.warning("模型回复缓存写入失败: {}", exc)
+        return
+    cache_stores.inc(result="stored")
+
+
+class ReplayChatProvider(ChatStreamProvider):
+    """重放缓存回复的提供方，输出与上游相同格式的增量。"""
+
+    name = "cache"
+
+    def __init__(self, reply: str, chunk_size: int = 32) -> None:
+        self.reply = reply
+        self.chunk_size = chunk_size
+
+    async def stream(
+        self, model: ChatModelId, messages: Sequence[dict[str, str]]
+    ) -> AsyncIterator[str]:
+        for start in range(0, len(self.reply), self.chunk_size):
+            yield self.reply[start : start + self.chunk_size]
+
+
+class CachingChatProvider(ChatStreamProvider):
+    """透传上游增量，完整生成后写入缓存；出错或被取消的回复不缓存。"""
+
+    def __init__(self, provider: ChatStreamProvider, key: str) -> None:
+        self.provider = provider
+        self.key = key
+        self.name = provider.name
+
+    async def stream(
+        self, model: ChatModelId, messages: Sequence[dict[str, str]]
+    ) -> AsyncIterator[str]:
+        chunks: list[str] = []
+        async for delta in self.provider.stream(model, messages):
+            chunks.append(delta)
+            yield delta
+        if chunks:
+            await store_reply(self.key, "".join(chunks))
+
+
+async def resolve_provider(
+    provider: ChatStreamProvider,
+    model: ChatModelId,
+    messages: Sequence[dict[str, str]],
+    *,
+    bypass: bool,
+) -> tuple[ChatStreamProvider, str]:
+    """
+    根据缓存状态选择本次生成使用的提供方
+
+    :param provider: 上游提供方
+    :param model: 聊天模型ID
+    :param messages: 发送给模型的上下文
+    :param bypass: 是否跳过缓存
+    :return: 提供方与缓存状态（hit/miss/bypass）
+    """
+    if bypass:
+        record("bypass")
+        return provider, "bypass"
+    key = cache_key(model, messages)
+    reply = await get_reply(key)
+    if reply is not None:
+        return ReplayChatProvider(reply), "hit"
+    return CachingChatProvider(provider, key), "miss"
@@ -0,0 +1,115 @@
+"""聊天消息全文检索，按数据库类型选择 tsvector、FTS5 或 LIKE 实现。"""
+
+from __future__ import annotations
+
+import uuid
+from functools import reduce
+from typing import Any
+
+from sqlalchemy import (
+    Float,
+    and_,
+    cast,
+    column,
+    func,
+    literal,
+    literal_column,
+    select,
+    table,
+    tuple_,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.cursor import ScoreCursor
+from app.models import Chat, Message
+from core.config import settings
+from utils.search_text import split_query, to_search_text
+
+_message_fts = table("Message_v2_fts", column("rowid"), column("search_text"))
+
+
+def query_phrases(query: str) -> list[str]:
+    """将查询切分为规范化后的短语，每个短语内的词需相邻出现。"""
+
+    return [phrase for phrase in map(to_search_text, split_query(query)) if phrase]
+
+
+def _postgresql_match(phrases: list[str]) -> tuple[Any, Any]:
+    """tsvector 列配合 GIN 索引匹配，按 ``ts_rank_cd`` 打分。"""
+
+    search_vector = literal_column('"Message_v2".search_vector')
+    tsquery = reduce(
+        lambda left, right: left.op("&&")(right),
+        [func.phraseto_tsquery("simple", phrase) for phrase in phrases],
+    )
+    score = cast(func.ts_rank_cd(search_vector, tsquery), Float)
+    return search_vector.op("@@")(tsquery), score
+
+
+def _sqlite_match(phrases: list[str]) -> tuple[Any, Any]:
+    """FTS5 匹配，bm25 越小越相关，取负值使得分越大越相关。"""
+
+    expression = " AND ".join(
+        '"{}"'.format(phrase.replace('"', '""')) for phrase in phrases
+    )
+    fts_table = literal_column('"Message_v2_fts"')
+    return fts_table.op("MATCH")(expression), -func.bm25(fts_table)
+
+
+def _fallback_match(phrases: list[str]) -> tuple[Any, Any]:
+    """其他数据库退化为子串匹配，不计算相关度。"""
+
+    condition = and_(
+        *(Message.search_text.contains(phrase, autoescape=True) for phrase in phrases)
+    )
+    return condition, literal(0.0, Float)
+
+
+async def search_messages(
+    db: AsyncSession,
+    user_id: uuid.UUID,
+    phrases: list[str],
+    *,
+    limit: int,
+    after: ScoreCursor | None = None,
+) -> list[tuple[Message, str, float]]:
+    """
+    检索用户自己的聊天消息，按相关度降序、消息ID降序分页
+
+    :param db: 数据库会话
+    :param user_id: 用户ID
+    :param phrases: ``query_phrases`` 返回的短语
+    :param limit: 返回条数上限
+    :param after: 上一页最后一条的游标
+    :return: ``(消息, 聊天标题, 得分)`` 列表
+    """
+    ranked = (
+        select(Message.id.label("id"))
+        .join(Chat, Chat.id == Message.chat_id)
+        .where(Chat.user_id == user_id)
+    )
+    if settings.DATABASE_TYPE == "sqlite":
+        condition, score = _sqlite_match(phrases)
+        ranked = ranked.join(
+            _message_fts, _message_fts.c.rowid == literal_column('"Message_v2".rowid')
+        )
+    elif settings.DATABASE_TYPE == "mysql":
+        condition, score = _fallback_match(phrases)
+    else:
+        condition, score = _postgresql_match(phrases)
+    ranked = ranked.add_columns(score.label("score")).where(condition).subquery()
+
+    statement = (
+        select(Message, Chat.title, ranked.c.score)
+        .join(ranked, ranked.c.id == Message.id)
+        .join(Chat, Chat.id == Message.chat_id)
+    )
+    if after is not None:
+        statement = statement.where(
+            tuple_(ranked.c.score, ranked.c.id) < tuple_(after.score, after.id)
+        )
+    statement = statement.order_by(ranked.c.score.desc(), ranked.c.id.desc()).limit(
+        limit
+    )
+    result = await db.execute(statement)
+    return [(message, title, float(score)) for message, title, score in result.all()]
@@ -0,0 +1,212 @@
+"""合并相同的并发调用：同一进程内共享一个任务，跨进程通过 Redis 锁选出唯一的执行者。"""
+
+from __future__ import annotations
+
+import asyncio
+import uuid
+from collections.abc import Awaitable, Callable, Iterable
+from typing import Any
+
+from msgspec import json
+from redis.exceptions import RedisError
+
+from common.log import log
+from database.redis import redis_client
+from utils.metrics import metrics
+
+calls_total = metrics.counter(
+    "single_flight_calls_total",
+    "合并调用次数，按名称与角色（leader/local/remote）区分",
+)
+
+# 仅当锁仍由自己持有时释放
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    相同键的并发调用只执行一次
+
+    进程内的调用共享同一个后台任务，每个调用方以 ``asyncio.shield`` 等待，
+    调用方超时或被取消不会中断执行中的任务。跨进程时先获得 Redis 锁的进程执行调用，
+    其余进程订阅结果；锁过期仍无结果时（执行者异常退出）重新竞争。
+    执行者的异常按类名与简单属性广播，其他进程还原为 ``error_types`` 中的同名类型，
+    不在其中的还原为 ``error_type``。Redis 不可用时退化为仅在进程内合并。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        prefix: str,
+        lock_seconds: float,
+        result_seconds: int,
+        error_type: Callable[[str], Exception] = RuntimeError,
+        error_types: Iterable[type[Exception]] = (),
+    ) -> None:
+        self.name = name
+        self.prefix = prefix
+        self.lock_seconds = lock_seconds
+        self.result_seconds = result_seconds
+        self.error_type = error_type
+        self.error_types = {error.__qualname__: error for error in error_types}
+        self._calls: dict[str, asyncio.Task[Any]] = {}
+
+    def _lock_key(self, key: str) -> str:
+        return f"{self.prefix}:lock:{key}"
+
+    def _result_key(self, key: str) -> str:
+        return f"{self.prefix}:result:{key}"
+
+    def _channel(self, key: str) -> str:
+        return f"{self.prefix}:done:{key}"
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Any]],
+        *,
+        timeout: float | None = None,
+    ) -> Any:
+        """
+        执行或加入相同键的调用
+
+        :param key: 调用键，相同键视为相同调用
+        :param fn: 实际调用，结果需可 JSON 序列化
+        :param timeout: 本调用方的最长等待时间（秒），超时抛出 ``TimeoutError``
+        :return: 调用结果
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.create_task(self._run(key, fn))
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            calls_total.inc(name=self.name, role="local")
+        async with asyncio.timeout(timeout):
+            return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task[Any]) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # 所有调用方都已超时时没有人读取异常，在此取出以免告警
+        if not task.cancelled():
+            task.exception()
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """进程内唯一的执行任务：竞争 Redis 锁，成功则执行调用，否则等待其他进程的结果。"""
+
+        lock_key = self._lock_key(key)
+        token = uuid.uuid4().hex
+        while True:
+            try:
+                shared = await redis_client.get(self._result_key(key))
+                if shared is not None:
+                    calls_total.inc(name=self.name, role="remote")
+                    return json.decode(shared)["result"]
+                acquired = await redis_client.set(
+                    lock_key, token, nx=True, px=int(self.lock_seconds * 1000)
+                )
+            except RedisError as exc:
+                log.warning("{} 跨进程合并不可用，仅在进程内合并: {}", self.name, exc)
+                calls_total.inc(name=self.name, role="leader")
+                return await fn()
+
+            if acquired:
+                calls_total.inc(name=self.name, role="leader")
+                return await self._lead(key, token, fn)
+
+            outcome = await self._wait(key)
+            if outcome is None:
+                continue
+            calls_total.inc(name=self.name, role="remote")
+            if "error" in outcome:
+                raise self._restore_error(outcome)
+            return outcome["result"]
+
+    @staticmethod
+    def _dump_error(exc: Exception) -> dict[str, Any]:
+        """将异常转换为可广播的结构：消息、类名与 JSON 基本类型的属性。"""
+
+        attrs = {
+            name: value
+            for name, value in vars(exc).items()
+            if isinstance(value, str | int | float | bool | None)
+        }
+        return {"error": str(exc), "error_type": type(exc).__qualname__, "attrs": attrs}
+
+    def _restore_error(self, outcome: dict[str, Any]) -> Exception:
+        """按类名还原其他进程广播的异常，未登记的类型使用 ``error_type``。"""
+
+        error_type = self.error_types.get(outcome.get("error_type", ""))
+        if error_type is None:
+            return self.error_type(outcome["error"])
+        exc = error_type(outcome["error"])
+        for name, value in outcome.get("attrs", {}).items():
+            setattr(exc, name, value)
+        return exc
+
+    async def _lead(
+        self, key: str, token: str, fn: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """执行调用并把结果广播给其他进程；失败只通知当前等待者，不缓存。"""
+
+        try:
+            result = await fn()
+        except Exception as exc:
+            await self._publish(key, self._dump_error(exc))
+            raise
+        else:
+            payload = json.encode({"result": result})
+            try:
+                await redis_client.set(
+                    self._result_key(key), payload, ex=self.result_seconds
+                )
+            except RedisError as exc:
+                log.warning("{} 合并结果写入失败: {}", self.name, exc)
+            await self._publish(key, payload)
+            return result
+        finally:
+            try:
+                await redis_client.eval(_RELEASE_SCRIPT, 1, self._lock_key(key), token)
+            except RedisError as exc:
+                log.warning("{} 合并锁释放失败: {}", self.name, exc)
+
+    async def _publish(self, key: str, payload: dict[str, Any] | bytes) -> None:
+        if isinstance(payload, dict):
+            payload = json.encode(payload)
+        try:
+            await redis_client.publish(self._channel(key), payload)
+        except RedisError as exc:
+            log.warning("{} 合并结果广播失败: {}", self.name, exc)
+
+    async def _wait(self, key: str) -> dict[str, Any] | None:
+        """
+        等待持有锁的进程给出结果
+
+        :param key: 调用键
+        :return: 结果或错误，锁已释放却没有结果时返回 None
+        """
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(self._channel(key))
+            while True:
+                message = await pubsub.get_message(timeout=1.0)
+                if message is not None:
+                    return json.decode(message["data"])
+                # 订阅前已完成或执行者退出时不会收到消息，定期回查
+                shared = await redis_client.get(self._result_key(key))
+                if shared is not None:
+                    return json.decode(shared)
+                if not await redis_client.exists(self._lock_key(key)):
+                    return None
+        except RedisError as exc:
+            log.warning("{} 等待合并结果中断: {}", self.name, exc)
+            return None
+        finally:
+            await pubsub.aclose()
@@ -0,0 +1,145 @@
+"""基于 Redis Stream 的SSE事件日志，支持在任意进程按事件ID续读。"""
+
+from __future__ import annotations
+
+import time
+import uuid
+from collections.abc import AsyncIterator
+
+from msgspec import json
+from redis.exceptions import RedisError
+
+from common.log import log
+from core.config import settings
+from database.redis import redis_client
+
+FINAL_FIELD = "final"
+FRAME_FIELD = "frame"
+
+# 读取事件日志失败时发送的最后一帧，不带事件ID，客户端可按原 Last-Event-ID 重连
+READ_ERROR_FRAME = json.encode(
+    {"type": "error", "errorText": "聊天流读取中断，请稍后重试"}
+).decode()
+
+
+class RedisEventStream:
+    """
+    单个生成过程的事件日志
+
+    每个SSE帧以 ``XADD`` 追加，Redis 生成的条目ID即SSE事件ID；
+    附带的 meta 哈希记录归属信息，续读时无需查询数据库即可鉴权。
+    """
+
+    def __init__(self, key: str, *, maxlen: int, ttl: int) -> None:
+        self.key = key
+        self.meta_key = f"{key}:meta"
+        self.listener_key = f"{key}:listener"
+        self.maxlen = maxlen
+        self.ttl = ttl
+
+    async def reset(self, meta: dict[str, str]) -> None:
+        """
+        开始新的生成：清空旧事件并写入 meta
+
+        :param meta: 归属信息
+        :return:
+        """
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.delete(self.key, self.meta_key)
+            pipe.hset(self.meta_key, mapping=meta)
+            pipe.expire(self.meta_key, self.ttl)
+            await pipe.execute()
+
+    async def clear(self) -> None:
+        """删除事件与 meta。"""
+
+        await redis_client.delete(self.key, self.meta_key, self.listener_key)
+
+    async def get_meta(self) -> dict[str, str]:
+        """读取 meta，生成不存在或已过期时返回空字典。"""
+
+        return await redis_client.hgetall(self.meta_key)
+
+    async def has_listener(self) -> bool:
+        """是否有续传连接正在读取。"""
+
+        return bool(await redis_client.exists(self.listener_key))
+
+    async def append(self, frame: str | bytes, *, final: bool = False) -> str:
+        """
+        追加一个已编码的帧
+
+        :param frame: 帧数据（JSON）
+        :param final: 是否为生成的最后一帧
+        :return: 事件ID
+        """
+        if isinstance(frame, bytes):
+            frame = frame.decode()
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.xadd(
+                self.key,
+                {FRAME_FIELD: frame, FINAL_FIELD: "1" if final else "0"},
+                maxlen=self.maxlen,
+                approximate=True,
+            )
+            pipe.expire(self.key, self.ttl)
+            pipe.expire(self.meta_key, self.ttl)
+            event_id, *_ = await pipe.execute()
+        return event_id
+
+    async def follow(
+        self,
+        last_event_id: str | None = None,
+        *,
+        block_ms: int,
+        idle_timeout: float,
+    ) -> AsyncIterator[tuple[str, str]]:
+        """
+        从指定事件之后读取帧，直到最后一帧或长时间没有新事件
+
+        帧以写入时的 JSON 原样返回，无需解码再编码。Redis 出错时以
+        ``READ_ERROR_FRAME``（事件ID为空）结束。
+
+        :param last_event_id: 客户端已收到的最后一个事件ID，为空时从头读取
+        :param block_ms: 单次 XREAD 阻塞时长（毫秒）
+        :param idle_timeout: 没有新事件时的最长等待时间（秒）
+        :return:
+        """
+        cursor = last_event_id or "0-0"
+        idle_since = time.monotonic()
+        # 续传连接存活标记，原连接断开后生成任务据此判断是否继续
+        listener_ttl = block_ms // 1000 * 2 + 1
+        while True:
+            try:
+                await redis_client.set(self.listener_key, "1", ex=listener_ttl)
+                response = await redis_client.xread(
+                    {self.key: cursor}, count=100, block=block_ms
+                )
+                if not response:
+                    if time.monotonic() - idle_since > idle_timeout:
+                        return
+                    if not await redis_client.exists(self.meta_key):
+                        return
+                    continue
+            except RedisError as exc:
+                log.warning("聊天流 {} 读取失败: {}", self.key, exc)
+                yield "", READ_ERROR_FRAME
+                return
+
+            idle_since = time.monotonic()
+            for _, entries in response:
+                for event_id, fields in entries:
+                    cursor = event_id
+                    yield event_id, fields[FRAME_FIELD]
+                    if fields.get(FINAL_FIELD) == "1":
+                        return
+
+
+def chat_event_stream(chat_id: uuid.UUID) -> RedisEventStream:
+    """返回聊天当前生成过程的事件日志。"""
+
+    return RedisEventStream(
+        f"{settings.CHAT_STREAM_REDIS_PREFIX}:{chat_id}",
+        maxlen=settings.CHAT_STREAM_MAXLEN,
+        ttl=settings.CHAT_STREAM_TTL_SECONDS,
+    )
@@ -0,0 +1,545 @@
+"""聊天数据的异步写入队列：热路径只入队，后台任务批量落库。"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Any
+
+from msgspec import json
+from redis.exceptions import RedisError
+from sqlalchemy import insert, update
+
+from app.models import Chat, Message, MessageRole, Visibility
+from app.services import history_cache
+from common.log import log
+from core.config import settings
+from database.db import async_db_session
+from database.redis import redis_client
+from utils.metrics import metrics
+from utils.search_text import extract_text, to_search_text
+
+pending_units = metrics.gauge("write_behind_pending", "等待落库的写入单元数")
+flushed_units = metrics.counter(
+    "write_behind_flushed_total", "写入单元落库结果，按 ok/failed 区分"
+)
+spilled_units = metrics.counter(
+    "write_behind_spilled_total", "进程内队列已满或落库失败后转存 Redis 的写入单元数"
+)
+flush_seconds = metrics.histogram("write_behind_flush_seconds", "单批落库耗时")
+dead_units = metrics.gauge(
+    "write_behind_dead_letters", "多次重放仍落库失败、等待人工处理的写入单元数"
+)
+
+# 落库失败的单元转存 Redis 后最多重试的次数
+MAX_ATTEMPTS = 5
+
+
+def _chat_row(chat: Chat) -> dict[str, Any]:
+    return {
+        "id": chat.id,
+        "user_id": chat.user_id,
+        "title": chat.title,
+        "visibility": Visibility(chat.visibility),
+        "created_at": chat.created_at,
+        "last_context": chat.last_context,
+    }
+
+
+def _message_row(message: Message) -> dict[str, Any]:
+    return {
+        "id": message.id,
+        "chat_id": message.chat_id,
+        "role": MessageRole(message.role),
+        "parts": message.parts,
+        "attachments": message.attachments,
+        "created_at": message.created_at,
+        # 批量 INSERT 不触发 ORM 事件，检索文本在此生成
+        "search_text": to_search_text(extract_text(message.parts)),
+    }
+
+
+def _decode_chat_row(chat: dict[str, Any]) -> dict[str, Any]:
+    chat["id"] = uuid.UUID(chat["id"])
+    chat["user_id"] = uuid.UUID(chat["user_id"])
+    chat["visibility"] = Visibility(chat["visibility"])
+    chat["created_at"] = datetime.fromisoformat(chat["created_at"])
+    return chat
+
+
+def _decode_message_row(message: dict[str, Any]) -> dict[str, Any]:
+    message["id"] = uuid.UUID(message["id"])
+    message["chat_id"] = uuid.UUID(message["chat_id"])
+    message["role"] = MessageRole(message["role"])
+    message["created_at"] = datetime.fromisoformat(message["created_at"])
+    return message
+
+
+def _decode_unit(raw: str) -> dict[str, Any]:
+    """还原从 Redis 读取的写入单元中的 UUID、时间与枚举字段。"""
+
+    unit = json.decode(raw)
+    chat = unit.get("chat")
+    if chat:
+        _decode_chat_row(chat)
+    for message in unit.get("messages", []):
+        _decode_message_row(message)
+    context = unit.get("context")
+    if context:
+        context["chat_id"] = uuid.UUID(context["chat_id"])
+        context["user_id"] = uuid.UUID(context["user_id"])
+    return unit
+
+
+class WriteBehindQueue:
+    """
+    聊天写入队列
+
+    写入以“单元”为粒度入队（新建的聊天、若干消息、用量更新），同一单元在一个事务中落库。
+    进程内队列已满时单元转存到 Redis 列表，任意进程的后台任务都会继续处理。
+    尚未落库的数据同时保存在内存与 Redis 覆盖层中，任意进程按聊天读取时都能读到。
+    多次落库失败的单元进入失败列表，每隔 ``replay_interval`` 秒重放一次，
+    重放 ``max_replays`` 次仍失败的单元转入死信列表等待人工处理。
+    """
+
+    def __init__(
+        self,
+        *,
+        maxsize: int,
+        batch_size: int,
+        flush_interval: float,
+        overlay_seconds: int = 24 * 60 * 60,
+        replay_interval: float = 300.0,
+        max_replays: int = 3,
+        shared_overlay: bool = True,
+    ) -> None:
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overlay_seconds = overlay_seconds
+        self.replay_interval = replay_interval
+        self.max_replays = max_replays
+        # 未启用异步写入时不会有待落库的数据，读取时无需访问 Redis
+        self.shared_overlay = shared_overlay
+        self._queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue(maxsize=maxsize)
+        self._chats: dict[uuid.UUID, Chat] = {}
+        self._messages: dict[uuid.UUID, dict[uuid.UUID, Message]] = defaultdict(dict)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._stopping = asyncio.Event()
+
+    @property
+    def redis_key(self) -> str:
+        return f"{settings.CHAT_WRITE_BEHIND_REDIS_KEY}:pending"
+
+    @property
+    def failed_key(self) -> str:
+        return f"{settings.CHAT_WRITE_BEHIND_REDIS_KEY}:failed"
+
+    @property
+    def dead_key(self) -> str:
+        return f"{settings.CHAT_WRITE_BEHIND_REDIS_KEY}:dead"
+
+    def _chat_key(self, chat_id: uuid.UUID) -> str:
+        return f"{settings.CHAT_WRITE_BEHIND_REDIS_KEY}:chat:{chat_id}"
+
+    def _messages_key(self, chat_id: uuid.UUID) -> str:
+        return f"{settings.CHAT_WRITE_BEHIND_REDIS_KEY}:messages:{chat_id}"
+
+    # ===== 覆盖层 =====
+    async def pending_chat(self, chat_id: uuid.UUID) -> Chat | None:
+        """尚未落库的聊天，本进程之外的写入从 Redis 读取。"""
+
+        chat = self._chats.get(chat_id)
+        if chat is not None or not self.shared_overlay:
+            return chat
+        try:
+            raw = await redis_client.get(self._chat_key(chat_id))
+        except RedisError as exc:
+            log.warning("读取写入队列覆盖层失败: {}", exc)
+            return None
+        if raw is None:
+            return None
+        return Chat(**_decode_chat_row(json.decode(raw)))
+
+    async def pending_messages(self, chat_id: uuid.UUID) -> list[Message]:
+        """聊天中尚未落库的消息（含其他进程的写入），按 ``(created_at, id)`` 排序。"""
+
+        messages = dict(self._messages.get(chat_id, {}))
+        shared: list[str] = []
+        if self.shared_overlay:
+            try:
+                shared = await redis_client.hvals(self._messages_key(chat_id))
+            except RedisError as exc:
+                log.warning("读取写入队列覆盖层失败: {}", exc)
+        for raw in shared:
+            row = _decode_message_row(json.decode(raw))
+            if row["id"] not in messages:
+                messages[row["id"]] = Message(**row)
+        return sorted(messages.values(), key=lambda item: (item.created_at, item.id))
+
+    async def _share(self, unit: dict[str, Any]) -> None:
+        """将单元写入 Redis 覆盖层，供其他进程读取。"""
+
+        chat = unit.get("chat")
+        by_chat: dict[uuid.UUID, dict[str, str]] = defaultdict(dict)
+        for message in unit.get("messages", []):
+            by_chat[message["chat_id"]][str(message["id"])] = json.encode(
+                message
+            ).decode()
+        if not chat and not by_chat:
+            return
+        try:
+            async with redis_client.pipeline(transaction=True) as pipe:
+                if chat:
+                    pipe.set(
+                        self._chat_key(chat["id"]),
+                        json.encode(chat).decode(),
+                        ex=self.overlay_seconds,
+                    )
+                for chat_id, rows in by_chat.items():
+                    pipe.hset(self._messages_key(chat_id), mapping=rows)
+                    pipe.expire(self._messages_key(chat_id), self.overlay_seconds)
+                await pipe.execute()
+        except RedisError as exc:
+            log.warning("写入队列覆盖层写入 Redis 失败: {}", exc)
+
+    async def _forget(
+        self, units: list[dict[str, Any]], *, shared: bool = True
+    ) -> None:
+        """
+        单元落库（或放弃）后移出覆盖层
+
+        :param units: 写入单元
+        :param shared: 是否同时移出 Redis 覆盖层；单元转存 Redis 后只移出本进程内存
+        :return:
+        """
+
+        chat_keys: list[str] = []
+        message_ids: dict[uuid.UUID, list[str]] = defaultdict(list)
+        for unit in units:
+            chat = unit.get("chat")
+            if chat:
+                self._chats.pop(chat["id"], None)
+                chat_keys.append(self._chat_key(chat["id"]))
+            for message in unit.get("messages", []):
+                message_ids[message["chat_id"]].append(str(message["id"]))
+                messages = self._messages.get(message["chat_id"])
+                if messages is not None:
+                    messages.pop(message["id"], None)
+                    if not messages:
+                        del self._messages[message["chat_id"]]
+        if not shared or (not chat_keys and not message_ids):
+            return
+        try:
+            async with redis_client.pipeline(transaction=True) as pipe:
+                if chat_keys:
+                    pipe.delete(*chat_keys)
+                for chat_id, ids in message_ids.items():
+                    pipe.hdel(self._messages_key(chat_id), *ids)
+                await pipe.execute()
+        except RedisError as exc:
+            # 覆盖层的键会按过期时间清除，落库后的数据以数据库为准
+            log.warning("清理写入队列覆盖层失败: {}", exc)
+
+    # ===== 入队 =====
+    async def submit(
+        self,
+        *,
+        chat: Chat | None = None,
+        messages: list[Message] | None = None,
+        context: dict[str, Any] | None = None,
+        user_id: uuid.UUID | None = None,
+    ) -> None:
+        """
+        提交一个写入单元
+
+        :param chat: 新建的聊天
+        :param messages: 新增的消息
+        :param context: 聊天的用量信息，需同时传入 ``user_id``
+        :param user_id: 聊天所属用户
+        :return:
+        """
+        messages = messages or []
+        unit: dict[str, Any] = {
+            "chat": _chat_row(chat) if chat is not None else None,
+            "messages": [_message_row(message) for message in messages],
+            "context": None,
+            "attempts": 0,
+            "replays": 0,
+        }
+        if context is not None and messages:
+            unit["context"] = {
+                "chat_id": messages[0].chat_id,
+                "user_id": user_id,
+                "usage": context,
+            }
+
+        if chat is not None:
+            self._chats[chat.id] = chat
+        for message in messages:
+            self._messages[message.chat_id][message.id] = message
+        await self._share(unit)
+
+        try:
+            self._queue.put_nowait(unit)
+            self._idle.clear()
+            pending_units.inc()
+        except asyncio.QueueFull:
+            await self._spill([unit])
+
+    async def _spill(self, units: list[dict[str, Any]]) -> None:
+        """
+        将单元转存到 Redis 列表
+
+        Redis 也不可用时直接落库，保证数据不丢失。
+
+        :param units: 写入单元
+        :return:
+        """
+        try:
+            await redis_client.rpush(
+                self.redis_key, *(json.encode(unit).decode() for unit in units)
+            )
+            spilled_units.inc(len(units))
+            # 转存的单元可能由其他进程落库，此后由 Redis 覆盖层提供读取
+            await self._forget(units, shared=False)
+        except RedisError as exc:
+            log.warning("写入队列转存 Redis 失败，改为直接落库: {}", exc)
+            for unit in units:
+                await self._flush_units([unit])
+
+    # ===== 落库 =====
+    async def _flush_units(self, units: list[dict[str, Any]]) -> bool:
+        """在一个事务中写入多个单元，返回是否成功。"""
+
+        chats = [unit["chat"] for unit in units if unit.get("chat")]
+        messages = [message for unit in units for message in unit.get("messages", [])]
+        contexts = {
+            unit["context"]["chat_id"]: unit["context"]
+            for unit in units
+            if unit.get("context")
+        }
+
+        started = time.perf_counter()
+        try:
+            async with async_db_session() as db:
+                # 先写聊天再写消息，满足外键约束；同表多行合并为一条多值 INSERT
+                if chats:
+                    await db.execute(insert(Chat).values(chats))
+                if messages:
+                    await db.execute(insert(Message).values(messages))
+                for chat_id, context in contexts.items():
+                    await db.execute(
+                        update(Chat)
+                        .where(Chat.id == chat_id)
+                        .values(last_context=context["usage"])
+                    )
+                await db.commit()
+        except Exception as exc:  # noqa: BLE001 - 由调用方决定重试或转存
+            log.warning("写入队列落库失败（{} 个单元）: {}", len(units), exc)
+            return False
+        finally:
+            flush_seconds.observe(time.perf_counter() - started)
+
+        await self._forget(units)
+        flushed_units.inc(len(units), result="ok")
+
+        # 落库前的缓存失效可能被并发读取重新填充，落库后再失效一次
+        users = {chat["user_id"] for chat in chats}
+        users.update(context["user_id"] for context in contexts.values())
+        for user_id in users:
+            await history_cache.invalidate(user_id, "write_behind")
+        return True
+
+    async def _flush(self, units: list[dict[str, Any]]) -> None:
+        """批量落库，整批失败时逐个重试，仍失败的单元转存 Redis 稍后重试。"""
+
+        if await self._flush_units(units):
+            return
+        retry: list[dict[str, Any]] = []
+        for unit in units:
+            if not await self._flush_units([unit]):
+                unit["attempts"] = unit.get("attempts", 0) + 1
+                retry.append(unit)
+        if not retry:
+            return
+
+        exhausted = [unit for unit in retry if unit["attempts"] >= MAX_ATTEMPTS]
+        retry = [unit for unit in retry if unit["attempts"] < MAX_ATTEMPTS]
+        flushed_units.inc(len(exhausted), result="failed")
+        # 失败的单元稍后重放，期间仍保留在覆盖层中；重放次数用尽的转入死信列表
+        failed = [
+            unit for unit in exhausted if unit.get("replays", 0) < self.max_replays
+        ]
+        dead = [
+            unit for unit in exhausted if unit.get("replays", 0) >= self.max_replays
+        ]
+        for key, letters in ((self.failed_key, failed), (self.dead_key, dead)):
+            if not letters:
+                continue
+            log.error("{} 个写入单元多次落库失败，转入 {}", len(letters), key)
+            try:
+                await redis_client.rpush(
+                    key, *(json.encode(unit).decode() for unit in letters)
+                )
+            except RedisError as exc:
+                log.error("写入单元转入 {} 时出错，数据已丢弃: {}", key, exc)
+        if failed:
+            await self._forget(failed, shared=False)
+        if dead:
+            await self._forget(dead)
+            await self._report_dead()
+        if retry:
+            await self._spill(retry)
+
+    async def replay_failed(self) -> int:
+        """
+        将失败列表中的单元放回转存列表重新落库
+
+        :return: 重放的单元数
+        """
+        try:
+            raw_units = await redis_client.lpop(self.failed_key, self.batch_size)
+        except RedisError as exc:
+            log.warning("读取失败的写入单元出错: {}", exc)
+            return 0
+        units = [_decode_unit(raw) for raw in raw_units or []]
+        if not units:
+            return 0
+        for unit in units:
+            unit["attempts"] = 0
+            unit["replays"] = unit.get("replays", 0) + 1
+        log.info("重放 {} 个落库失败的写入单元", len(units))
+        await self._spill(units)
+        return len(units)
+
+    async def _report_dead(self) -> None:
+        """更新死信单元数，存在死信时记录错误日志。"""
+
+        try:
+            count = await redis_client.llen(self.dead_key)
+        except RedisError as exc:
+            log.warning("读取写入队列死信列表失败: {}", exc)
+            return
+        dead_units.set(count)
+        if count:
+            log.error("{} 中有 {} 个写入单元需要人工处理", self.dead_key, count)
+
+    async def _get(self, timeout: float) -> dict[str, Any] | None:
+        """从进程内队列取出一个单元，超时或收到停止信号时返回 ``None``。"""
+
+        if self._stopping.is_set():
+            try:
+                return self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return None
+        getter = asyncio.ensure_future(self._queue.get())
+        stopper = asyncio.ensure_future(self._stopping.wait())
+        try:
+            await asyncio.wait(
+                {getter, stopper}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            stopper.cancel()
+            if not getter.done():
+                # 取消等待，单元留在队列中
+                getter.cancel()
+        return getter.result() if getter.done() else None
+
+    async def _next_batch(self) -> list[dict[str, Any]]:
+        """取出下一批单元：优先进程内队列，空闲时读取 Redis 中转存的单元。"""
+
+        batch: list[dict[str, Any]] = []
+        unit = await self._get(self.flush_interval)
+        if unit is not None:
+            batch.append(unit)
+            # 短暂等待以合并同一时段的写入，收到停止信号时立即返回已取出的单元
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                unit = await self._get(remaining)
+                if unit is None:
+                    break
+                batch.append(unit)
+            pending_units.dec(len(batch))
+            return batch
+        if self._stopping.is_set():
+            # 转存的单元留给仍在运行的进程处理
+            return []
+
+        try:
+            raw_units = await redis_client.lpop(self.redis_key, self.batch_size)
+        except RedisError as exc:
+            log.warning("读取转存的写入单元失败: {}", exc)
+            return []
+        return [_decode_unit(raw) for raw in raw_units or []]
+
+    async def run(self) -> None:
+        """后台落库循环，随应用生命周期运行，调用 :meth:`stop` 后落库手中的批次并退出。"""
+
+        next_replay = time.monotonic() + self.replay_interval
+        await self._report_dead()
+        while not self._stopping.is_set():
+            batch = await self._next_batch()
+            if batch:
+                await self._flush(batch)
+            if self._queue.empty():
+                self._idle.set()
+            if time.monotonic() >= next_replay:
+                next_replay = time.monotonic() + self.replay_interval
+                await self.replay_failed()
+                await self._report_dead()
+
+    def stop(self) -> None:
+        """
+        通知后台落库循环停止，循环落库已取出的单元后退出
+
+        关闭应用时先调用本方法并等待 :meth:`run` 返回，再调用 :meth:`drain`。
+
+        :return:
+        """
+        self._stopping.set()
+
+    async def drain(self) -> None:
+        """
+        落库进程内队列中的全部单元，用于关闭应用前
+
+        :return:
+        """
+        while not self._queue.empty():
+            batch = [
+                self._queue.get_nowait()
+                for _ in range(min(self.batch_size, self._queue.qsize()))
+            ]
+            pending_units.dec(len(batch))
+            await self._flush(batch)
+        self._idle.set()
+
+    async def wait_idle(self, timeout: float) -> None:
+        """
+        等待进程内队列清空，用于需要读取最新数据库状态的写操作之前
+
+        :param timeout: 最长等待时间（秒）
+        :return:
+        """
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=timeout)
+        except TimeoutError:
+            log.warning("等待写入队列清空超时")
+
+
+# 创建写入队列单例
+write_behind = WriteBehindQueue(
+    maxsize=settings.CHAT_WRITE_BEHIND_QUEUE_SIZE,
+    batch_size=settings.CHAT_WRITE_BEHIND_BATCH_SIZE,
+    flush_interval=settings.CHAT_WRITE_BEHIND_FLUSH_MS / 1000,
+    overlay_seconds=settings.CHAT_WRITE_BEHIND_OVERLAY_SECONDS,
+    replay_interval=settings.CHAT_WRITE_BEHIND_REPLAY_SECONDS,
+    max_replays=settings.CHAT_WRITE_BEHIND_MAX_REPLAYS,
+    shared_overlay=settings.CHAT_WRITE_BEHIND,
+)
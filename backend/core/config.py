@@ -46,6 +46,11 @@ class Settings(BaseSettings):
     MIDDLEWARE_CORS: bool = True
     CORS_EXPOSE_HEADERS: list[str] = [
         'X-Request-ID',
+        'X-Chat-Cache',
+        'X-RateLimit-Limit',
+        'X-RateLimit-Remaining',
+        'X-RateLimit-Reset',
+        'Retry-After',
     ]
 
     @computed_field  # type: ignore[prop-decorator]
@@ -147,6 +152,81 @@ class Settings(BaseSettings):
     # Redis
     REDIS_TIMEOUT: int = 5
 
+    # 出站 HTTP 客户端（AI 接口调用），按目标主机复用连接池
+    HTTP_CLIENT_HTTP2: bool = True
+    # 单个主机的最大连接数与保持的空闲长连接数
+    HTTP_CLIENT_MAX_CONNECTIONS_PER_HOST: int = 20
+    HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    HTTP_CLIENT_KEEPALIVE_EXPIRY_SECONDS: float = 30
+    HTTP_CLIENT_CONNECT_TIMEOUT_SECONDS: float = 5
+    # 读取超时作用于两次收到数据的间隔，流式回复不会因总时长超时
+    HTTP_CLIENT_READ_TIMEOUT_SECONDS: float = 60
+    HTTP_CLIENT_WRITE_TIMEOUT_SECONDS: float = 10
+    # 连接池已满时等待空闲连接的时长
+    HTTP_CLIENT_POOL_TIMEOUT_SECONDS: float = 5
+
+    # 异步图片生成任务：状态与结果保存在 Redis，由后台工作协程执行
+    IMAGE_JOB_REDIS_PREFIX: str = "image-job"
+    # 本进程的工作协程数，为 0 时只入队，由其他进程执行
+    IMAGE_JOB_WORKERS: int = 4
+    # 队列中等待的任务数上限，超出时返回 429
+    IMAGE_JOB_QUEUE_SIZE: int = 200
+    IMAGE_JOB_RETRY_AFTER_SECONDS: int = 10
+    IMAGE_JOB_TIMEOUT_SECONDS: float = 120
+    IMAGE_JOB_TTL_SECONDS: int = 60 * 60
+    # 阻塞读取队列的时长，需小于 REDIS_TIMEOUT
+    IMAGE_JOB_POLL_SECONDS: float = 2
+    # 工作进程心跳的过期时间，过期后其处理中的任务由其他进程放回队列
+    IMAGE_JOB_HEARTBEAT_SECONDS: int = 30
+
+    # 生成图片保存在 UPLOAD_DIR 下的目录，每张图片附带 WebP 缩放版本（名称: 最长边像素）
+    IMAGE_STORAGE_DIR_NAME: str = "generated"
+    IMAGE_DOWNLOAD_MAX_BYTES: int = 20 * 1024 * 1024
+    IMAGE_VARIANT_SIZES: dict[str, int] = {"thumbnail": 256, "medium": 768}
+    IMAGE_VARIANT_QUALITY: int = 80
+    # 生成缩放版本的进程数
+    IMAGE_VARIANT_WORKERS: int = 2
+
+    # 已保存图片的索引始终按总字节数淘汰最久未使用的条目；IMAGE_CACHE 决定相同参数的请求是否直接复用
+    IMAGE_CACHE: bool = True
+    IMAGE_CACHE_REDIS_PREFIX: str = "image-cache"
+    IMAGE_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+
+    # 单次图片生成的最长等待时间
+    IMAGE_GENERATION_TIMEOUT_SECONDS: float = 90
+    # 合并相同的并发图片生成请求：锁需长于一次上游调用，结果短暂保留给稍后到达的请求
+    IMAGE_SINGLE_FLIGHT_REDIS_PREFIX: str = "image-flight"
+    IMAGE_SINGLE_FLIGHT_LOCK_SECONDS: float = 120
+    IMAGE_SINGLE_FLIGHT_RESULT_SECONDS: int = 30
+
+    # 出站调用的熔断器状态（Redis，所有进程共享）
+    CIRCUIT_BREAKER_REDIS_PREFIX: str = "breaker"
+    # 图片服务：窗口内可重试的失败达到阈值后熔断，熔断期间请求直接返回 503
+    IMAGE_PROVIDER_FAILURE_THRESHOLD: int = 5
+    IMAGE_PROVIDER_FAILURE_WINDOW_SECONDS: float = 30
+    IMAGE_PROVIDER_OPEN_SECONDS: float = 30
+    # 一次生成（含重试）的截止时间，重试按指数退避加随机抖动
+    IMAGE_PROVIDER_DEADLINE_SECONDS: float = 75
+    IMAGE_PROVIDER_MAX_ATTEMPTS: int = 3
+    IMAGE_PROVIDER_BACKOFF_BASE_SECONDS: float = 0.5
+    IMAGE_PROVIDER_BACKOFF_CAP_SECONDS: float = 5
+    # 对冲请求：首个请求超过历史耗时该分位仍未返回时再发一个，为空时关闭
+    IMAGE_PROVIDER_HEDGE_PERCENTILE: float | None = None
+    IMAGE_PROVIDER_HEDGE_MIN_SAMPLES: int = 20
+
+    # 批量改写：单个批次的最大条目数与同时执行的条目数
+    REWRITE_BATCH_MAX_ITEMS: int = 100
+    REWRITE_BATCH_CONCURRENCY: int = 8
+    # 文案改写策略：开启时由聊天模型（CHAT_PROVIDER）改写，否则使用内置模板
+    REWRITE_USE_MODEL: bool = False
+    REWRITE_MODEL: str = "chat-model"
+    # 模型改写结果缓存，键由策略、语气、受众与内容摘要组成
+    REWRITE_CACHE: bool = True
+    REWRITE_CACHE_REDIS_PREFIX: str = "rewrite"
+    REWRITE_CACHE_TTL_SECONDS: int = 60 * 60 * 24
+    # 单条结果的大小上限（字节），超出时不缓存
+    REWRITE_CACHE_MAX_BYTES: int = 256 * 1024
+
     # 日志
     LOG_FORMAT: str = (
         '<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</> | <lvl>{level: <8}</> | <cyan>{correlation_id}</> | <lvl>{message}</>'
@@ -166,6 +246,100 @@ class Settings(BaseSettings):
     FASTAPI_STATIC_FILES: bool = True
     REQUEST_LIMITER_REDIS_PREFIX: str = "api-limiter"
 
+    # 按用户（JWT sub）的令牌桶限流，限额格式为 "次数/时间单位"（second/minute/hour/day），
+    # 次数即桶容量；未配置的名称不限流
+    RATE_LIMIT_REDIS_PREFIX: str = "rate-limit"
+    RATE_LIMITS: dict[str, str] = {
+        "chat": "20/minute",
+        "image_generation": "10/minute",
+        "content_rewrite": "30/minute",
+        # 批量改写按条目计数，容量不能小于 REWRITE_BATCH_MAX_ITEMS
+        "content_rewrite_batch": "300/minute",
+    }
+
+    # 聊天消息配额（Redis 滑动窗口）
+    CHAT_QUOTA_REDIS_PREFIX: str = "chat-quota"
+    # 与数据库计数对账的间隔（秒）
+    CHAT_QUOTA_RECONCILE_SECONDS: int = 600
+
+    # 聊天模型提供方：echo 为本地回显，openai 使用 OPENAI_BASE_URL/OPENAI_API_KEY
+    CHAT_PROVIDER: Literal["echo", "openai"] = "echo"
+    # 流式回复缓冲的增量数量，客户端读取过慢时据此对上游施加背压
+    CHAT_STREAM_BUFFER_SIZE: int = 64
+
+    # 按模型限制同时进行的生成数（单进程），未列出的模型使用默认值
+    CHAT_MODEL_CONCURRENCY: dict[str, int] = {
+        "chat-model": 32,
+        "chat-model-reasoning": 8,
+    }
+    CHAT_MODEL_DEFAULT_CONCURRENCY: int = 16
+    # 每个模型的最大排队数，超出时直接返回 rate_limit:chat
+    CHAT_MODEL_QUEUE_SIZE: int = 64
+    # 排队等待名额的最长时间（秒）
+    CHAT_ADMISSION_TIMEOUT_SECONDS: float = 10
+
+    # 后台生成聊天标题：首条消息先以截断文本作为占位标题，模型生成的标题随后更新
+    CHAT_TITLE_GENERATION: bool = False
+    CHAT_TITLE_MODEL: str = "chat-model"
+    CHAT_TITLE_MAX_LENGTH: int = 30
+    CHAT_TITLE_TIMEOUT_SECONDS: float = 20
+    # 同时进行的标题生成数（单进程）
+    CHAT_TITLE_CONCURRENCY: int = 4
+
+    # 模型回复缓存：上下文完全相同时直接重放已缓存的回复，请求头 X-Chat-Cache: bypass 可跳过
+    CHAT_RESPONSE_CACHE: bool = False
+    CHAT_RESPONSE_CACHE_REDIS_PREFIX: str = "chat-response"
+    CHAT_RESPONSE_CACHE_TTL_SECONDS: int = 60 * 60 * 24
+    # 单条回复的大小上限（字节）与缓存条目数上限
+    CHAT_RESPONSE_CACHE_MAX_BYTES: int = 32 * 1024
+    CHAT_RESPONSE_CACHE_MAX_ENTRIES: int = 10000
+
+    # 可续传的聊天流（Redis Stream）
+    CHAT_STREAM_REDIS_PREFIX: str = "chat-stream"
+    CHAT_STREAM_TTL_SECONDS: int = 300
+    CHAT_STREAM_MAXLEN: int = 5000
+    # 单次 XREAD 阻塞时长，需小于 REDIS_TIMEOUT
+    CHAT_STREAM_BLOCK_MS: int = 2000
+    CHAT_STREAM_IDLE_SECONDS: int = 60
+    # 客户端断开后等待续传连接接管的时间（秒），超时无人接管则取消生成
+    CHAT_DISCONNECT_GRACE_SECONDS: float = 10
+    # SSE 心跳间隔（秒），需小于反向代理的空闲超时
+    SSE_HEARTBEAT_SECONDS: float = 15
+    # 建议客户端断线后的重连间隔（毫秒）
+    SSE_RETRY_MS: int = 3000
+
+    # 聊天数据异步写入：消息先入队再由后台任务批量落库，首个回复片段无需等待数据库
+    CHAT_WRITE_BEHIND: bool = False
+    CHAT_WRITE_BEHIND_REDIS_KEY: str = "chat-write-behind"
+    # 进程内队列容量，已满时转存 Redis 列表
+    CHAT_WRITE_BEHIND_QUEUE_SIZE: int = 1000
+    CHAT_WRITE_BEHIND_BATCH_SIZE: int = 200
+    # 合并写入的等待时间（毫秒）
+    CHAT_WRITE_BEHIND_FLUSH_MS: int = 50
+    # 尚未落库的数据在 Redis 覆盖层中的保留时间（秒）
+    CHAT_WRITE_BEHIND_OVERLAY_SECONDS: int = 24 * 60 * 60
+    # 多次落库失败的单元的重放间隔（秒）与最多重放次数，用尽后转入死信列表
+    CHAT_WRITE_BEHIND_REPLAY_SECONDS: int = 300
+    CHAT_WRITE_BEHIND_MAX_REPLAYS: int = 3
+
+    # 聊天导出时每批读取的消息数
+    CHAT_EXPORT_BATCH_SIZE: int = 500
+
+    # 聊天历史分页缓存
+    HISTORY_CACHE_REDIS_PREFIX: str = "chat-history"
+    # 缓存的页数（每个用户的前 N 页）
+    HISTORY_CACHE_PAGES: int = 3
+    HISTORY_CACHE_TTL_SECONDS: int = 300
+
+    # 分词器：tiktoken 格式的 BPE 词表，未配置时按字符类别估算词元数
+    TOKENIZER_BPE_FILE: str | None = None
+    # 片段与消息词元数的缓存条数
+    TOKENIZER_CACHE_SIZE: int = 8192
+    # 发送给模型的上下文预算（词元），需为回复预留空间
+    CHAT_CONTEXT_TOKENS: int = 6144
+    # 参与上下文裁剪的最近消息条数
+    CHAT_CONTEXT_MAX_MESSAGES: int = 50
+
 
 
 settings = Settings()  # type: ignore
@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 
+import asyncio
+import contextlib
 import os
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
@@ -12,6 +14,11 @@ from starlette.middleware.cors import CORSMiddleware
 from starlette.staticfiles import StaticFiles
 from starlette.types import ASGIApp
 
+from app.services import chat_title, image_jobs, image_storage
+from app.api.errors import rate_limit_exceeded_handler
+from app.services.chat_generation import listen_for_stop_requests
+from app.services.rate_limit import RateLimitExceeded
+from app.services.write_behind import write_behind
 from common import __version__
 from common.log import set_custom_logfile, setup_logging
 from core.config import settings
@@ -19,7 +26,10 @@ from core.path_config import STATIC_DIR, UPLOAD_DIR
 from database.db import create_tables
 from database.redis import redis_client
 from middleware.access_middleware import AccessMiddleware
+from middleware.rate_limit_middleware import RateLimitHeaderMiddleware
 from utils.check import ensure_unique_route_names, http_limit_callback
+from utils.http_client import http_clients
+from utils.tokenizer import tokenizer
 
 
 @asynccontextmanager
@@ -36,6 +46,12 @@ async def register_init(_app: FastAPI) -> AsyncGenerator[None, None]:
     # 初始化 redis
     await redis_client.open()
 
+    # 初始化出站 HTTP 客户端
+    http_clients.open()
+
+    # 加载分词器词表
+    tokenizer.load(settings.TOKENIZER_BPE_FILE, cache_size=settings.TOKENIZER_CACHE_SIZE)
+
     # 初始化 limiter
     await FastAPILimiter.init(
         redis=redis_client,
@@ -43,11 +59,46 @@ async def register_init(_app: FastAPI) -> AsyncGenerator[None, None]:
         http_callback=http_limit_callback,
     )
 
+    # 订阅跨进程的停止生成通知
+    stop_listener = asyncio.create_task(listen_for_stop_requests())
+
+    # 启动聊天数据异步写入任务
+    write_behind_task = (
+        asyncio.create_task(write_behind.run()) if settings.CHAT_WRITE_BEHIND else None
+    )
+
+    # 启动图片生成任务工作协程
+    image_job_workers = (
+        asyncio.create_task(image_jobs.run_workers())
+        if settings.IMAGE_JOB_WORKERS > 0
+        else None
+    )
+
     # 创建操作日志任务
     # create_task(OperaLogMiddleware.consumer())
 
     yield
 
+    stop_listener.cancel()
+
+    # 执行中的图片生成任务会放回队列
+    if image_job_workers is not None:
+        image_job_workers.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await image_job_workers
+    await chat_title.shutdown()
+    image_storage.shutdown()
+
+    # 关闭前落库队列中剩余的写入
+    if write_behind_task is not None:
+        # 协作式停止，取消任务会丢失已取出但尚未落库的单元
+        write_behind.stop()
+        await write_behind_task
+        await write_behind.drain()
+
+    # 关闭出站 HTTP 连接
+    await http_clients.aclose()
+
     # 关闭 redis 连接
     await redis_client.aclose()
 
@@ -135,6 +186,10 @@ def register_middleware(app: FastAPI) -> None:
     # I18n
     # app.add_middleware(I18nMiddleware)
 
+    # Rate limit headers
+    app.add_middleware(RateLimitHeaderMiddleware)
+    app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
+
     # Access log
     app.add_middleware(AccessMiddleware)
 
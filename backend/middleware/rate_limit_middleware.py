@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+from fastapi import Request, Response
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+
+
+class RateLimitHeaderMiddleware(BaseHTTPMiddleware):
+    """限流响应头中间件"""
+
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+        """
+        将限流依赖的判定结果写入 ``X-RateLimit-*`` 与 ``Retry-After`` 响应头
+
+        :param request: FastAPI 请求对象
+        :param call_next: 下一个中间件或路由处理函数
+        :return:
+        """
+        response = await call_next(request)
+
+        result = getattr(request.state, 'rate_limit', None)
+        if result is not None:
+            response.headers['X-RateLimit-Limit'] = str(result.limit)
+            response.headers['X-RateLimit-Remaining'] = str(result.remaining)
+            response.headers['X-RateLimit-Reset'] = str(result.reset)
+            if not result.allowed:
+                response.headers['Retry-After'] = str(result.retry_after)
+
+        return response
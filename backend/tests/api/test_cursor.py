@@ -0,0 +1,47 @@
+import uuid
+from datetime import datetime
+
+import pytest
+
+from app.api.cursor import (
+    InvalidCursorError,
+    decode_cursor,
+    decode_score_cursor,
+    encode_cursor,
+    encode_score_cursor,
+)
+
+
+def test_cursor_round_trip() -> None:
+    created_at = datetime(2025, 1, 2, 3, 4, 5, 678901)
+    item_id = uuid.uuid4()
+    cursor = encode_cursor(created_at, item_id, scope="history")
+    decoded = decode_cursor(cursor, scope="history")
+    assert decoded.position == (created_at, item_id)
+    assert decoded.page == 0
+
+
+def test_cursor_carries_page() -> None:
+    cursor = encode_cursor(datetime(2025, 1, 1), uuid.uuid4(), scope="history", page=2)
+    assert decode_cursor(cursor, scope="history").page == 2
+
+
+def test_cursor_rejects_tampering() -> None:
+    cursor = encode_cursor(datetime(2025, 1, 1), uuid.uuid4(), scope="history")
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor[:-2] + "xx", scope="history")
+
+
+def test_cursor_is_bound_to_scope() -> None:
+    cursor = encode_cursor(datetime(2025, 1, 1), uuid.uuid4(), scope="history")
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, scope="messages")
+
+
+def test_score_cursor_round_trip() -> None:
+    item_id = uuid.uuid4()
+    cursor = encode_score_cursor(-0.125, item_id, scope="search")
+
+    assert decode_score_cursor(cursor, scope="search") == (-0.125, item_id)
+    with pytest.raises(InvalidCursorError):
+        decode_score_cursor(cursor, scope="history")
@@ -0,0 +1,74 @@
+import asyncio
+import uuid
+from datetime import datetime
+
+from fastapi.responses import JSONResponse
+
+from app.api.cursor import Cursor
+from app.api.routes.chat import _history_position, _merge_pending_messages
+from app.models import Message, MessageRole
+
+
+class ScalarSession:
+    def __init__(self, value: object) -> None:
+        self.value = value
+
+    async def scalar(self, _statement: object) -> object:
+        return self.value
+
+
+def test_unknown_legacy_anchor_is_not_found() -> None:
+    response = asyncio.run(
+        _history_position(ScalarSession(None), str(uuid.uuid4()), "ending_before")
+    )
+
+    assert isinstance(response, JSONResponse)
+    assert response.status_code == 404
+    assert b"not_found:chat" in response.body
+
+
+def test_legacy_anchor_uses_chat_created_at() -> None:
+    created_at = datetime(2025, 1, 1)
+    anchor_id = uuid.uuid4()
+
+    position = asyncio.run(
+        _history_position(ScalarSession(created_at), str(anchor_id), "starting_after")
+    )
+
+    assert position == ((created_at, anchor_id), None)
+
+
+def test_malformed_anchor_is_bad_request() -> None:
+    response = asyncio.run(
+        _history_position(ScalarSession(None), "not-a-cursor", "starting_after")
+    )
+
+    assert isinstance(response, JSONResponse)
+    assert response.status_code == 400
+
+
+def test_pending_messages_exclude_the_cursor_anchor() -> None:
+    chat_id = uuid.uuid4()
+    pending = [
+        Message(
+            id=uuid.uuid4(),
+            chat_id=chat_id,
+            role=MessageRole.USER,
+            parts=[],
+            attachments=[],
+            created_at=datetime(2025, 1, 1, 0, 0, second),
+        )
+        for second in range(3)
+    ]
+    anchor = pending[1]
+    cursor = Cursor(anchor.created_at, anchor.id)
+
+    before = _merge_pending_messages(
+        [], pending, cursor=cursor, ascending=False, limit=10
+    )
+    after = _merge_pending_messages(
+        [], pending, cursor=cursor, ascending=True, limit=10
+    )
+
+    assert before == [pending[0]]
+    assert after == [pending[2]]
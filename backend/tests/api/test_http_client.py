@@ -0,0 +1,92 @@
+import asyncio
+
+import httpx
+
+from utils.http_client import HttpClientRegistry
+
+
+def _registry() -> HttpClientRegistry:
+    return HttpClientRegistry(
+        http2=False,
+        max_connections_per_host=2,
+        max_keepalive_connections=2,
+        keepalive_expiry=30,
+        timeout=httpx.Timeout(5),
+    )
+
+
+async def _serve(connections: list[int]) -> asyncio.Server:
+    """最小的 HTTP/1.1 长连接服务，记录建立的连接数。"""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        connections.append(1)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.decode().split("\r\n"):
+                    name, _, value = line.partition(":")
+                    if name.lower() == "content-length":
+                        length = int(value)
+                if length:
+                    await reader.readexactly(length)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b'Content-Length: 11\r\n\r\n{"ok":true}'
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+def test_registry_reuses_connections_per_host() -> None:
+    connections: list[int] = []
+
+    async def run() -> None:
+        server = await _serve(connections)
+        port = server.sockets[0].getsockname()[1]
+        registry = _registry()
+        try:
+            for _ in range(5):
+                response = await registry.get(f"http://127.0.0.1:{port}/v1").post(
+                    f"http://127.0.0.1:{port}/v1/images", json={"prompt": "x"}
+                )
+                assert response.json() == {"ok": True}
+            assert registry.get(f"http://127.0.0.1:{port}/other") is registry.get(
+                f"http://127.0.0.1:{port}/v1"
+            )
+            assert registry.get("https://example.com") is not registry.get(
+                f"http://127.0.0.1:{port}"
+            )
+        finally:
+            await registry.aclose()
+            server.close()
+            await server.wait_closed()
+
+    asyncio.run(run())
+    assert len(connections) == 1
+
+
+def test_registry_caps_connections_per_host() -> None:
+    connections: list[int] = []
+
+    async def run() -> None:
+        server = await _serve(connections)
+        port = server.sockets[0].getsockname()[1]
+        registry = _registry()
+        client = registry.get(f"http://127.0.0.1:{port}")
+        try:
+            await asyncio.gather(
+                *(client.get(f"http://127.0.0.1:{port}/") for _ in range(10))
+            )
+        finally:
+            await registry.aclose()
+            server.close()
+            await server.wait_closed()
+
+    asyncio.run(run())
+    assert 1 <= len(connections) <= 2
@@ -0,0 +1,27 @@
+import asyncio
+from collections.abc import AsyncIterator
+
+from utils.sse import HEARTBEAT, encode_event, with_heartbeat
+
+
+def test_encode_event_fields() -> None:
+    frame = encode_event({"type": "text-delta", "delta": "你好"}, event_id="1-0")
+
+    assert frame == 'id: 1-0\ndata: {"type":"text-delta","delta":"你好"}\n\n'.encode()
+    assert encode_event(b'{"a":1}', event="usage") == b'event: usage\ndata: {"a":1}\n\n'
+    assert encode_event(retry=3000) == b"retry: 3000\n\n"
+
+
+def test_heartbeat_fills_idle_gaps() -> None:
+    async def slow() -> AsyncIterator[bytes]:
+        yield b"first"
+        await asyncio.sleep(0.05)
+        yield b"second"
+
+    async def collect() -> list[bytes]:
+        return [chunk async for chunk in with_heartbeat(slow(), 0.02)]
+
+    chunks = asyncio.run(collect())
+
+    assert chunks[0] == b"first" and chunks[-1] == b"second"
+    assert HEARTBEAT in chunks[1:-1]
@@ -0,0 +1,26 @@
+import asyncio
+import gzip
+from collections.abc import AsyncIterator
+
+from utils.stream_encoding import accepts_gzip, gzip_stream
+
+
+def test_accepts_gzip() -> None:
+    assert accepts_gzip("gzip, deflate, br")
+    assert accepts_gzip("br;q=1.0, *;q=0.5")
+    assert not accepts_gzip("gzip;q=0, identity")
+    assert not accepts_gzip(None)
+
+
+def test_gzip_stream_flushes_each_chunk() -> None:
+    async def lines() -> AsyncIterator[bytes]:
+        for index in range(3):
+            yield f'{{"n":{index}}}\n'.encode()
+
+    async def collect() -> list[bytes]:
+        return [chunk async for chunk in gzip_stream(lines())]
+
+    chunks = asyncio.run(collect())
+
+    assert len(chunks) == 4
+    assert gzip.decompress(b"".join(chunks)) == b'{"n":0}\n{"n":1}\n{"n":2}\n'
@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from app.services.admission import AdmissionRejected, ModelGate
+
+
+def test_gate_grants_released_slot_by_priority() -> None:
+    gate = ModelGate("test", limit=1, max_queue=2)
+    order: list[str] = []
+
+    async def worker(name: str, priority: int) -> None:
+        slot = await gate.acquire(priority, timeout=1)
+        order.append(name)
+        await asyncio.sleep(0.01)
+        slot.release()
+
+    async def run() -> None:
+        first = await gate.acquire(0, timeout=1)
+        waiters = [
+            asyncio.create_task(worker("guest", 1)),
+            asyncio.create_task(worker("regular", 0)),
+        ]
+        await asyncio.sleep(0)
+        assert gate.waiting == 2
+        first.release()
+        await asyncio.gather(*waiters)
+
+    asyncio.run(run())
+
+    assert order == ["regular", "guest"]
+    assert gate.active == 0 and gate.waiting == 0
+
+
+def test_gate_rejects_when_queue_full_or_deadline_passes() -> None:
+    gate = ModelGate("test", limit=1, max_queue=1)
+
+    async def run() -> None:
+        slot = await gate.acquire(0, timeout=1)
+        with pytest.raises(AdmissionRejected, match="timeout"):
+            await gate.acquire(0, timeout=0.01)
+        waiter = asyncio.create_task(gate.acquire(0, timeout=1))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected, match="queue_full"):
+            await gate.acquire(0, timeout=1)
+        slot.release()
+        (await waiter).release()
+
+    asyncio.run(run())
+
+    assert gate.active == 0 and gate.waiting == 0
@@ -0,0 +1,122 @@
+import asyncio
+import uuid
+from unittest.mock import AsyncMock, patch
+
+from msgspec import json
+
+from app.models import ChatModelId
+from app.services.chat_generation import ChatGeneration
+from app.services.llm import ChatProviderError, FakeChatProvider
+
+
+def _generation(provider: FakeChatProvider, buffer_size: int = 4) -> ChatGeneration:
+    return ChatGeneration(
+        chat_id=uuid.uuid4(),
+        user_id=uuid.uuid4(),
+        model=ChatModelId.CHAT_MODEL,
+        provider=provider,
+        messages=[{"role": "user", "content": "hi"}],
+        usage_builder=lambda completion: {"completion": completion},
+        buffer_size=buffer_size,
+    )
+
+
+async def _collect(
+    generation: ChatGeneration,
+) -> list[tuple[str | None, bytes]]:
+    generation.start()
+    return [event async for event in generation.events()]
+
+
+def test_generation_streams_deltas_and_persists_once() -> None:
+    provider = FakeChatProvider(["Hel", "lo", "!"])
+    generation = _generation(provider)
+    with (
+        patch(
+            "app.services.chat_generation.persist_assistant_reply", new=AsyncMock()
+        ) as persist,
+        patch("app.services.history_cache.invalidate", new=AsyncMock()),
+    ):
+        events = asyncio.run(_collect(generation))
+
+    frames = [json.decode(frame) for _, frame in events]
+    text_id = str(generation.message_id)
+    assert frames[0] == {"type": "text-start", "id": text_id}
+    assert [f["delta"] for f in frames if f["type"] == "text-delta"] == ["Hel", "lo", "!"]
+    assert [f["type"] for f in frames[-4:]] == [
+        "text-end",
+        "data-appendMessage",
+        "data-usage",
+        "finish",
+    ]
+    assert generation.text == "Hello!"
+    assert generation.usage == {"completion": "Hello!"}
+    persist.assert_awaited_once()
+    assert provider.calls[0][0] == ChatModelId.CHAT_MODEL
+
+
+def test_generation_reports_provider_error() -> None:
+    provider = FakeChatProvider(["partial"], error=ChatProviderError("boom"))
+    generation = _generation(provider)
+    with (
+        patch(
+            "app.services.chat_generation.persist_assistant_reply", new=AsyncMock()
+        ) as persist,
+        patch("app.services.history_cache.invalidate", new=AsyncMock()),
+    ):
+        events = asyncio.run(_collect(generation))
+
+    frames = [json.decode(frame) for _, frame in events]
+    assert {"type": "error", "errorText": "boom"} in frames
+    assert frames[-1] == {"type": "finish"}
+    persist.assert_awaited_once()
+
+
+def test_generation_applies_backpressure() -> None:
+    provider = FakeChatProvider([str(i) for i in range(10)])
+    generation = _generation(provider, buffer_size=2)
+
+    async def run() -> int:
+        generation.start()
+        await asyncio.sleep(0.05)
+        # 消费者尚未读取时，生产者最多领先缓冲区大小
+        produced = len(generation.text)
+        [event async for event in generation.events()]
+        return produced
+
+    with (
+        patch("app.services.chat_generation.persist_assistant_reply", new=AsyncMock()),
+        patch("app.services.history_cache.invalidate", new=AsyncMock()),
+    ):
+        produced = asyncio.run(run())
+
+    assert produced <= 3
+    assert generation.text == "0123456789"
+
+
+def test_abandoned_generation_is_cancelled_and_partial_reply_saved() -> None:
+    provider = FakeChatProvider([str(i) for i in range(100)], delay=0.01)
+    generation = _generation(provider)
+    generation.disconnect_grace = 0.05
+
+    async def run() -> None:
+        generation.start()
+        events = generation.events()
+        await anext(events)
+        await anext(events)
+        # 客户端断开：关闭事件迭代器，生成任务在宽限期后被取消
+        await events.aclose()
+        await generation._task
+
+    with (
+        patch(
+            "app.services.chat_generation.persist_assistant_reply", new=AsyncMock()
+        ) as persist,
+        patch("app.services.history_cache.invalidate", new=AsyncMock()),
+    ):
+        asyncio.run(run())
+
+    assert generation.cancel_reason == "disconnect"
+    assert 0 < len(generation.text) < 100
+    persist.assert_awaited_once()
+    assert persist.await_args.args[1].parts == [{"type": "text", "text": generation.text}]
@@ -0,0 +1,27 @@
+import asyncio
+
+from app.services import chat_title
+from app.services.llm import FakeChatProvider
+
+
+def test_placeholder_title_truncates_and_collapses_whitespace() -> None:
+    assert chat_title.placeholder_title("") == chat_title.DEFAULT_TITLE
+    assert chat_title.placeholder_title("  hello \n world ") == "hello world"
+    assert len(chat_title.placeholder_title("x" * 100)) == 30
+
+
+def test_clean_title_strips_quotes_and_punctuation() -> None:
+    assert chat_title.clean_title('\n"Trip planning."\nextra') == "Trip planning"
+    assert chat_title.clean_title("Title: 「旅行计划」。") == "旅行计划"
+    assert chat_title.clean_title("  \n ") == ""
+
+
+def test_generate_title_uses_title_prompt() -> None:
+    provider = FakeChatProvider(["Weekend ", "plans!"])
+
+    title = asyncio.run(chat_title.generate_title(provider, "what should I do"))
+
+    assert title == "Weekend plans"
+    ((_, messages),) = provider.calls
+    assert messages[0]["content"] == chat_title.TITLE_PROMPT
+    assert messages[1]["content"] == "what should I do"
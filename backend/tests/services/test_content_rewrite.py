@@ -0,0 +1,176 @@
+import asyncio
+
+import pytest
+
+from app.models import ContentRewriteRequest
+from app.services import content_rewrite
+from app.services.llm import FakeChatProvider
+from core.config import settings
+
+
+class DictRedis:
+    def __init__(self) -> None:
+        self.data: dict[str, str] = {}
+
+    async def get(self, key: str) -> str | None:
+        return self.data.get(key)
+
+    async def set(self, key: str, value: str, ex: int | None = None) -> None:
+        self.data[key] = value
+
+
+def test_rewrite_rejects_blank_content() -> None:
+    with pytest.raises(content_rewrite.ContentRewriteError):
+        asyncio.run(content_rewrite.rewrite(ContentRewriteRequest(originalContent=" ")))
+
+
+def test_get_strategy_dispatches_by_rewrite_type(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "REWRITE_USE_MODEL", False)
+    assert content_rewrite.get_strategy("fix_grammar").kind == "template"
+    assert content_rewrite.get_strategy("unknown") is content_rewrite.DEFAULT_TEMPLATE
+
+    monkeypatch.setattr(settings, "REWRITE_USE_MODEL", True)
+    strategy = content_rewrite.get_strategy("fix_grammar")
+    assert strategy.kind == "model"
+    assert strategy.name == "fix_grammar"
+    assert content_rewrite.get_strategy("unknown") is content_rewrite.DEFAULT_MODEL
+
+
+def test_template_strategies_keep_existing_output() -> None:
+    request = ContentRewriteRequest(
+        originalContent="x" * 201, rewriteType="make_concise"
+    )
+    assert asyncio.run(content_rewrite.rewrite(request)).rewrittenContent == (
+        "x" * 200 + "..."
+    )
+
+    request = ContentRewriteRequest(originalContent="hi", rewriteType="change_tone")
+    assert asyncio.run(content_rewrite.rewrite(request)).rewrittenContent == (
+        "friendly 语气的版本：hi"
+    )
+
+
+def test_cache_key_covers_strategy_tone_audience_and_content() -> None:
+    strategy = content_rewrite.MODEL_STRATEGIES["make_casual"]
+    request = ContentRewriteRequest(originalContent="hi", targetTone="warm")
+    key = content_rewrite.cache_key(strategy, request)
+
+    assert key == content_rewrite.cache_key(strategy, request.model_copy())
+    for changed in (
+        request.model_copy(update={"targetTone": "cold"}),
+        request.model_copy(update={"targetAudience": "kids"}),
+        request.model_copy(update={"originalContent": "hello"}),
+    ):
+        assert content_rewrite.cache_key(strategy, changed) != key
+    other = content_rewrite.MODEL_STRATEGIES["make_professional"]
+    assert content_rewrite.cache_key(other, request) != key
+
+
+def test_model_strategy_streams_and_caches_result(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    provider = FakeChatProvider(["Hey ", "there"])
+    strategy = content_rewrite.ModelStrategy(
+        "make_casual", "Make it casual.", provider_factory=lambda: provider
+    )
+    monkeypatch.setattr(content_rewrite, "redis_client", DictRedis())
+    monkeypatch.setattr(settings, "REWRITE_CACHE", True)
+    request = ContentRewriteRequest(
+        originalContent="Greetings", targetTone="warm", targetAudience="friends"
+    )
+
+    async def collect() -> list[str]:
+        return [d async for d in content_rewrite.stream_rewrite(strategy, request)]
+
+    assert asyncio.run(collect()) == ["Hey ", "there"]
+    assert asyncio.run(collect()) == ["Hey there"]
+    ((_, messages),) = provider.calls
+    assert "Make it casual." in messages[0]["content"]
+    assert "Target tone: warm" in messages[0]["content"]
+    assert "Target audience: friends" in messages[0]["content"]
+    assert messages[1]["content"] == "Greetings"
+
+
+def test_failed_model_stream_is_not_cached(monkeypatch: pytest.MonkeyPatch) -> None:
+    provider = FakeChatProvider(["partial"], error=RuntimeError("upstream"))
+    strategy = content_rewrite.ModelStrategy(
+        "make_casual", "Make it casual.", provider_factory=lambda: provider
+    )
+    redis = DictRedis()
+    monkeypatch.setattr(content_rewrite, "redis_client", redis)
+    monkeypatch.setattr(settings, "REWRITE_CACHE", True)
+    request = ContentRewriteRequest(originalContent="Greetings")
+
+    async def collect() -> list[str]:
+        return [d async for d in content_rewrite.stream_rewrite(strategy, request)]
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(collect())
+    assert redis.data == {}
+
+
+def test_rewrite_many_yields_in_completion_order_with_bounded_concurrency(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    running = 0
+    peak = 0
+
+    async def fake_rewrite(request: ContentRewriteRequest) -> object:
+        nonlocal running, peak
+        if not request.originalContent:
+            return await original(request)
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(float(request.originalContent) / 50)
+        running -= 1
+        return await original(request)
+
+    original = content_rewrite.rewrite
+    monkeypatch.setattr(content_rewrite, "rewrite", fake_rewrite)
+    requests = [ContentRewriteRequest(originalContent=str(d)) for d in (5, 1, 2, 1)]
+    requests.insert(2, ContentRewriteRequest(originalContent=""))
+
+    async def collect() -> list[dict]:
+        return [item async for item in content_rewrite.rewrite_many(requests, 2)]
+
+    results = asyncio.run(collect())
+
+    assert peak == 2
+    assert [item["index"] for item in results] == [1, 2, 3, 4, 0]
+    assert results[1] == {
+        "index": 2,
+        "success": False,
+        "error": "Original content is required",
+    }
+    assert results[0]["success"] is True
+    assert results[0]["rewrittenContent"] == "清晰表述：1"
+
+
+def test_rewrite_many_cancels_pending_items_when_closed(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    started = []
+
+    async def slow_rewrite(request: ContentRewriteRequest) -> object:
+        started.append(request.originalContent)
+        await asyncio.sleep(0 if request.originalContent == "fast" else 10)
+        return await original(request)
+
+    original = content_rewrite.rewrite
+    monkeypatch.setattr(content_rewrite, "rewrite", slow_rewrite)
+    requests = [
+        ContentRewriteRequest(originalContent=text) for text in ("fast", "slow", "slow")
+    ]
+
+    async def first() -> dict:
+        stream = content_rewrite.rewrite_many(requests, 2)
+        item = await anext(stream)
+        await stream.aclose()
+        return item
+
+    item = asyncio.run(asyncio.wait_for(first(), timeout=2))
+
+    assert item["index"] == 0
+    assert started == ["fast", "slow", "slow"]
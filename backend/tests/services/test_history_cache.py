@@ -0,0 +1,90 @@
+import asyncio
+import uuid
+
+import pytest
+
+from app.services import history_cache
+
+
+class VersionedRedis:
+    """按键保存字符串与哈希，``eval`` 按版本号脚本的语义执行。"""
+
+    def __init__(self) -> None:
+        self.strings: dict[str, str] = {}
+        self.hashes: dict[str, dict[str, str]] = {}
+
+    def pipeline(self, transaction: bool = True) -> "VersionedRedis.Pipeline":
+        return VersionedRedis.Pipeline(self)
+
+    async def eval(self, _script: str, _numkeys: int, *args: object) -> int:
+        cache_key, version_key, version, field, value, _ttl = args
+        if self.strings.get(version_key, "0") != version:
+            return 0
+        self.hashes.setdefault(cache_key, {})[field] = value
+        return 1
+
+    class Pipeline:
+        def __init__(self, redis: "VersionedRedis") -> None:
+            self.redis = redis
+            self.ops: list = []
+
+        async def __aenter__(self) -> "VersionedRedis.Pipeline":
+            return self
+
+        async def __aexit__(self, *_exc: object) -> None:
+            return None
+
+        def hget(self, key: str, field: str) -> None:
+            self.ops.append(lambda: self.redis.hashes.get(key, {}).get(field))
+
+        def get(self, key: str) -> None:
+            self.ops.append(lambda: self.redis.strings.get(key))
+
+        def incr(self, key: str) -> None:
+            def run() -> int:
+                value = int(self.redis.strings.get(key, "0")) + 1
+                self.redis.strings[key] = str(value)
+                return value
+
+            self.ops.append(run)
+
+        def expire(self, _key: str, _seconds: int) -> None:
+            self.ops.append(lambda: True)
+
+        def delete(self, key: str) -> None:
+            self.ops.append(lambda: self.redis.hashes.pop(key, None))
+
+        async def execute(self) -> list:
+            return [op() for op in self.ops]
+
+
+def test_write_after_invalidation_is_discarded(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(history_cache, "redis_client", VersionedRedis())
+    user_id = uuid.uuid4()
+
+    async def scenario() -> tuple:
+        cached, version = await history_cache.get_page(user_id, "10:")
+        # 读取数据库期间发生写操作
+        await history_cache.invalidate(user_id, "chat_created")
+        stale = await history_cache.set_page(user_id, "10:", {"chats": []}, version)
+        after_stale = await history_cache.get_page(user_id, "10:")
+
+        _, fresh_version = await history_cache.get_page(user_id, "10:")
+        fresh = await history_cache.set_page(
+            user_id, "10:", {"chats": [1]}, fresh_version
+        )
+        return (
+            cached,
+            stale,
+            after_stale[0],
+            fresh,
+            await history_cache.get_page(user_id, "10:"),
+        )
+
+    cached, stale, after_stale, fresh, final = asyncio.run(scenario())
+
+    assert cached is None
+    assert stale is False
+    assert after_stale is None
+    assert fresh is True
+    assert final == ('{"chats":[1]}', "1")
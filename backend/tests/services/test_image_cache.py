@@ -0,0 +1,41 @@
+import asyncio
+
+from redis.exceptions import ConnectionError
+
+from app.services import image_cache
+
+
+def test_cache_key_covers_all_generation_inputs() -> None:
+    key = image_cache.cache_key("cat, photorealistic", "1024x1024", "sd3", 222)
+
+    assert key == image_cache.cache_key("cat, photorealistic", "1024x1024", "sd3", 222)
+    assert key != image_cache.cache_key("cat, photorealistic", "768x1024", "sd3", 222)
+    assert key != image_cache.cache_key("cat, photorealistic", "1024x1024", "flux", 222)
+    assert key != image_cache.cache_key("cat, photorealistic", "1024x1024", "sd3", 1)
+
+
+class _OfflineRedis:
+    async def eval(self, *_args: object) -> list:
+        raise ConnectionError("offline")
+
+
+def test_store_reports_failure_so_files_can_be_removed(monkeypatch) -> None:
+    monkeypatch.setattr(image_cache, "redis_client", _OfflineRedis())
+
+    stored = asyncio.run(image_cache.store("digest", {"data": []}, ["a.png"], 10))
+
+    assert stored is None
+
+
+class _RegisteredRedis:
+    async def eval(self, *_args: object) -> list:
+        return [0, '{"data": [{"url": "/static/upload/generated/digest/a/0.png"}]}']
+
+
+def test_store_returns_the_entry_registered_by_another_worker(monkeypatch) -> None:
+    monkeypatch.setattr(image_cache, "redis_client", _RegisteredRedis())
+    result = {"data": [{"url": "/static/upload/generated/digest/b/0.png"}]}
+
+    stored = asyncio.run(image_cache.store("digest", result, ["b.png"], 10))
+
+    assert stored == {"data": [{"url": "/static/upload/generated/digest/a/0.png"}]}
@@ -0,0 +1,139 @@
+import asyncio
+from typing import Any
+
+import pytest
+
+from app.services import image_jobs
+from app.services.image_generation import ImageGenerationError
+
+
+def _job(**fields: Any) -> dict[str, Any]:
+    job = {
+        "id": "job-1",
+        "user_id": "user-1",
+        "status": image_jobs.QUEUED,
+        "prompt": "cat",
+        "style": "realistic",
+        "size": "1024x1024",
+        "created_at": "1.0",
+        "updated_at": "1.0",
+    }
+    job.update(fields)
+    return job
+
+
+def test_to_public_decodes_result() -> None:
+    payload = image_jobs.to_public(
+        _job(status=image_jobs.SUCCEEDED, result='{"data":[{"url":"u"}]}')
+    )
+    assert payload["jobId"] == "job-1"
+    assert payload["result"] == {"data": [{"url": "u"}]}
+    assert "error" not in payload
+
+
+class ListRedis:
+    """处理中列表与心跳用到的 Redis 命令的内存实现。"""
+
+    def __init__(self) -> None:
+        self.lists: dict[str, list[str]] = {}
+        self.sets: dict[str, set[str]] = {}
+        self.strings: dict[str, str] = {}
+
+    async def lrem(self, key: str, count: int, value: str) -> int:
+        values = self.lists.get(key, [])
+        if value in values:
+            values.remove(value)
+            return 1
+        return 0
+
+    async def lrange(self, key: str, start: int, end: int) -> list[str]:
+        return list(self.lists.get(key, []))
+
+    async def lmove(self, source: str, target: str, src: str, dest: str) -> str | None:
+        values = self.lists.get(source, [])
+        if not values:
+            return None
+        value = values.pop(0 if src == "LEFT" else -1)
+        target_values = self.lists.setdefault(target, [])
+        if dest == "LEFT":
+            target_values.insert(0, value)
+        else:
+            target_values.append(value)
+        return value
+
+    async def smembers(self, key: str) -> set[str]:
+        return set(self.sets.get(key, set()))
+
+    async def srem(self, key: str, member: str) -> int:
+        self.sets.get(key, set()).discard(member)
+        return 1
+
+    async def exists(self, key: str) -> int:
+        return int(key in self.strings)
+
+
+@pytest.fixture
+def redis(monkeypatch) -> ListRedis:
+    fake = ListRedis()
+    monkeypatch.setattr(image_jobs, "redis_client", fake)
+    return fake
+
+
+@pytest.fixture
+def updates(monkeypatch) -> list[dict[str, Any]]:
+    recorded: list[dict[str, Any]] = []
+
+    async def fake_get_job(_job_id: str) -> dict[str, Any]:
+        return _job()
+
+    async def fake_update(_job_id: str, **fields: Any) -> dict[str, Any]:
+        recorded.append(fields)
+        return _job(**fields)
+
+    monkeypatch.setattr(image_jobs, "get_job", fake_get_job)
+    monkeypatch.setattr(image_jobs, "_update", fake_update)
+    return recorded
+
+
+def test_process_records_success(monkeypatch, redis, updates) -> None:
+    async def fake_generate(prompt: str, *_: Any, **__: Any) -> dict[str, Any]:
+        return {"data": [{"url": prompt}]}
+
+    monkeypatch.setattr(image_jobs, "generate_image_with_ai", fake_generate)
+    redis.lists["processing"] = ["job-1"]
+    asyncio.run(image_jobs._process("job-1", "processing"))
+
+    assert [update["status"] for update in updates] == ["running", "succeeded"]
+    assert updates[-1]["result"] == '{"data":[{"url":"cat"}]}'
+    # 结束的任务移出处理中列表
+    assert redis.lists["processing"] == []
+
+
+@pytest.mark.usefixtures("redis")
+def test_process_records_failure(monkeypatch, updates) -> None:
+    async def fake_generate(*_: Any, **__: Any) -> dict[str, Any]:
+        raise ImageGenerationError("upstream down")
+
+    monkeypatch.setattr(image_jobs, "generate_image_with_ai", fake_generate)
+    asyncio.run(image_jobs._process("job-1", "processing"))
+
+    assert updates[-1] == {"status": "failed", "error": "upstream down"}
+
+
+def test_reaper_requeues_jobs_of_stale_consumers(redis, updates) -> None:
+    consumers = image_jobs._consumers_key()
+    redis.sets[consumers] = {"alive", "crashed"}
+    redis.strings[image_jobs._heartbeat_key("alive")] = "1"
+    redis.lists[image_jobs._processing_key("alive")] = ["job-2"]
+    # 处理中列表左侧是最近取出的任务
+    redis.lists[image_jobs._processing_key("crashed")] = ["job-1", "job-0"]
+    redis.lists[image_jobs._queue_key()] = ["job-9"]
+
+    assert asyncio.run(image_jobs.reap_stale_consumers()) == 2
+
+    # 队列从右侧取出，先取出的任务先被重新执行
+    assert redis.lists[image_jobs._queue_key()] == ["job-9", "job-1", "job-0"]
+    assert redis.lists[image_jobs._processing_key("crashed")] == []
+    assert redis.lists[image_jobs._processing_key("alive")] == ["job-2"]
+    assert redis.sets[consumers] == {"alive"}
+    assert updates == [{"status": "queued"}, {"status": "queued"}]
@@ -0,0 +1,98 @@
+import asyncio
+import io
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from app.services import image_storage
+from core.path_config import UPLOAD_DIR
+from utils.image_variants import build_variants
+
+
+def test_image_items_reads_images_and_data_fields() -> None:
+    result = {
+        "images": [{"url": "a"}],
+        "data": [{"url": "a"}, {"b64_json": "..."}],
+        "seed": 222,
+    }
+
+    assert [item["url"] for item in image_storage.image_items(result)] == ["a", "a"]
+
+
+def test_public_url_is_served_from_upload_dir() -> None:
+    path = image_storage.image_dir("abc") / "0.png"
+
+    assert image_storage.public_url(path) == "/static/upload/generated/abc/0.png"
+    assert (UPLOAD_DIR / "generated" / "abc" / "0.png") == path
+
+
+def test_media_type_drops_parameters() -> None:
+    assert image_storage._media_type("Image/JPEG; charset=binary") == "image/jpeg"
+    assert image_storage._media_type(None) == ""
+
+
+def test_build_variants_keeps_aspect_ratio_and_never_upscales(tmp_path: Path) -> None:
+    source = tmp_path / "0.png"
+    Image.new("RGB", (1024, 512), "red").save(source)
+
+    info = build_variants(str(source), str(tmp_path), {"thumbnail": 256, "large": 2048})
+
+    assert (info["width"], info["height"]) == (1024, 512)
+    thumbnail = info["variants"]["thumbnail"]
+    assert (thumbnail["width"], thumbnail["height"]) == (256, 128)
+    assert thumbnail["file"] == "0-thumbnail.webp"
+    assert thumbnail["bytes"] == (tmp_path / "0-thumbnail.webp").stat().st_size
+    with Image.open(tmp_path / "0-thumbnail.webp") as image:
+        assert image.format == "WEBP"
+    large = info["variants"]["large"]
+    assert (large["width"], large["height"]) == (1024, 512)
+
+
+def test_build_variants_converts_palette_images(tmp_path: Path) -> None:
+    source = tmp_path / "0.gif"
+    Image.new("P", (300, 300)).save(source)
+
+    info = build_variants(str(source), str(tmp_path), {"thumbnail": 100})
+
+    assert info["variants"]["thumbnail"]["width"] == 100
+
+
+def test_decompression_bomb_is_rejected_and_cleaned_up(monkeypatch, tmp_path) -> None:
+    buffer = io.BytesIO()
+    Image.new("RGB", (200, 200), "red").save(buffer, "PNG")
+
+    async def fake_download(_url: str) -> tuple[bytes, str]:
+        return buffer.getvalue(), "image/png"
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(image_storage, "UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(image_storage, "_download", fake_download)
+    monkeypatch.setattr(image_storage, "_pool", lambda: executor)
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 100)
+
+    with pytest.raises(image_storage.UnsafeImageError):
+        asyncio.run(image_storage.localize("bomb", {"data": [{"url": "http://x/0"}]}))
+    executor.shutdown()
+
+    assert not image_storage.image_dir("bomb").exists()
+
+
+def test_discard_keeps_files_written_by_other_requests(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(image_storage, "UPLOAD_DIR", tmp_path)
+    ours = image_storage.image_dir("abc") / "a"
+    theirs = image_storage.image_dir("abc") / "b"
+    for directory in (ours, theirs):
+        directory.mkdir(parents=True)
+        (directory / "0.png").write_bytes(b"png")
+
+    asyncio.run(image_storage.discard(["generated/abc/a/0.png"]))
+
+    assert not ours.exists()
+    assert (theirs / "0.png").is_file()
+
+    asyncio.run(image_storage.discard(["generated/abc/b/0.png"]))
+
+    assert not image_storage.image_dir("abc").exists()
+    assert (tmp_path / "generated").is_dir()
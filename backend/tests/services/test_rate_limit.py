@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+from redis.exceptions import RedisError
+
+from app.services import rate_limit
+
+
+class ScriptRedis:
+    def __init__(self, *replies: tuple[int, str] | Exception) -> None:
+        self.replies = list(replies)
+        self.calls: list[tuple] = []
+
+    async def eval(self, _script: str, _numkeys: int, *args: object) -> list:
+        self.calls.append(args)
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return list(reply)
+
+
+def make_limiter() -> rate_limit.TokenBucketLimiter:
+    return rate_limit.TokenBucketLimiter(
+        "image_generation", capacity=10, rate=1.0, prefix="rl"
+    )
+
+
+def test_parse_rate() -> None:
+    assert rate_limit.parse_rate("10/minute") == (10, 10 / 60)
+    assert rate_limit.parse_rate("5/seconds") == (5, 5.0)
+    with pytest.raises(ValueError):
+        rate_limit.parse_rate("10/fortnight")
+    with pytest.raises(ValueError):
+        rate_limit.parse_rate("0/minute")
+
+
+def test_every_allowed_request_is_charged_in_redis(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    redis = ScriptRedis((1, "9"), (1, "8"), (1, "3"))
+    monkeypatch.setattr(rate_limit, "redis_client", redis)
+    limiter = make_limiter()
+
+    async def run() -> list[rate_limit.RateLimitResult]:
+        return [
+            await limiter.hit("user"),
+            await limiter.hit("user"),
+            await limiter.hit("user", 5),
+        ]
+
+    results = asyncio.run(run())
+
+    assert all(result.allowed for result in results)
+    assert [result.remaining for result in results] == [9, 8, 3]
+    # 本地不放行请求，多个进程合计不会超出限额
+    assert redis.calls == [
+        ("rl:image_generation:user", 10, 1.0, 1),
+        ("rl:image_generation:user", 10, 1.0, 1),
+        ("rl:image_generation:user", 10, 1.0, 5),
+    ]
+
+
+def test_local_precheck_rejects_when_budget_cannot_have_refilled(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    redis = ScriptRedis((0, "0.25"))
+    monkeypatch.setattr(rate_limit, "redis_client", redis)
+    limiter = rate_limit.TokenBucketLimiter("chat", capacity=10, rate=0.01, prefix="rl")
+
+    async def run() -> list[rate_limit.RateLimitResult]:
+        return [await limiter.hit("user") for _ in range(3)]
+
+    first, *rest = asyncio.run(run())
+
+    assert not first.allowed
+    assert first.retry_after == 75
+    assert first.reset == 975
+    assert all(not result.allowed for result in rest)
+    assert len(redis.calls) == 1
+
+
+def test_redis_failure_allows_requests(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(rate_limit, "redis_client", ScriptRedis(RedisError("down")))
+
+    result = asyncio.run(make_limiter().hit("user"))
+
+    assert result.allowed
+    assert result.remaining == 10
@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+import pytest
+from redis.exceptions import ConnectionError
+
+from app.services import resilience
+from app.services.resilience import CircuitBreaker, LatencyTracker, ResiliencePolicy
+
+
+class _OfflineRedis:
+    async def hgetall(self, _key: str) -> dict[str, str]:
+        raise ConnectionError("offline")
+
+    async def eval(self, *_args: object) -> int:
+        raise ConnectionError("offline")
+
+    def pipeline(self, **_kwargs: object):
+        raise ConnectionError("offline")
+
+
+class _Flaky(Exception):
+    def __init__(self, retryable: bool) -> None:
+        self.retryable = retryable
+
+
+@pytest.fixture(autouse=True)
+def offline_redis(monkeypatch) -> None:
+    # Redis 不可用时熔断器放行全部调用，只验证重试与对冲
+    monkeypatch.setattr(resilience, "redis_client", _OfflineRedis())
+
+
+def _policy(**kwargs: object) -> ResiliencePolicy:
+    breaker = CircuitBreaker(
+        "test", prefix="test", failure_threshold=3, window_seconds=5, open_seconds=5
+    )
+    options = {"max_attempts": 3, "backoff_base": 0.001, "backoff_cap": 0.001}
+    options.update(kwargs)
+    return ResiliencePolicy(breaker, **options)
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    return isinstance(exc, _Flaky) and exc.retryable
+
+
+def test_retries_retryable_failures_until_success() -> None:
+    attempts: list[int] = []
+
+    async def call() -> str:
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise _Flaky(retryable=True)
+        return "ok"
+
+    result = asyncio.run(
+        _policy().run(call, deadline=time.monotonic() + 5, is_retryable=_is_retryable)
+    )
+    assert result == "ok"
+    assert len(attempts) == 3
+
+
+def test_does_not_retry_non_retryable_failures() -> None:
+    attempts: list[int] = []
+
+    async def call() -> str:
+        attempts.append(1)
+        raise _Flaky(retryable=False)
+
+    with pytest.raises(_Flaky):
+        asyncio.run(
+            _policy().run(
+                call, deadline=time.monotonic() + 5, is_retryable=_is_retryable
+            )
+        )
+    assert len(attempts) == 1
+
+
+def test_deadline_bounds_attempts() -> None:
+    async def call() -> str:
+        await asyncio.sleep(1)
+        return "late"
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        asyncio.run(
+            _policy().run(
+                call, deadline=time.monotonic() + 0.05, is_retryable=_is_retryable
+            )
+        )
+    assert time.monotonic() - started < 0.5
+
+
+def test_hedged_request_wins_when_primary_is_slow() -> None:
+    delays = [1.0, 0.01]
+
+    async def call() -> float:
+        delay = delays.pop(0)
+        await asyncio.sleep(delay)
+        return delay
+
+    policy = _policy(hedge_percentile=50, hedge_min_samples=1)
+    policy.latency.observe(0.02)
+    result = asyncio.run(
+        policy.run(call, deadline=time.monotonic() + 5, is_retryable=_is_retryable)
+    )
+    assert result == 0.01
+
+
+def test_latency_percentile_requires_samples() -> None:
+    tracker = LatencyTracker()
+    assert tracker.percentile(95, min_samples=2) is None
+    for value in range(1, 101):
+        tracker.observe(value / 100)
+    assert tracker.percentile(95, min_samples=2) == 0.96
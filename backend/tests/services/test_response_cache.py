@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from app.models import ChatModelId
+from app.services import response_cache
+from app.services.llm import ChatProviderError, FakeChatProvider
+
+
+async def _collect(provider) -> list[str]:
+    return [delta async for delta in provider.stream(ChatModelId.CHAT_MODEL, [])]
+
+
+def test_cache_key_normalizes_whitespace_and_depends_on_model() -> None:
+    messages = [{"role": "user", "content": "hello   world\n"}]
+    same = [{"role": "user", "content": "hello world"}]
+
+    key = response_cache.cache_key(ChatModelId.CHAT_MODEL, messages)
+    assert key == response_cache.cache_key(ChatModelId.CHAT_MODEL, same)
+    assert key != response_cache.cache_key(ChatModelId.CHAT_MODEL_REASONING, same)
+    assert key != response_cache.cache_key(
+        ChatModelId.CHAT_MODEL, [{"role": "assistant", "content": "hello world"}]
+    )
+
+
+def test_replay_provider_splits_reply_into_chunks() -> None:
+    provider = response_cache.ReplayChatProvider("abcdefg", chunk_size=3)
+    assert asyncio.run(_collect(provider)) == ["abc", "def", "g"]
+
+
+def test_caching_provider_stores_only_completed_replies(monkeypatch) -> None:
+    stored: list[tuple[str, str]] = []
+
+    async def fake_store(key: str, reply: str) -> None:
+        stored.append((key, reply))
+
+    monkeypatch.setattr(response_cache, "store_reply", fake_store)
+
+    ok = response_cache.CachingChatProvider(FakeChatProvider(["a", "b"]), "k1")
+    assert asyncio.run(_collect(ok)) == ["a", "b"]
+    assert stored == [("k1", "ab")]
+
+    failing = response_cache.CachingChatProvider(
+        FakeChatProvider(["a"], error=ChatProviderError("boom")), "k2"
+    )
+    with pytest.raises(ChatProviderError):
+        asyncio.run(_collect(failing))
+    assert stored == [("k1", "ab")]
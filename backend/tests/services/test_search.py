@@ -0,0 +1,16 @@
+from app.services.search import query_phrases
+from utils.search_text import build_snippet, to_search_text
+
+
+def test_search_text_splits_cjk_characters() -> None:
+    assert to_search_text("今天天气 Hello\nWorld") == "今 天 天 气 hello world"
+    assert query_phrases("天气  hiking 天气") == ["天 气", "hiking"]
+
+
+def test_snippet_highlights_match_near_window() -> None:
+    text = "a" * 100 + "天气很好" + "b" * 100
+    snippet = build_snippet(text, ["天气"], width=40)
+
+    start, end = snippet["highlights"][0]
+    assert snippet["text"].startswith("…") and snippet["text"].endswith("…")
+    assert snippet["text"][start:end] == "天气"
@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+from redis.exceptions import ConnectionError
+
+from app.services import single_flight
+from app.services.image_generation import ImageGenerationError, ImageProviderUnavailable
+from app.services.single_flight import SingleFlight
+
+
+class _OfflineRedis:
+    async def get(self, _key: str) -> None:
+        raise ConnectionError("offline")
+
+
+@pytest.fixture(autouse=True)
+def offline_redis(monkeypatch) -> None:
+    monkeypatch.setattr(single_flight, "redis_client", _OfflineRedis())
+
+
+def _flight() -> SingleFlight:
+    return SingleFlight("test", prefix="test", lock_seconds=5, result_seconds=5)
+
+
+def test_concurrent_calls_share_one_execution() -> None:
+    calls: list[int] = []
+
+    async def work() -> dict[str, int]:
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"value": len(calls)}
+
+    async def run() -> list[dict[str, int]]:
+        flight = _flight()
+        return await asyncio.gather(*(flight.do("k", work) for _ in range(5)))
+
+    assert asyncio.run(run()) == [{"value": 1}] * 5
+    assert calls == [1]
+
+
+def test_follower_timeout_does_not_cancel_leader() -> None:
+    async def work() -> str:
+        await asyncio.sleep(0.1)
+        return "done"
+
+    async def run() -> str:
+        flight = _flight()
+        leader = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0)
+        with pytest.raises(TimeoutError):
+            await flight.do("k", work, timeout=0.01)
+        return await leader
+
+    assert asyncio.run(run()) == "done"
+
+
+def test_errors_propagate_to_every_caller() -> None:
+    async def work() -> str:
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def run() -> list[object]:
+        flight = _flight()
+        return await asyncio.gather(
+            flight.do("k", work), flight.do("k", work), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+class _SharedRedis:
+    """两个进程共享的 Redis：锁、结果与广播。"""
+
+    def __init__(self) -> None:
+        self.values: dict[str, str] = {}
+        self.queues: dict[str, list[asyncio.Queue]] = {}
+
+    async def get(self, key: str) -> str | None:
+        return self.values.get(key)
+
+    async def set(self, key: str, value: str, **options: object) -> bool:
+        if options.get("nx") and key in self.values:
+            return False
+        self.values[key] = value
+        return True
+
+    async def exists(self, key: str) -> int:
+        return int(key in self.values)
+
+    async def eval(self, _script: str, _numkeys: int, key: str, token: str) -> int:
+        if self.values.get(key) == token:
+            del self.values[key]
+            return 1
+        return 0
+
+    async def publish(self, channel: str, payload: bytes) -> int:
+        for queue in self.queues.get(channel, []):
+            queue.put_nowait({"data": payload})
+        return len(self.queues.get(channel, []))
+
+    def pubsub(self, **_options: object) -> "_SharedRedis.PubSub":
+        return _SharedRedis.PubSub(self)
+
+    class PubSub:
+        def __init__(self, redis: "_SharedRedis") -> None:
+            self.redis = redis
+            self.queue: asyncio.Queue = asyncio.Queue()
+
+        async def subscribe(self, channel: str) -> None:
+            self.redis.queues.setdefault(channel, []).append(self.queue)
+
+        async def get_message(self, timeout: float) -> dict | None:
+            try:
+                return await asyncio.wait_for(self.queue.get(), timeout)
+            except TimeoutError:
+                return None
+
+        async def aclose(self) -> None:
+            return None
+
+
+def test_remote_follower_sees_leader_error_type(monkeypatch) -> None:
+    monkeypatch.setattr(single_flight, "redis_client", _SharedRedis())
+
+    def process() -> SingleFlight:
+        return SingleFlight(
+            "test",
+            prefix="test",
+            lock_seconds=5,
+            result_seconds=5,
+            error_type=ImageGenerationError,
+            error_types=(ImageGenerationError, ImageProviderUnavailable),
+        )
+
+    async def fail() -> str:
+        await asyncio.sleep(0.05)
+        raise ImageProviderUnavailable("offline", retryable=True)
+
+    async def never() -> str:
+        raise AssertionError("follower must not execute the call")
+
+    async def run() -> list[object]:
+        leader = asyncio.create_task(process().do("k", fail))
+        await asyncio.sleep(0.01)
+        follower = process().do("k", never)
+        return await asyncio.gather(leader, follower, return_exceptions=True)
+
+    leader_error, follower_error = asyncio.run(run())
+    assert isinstance(leader_error, ImageProviderUnavailable)
+    assert type(follower_error) is ImageProviderUnavailable
+    assert str(follower_error) == "offline"
+    assert follower_error.retryable is True
@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+from msgspec import json
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from app.services import stream_store
+
+
+class BrokenStreamRedis:
+    def __init__(self) -> None:
+        self.reads = 0
+
+    async def set(self, *_args: object, **_kwargs: object) -> None:
+        return None
+
+    async def xread(self, *_args: object, **_kwargs: object) -> list:
+        self.reads += 1
+        if self.reads == 1:
+            return [("s", [("1-0", {"frame": '{"type":"text-start"}', "final": "0"})])]
+        raise RedisConnectionError("lost")
+
+
+def test_follow_ends_with_error_frame_when_redis_fails(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(stream_store, "redis_client", BrokenStreamRedis())
+    stream = stream_store.RedisEventStream("s", maxlen=10, ttl=10)
+
+    async def collect() -> list[tuple[str, str]]:
+        return [item async for item in stream.follow(block_ms=10, idle_timeout=1)]
+
+    events = asyncio.run(collect())
+
+    assert events[0] == ("1-0", '{"type":"text-start"}')
+    event_id, frame = events[1]
+    assert event_id == ""
+    assert json.decode(frame)["type"] == "error"
@@ -0,0 +1,77 @@
+import base64
+import time
+import uuid
+
+from app.services.llm import MESSAGE_OVERHEAD_TOKENS, trim_history
+from utils.tokenizer import Tokenizer, tokenizer
+
+
+def test_estimate_counts_cjk_per_character() -> None:
+    counter = Tokenizer()
+
+    assert counter.count("今天天气很好") == 6
+    assert counter.count("hello world") == 2
+    assert counter.count("") == 0
+
+
+def test_bpe_merges_loaded_from_file(tmp_path) -> None:
+    ranks = [b"h", b"e", b"l", b"o", b"he", b"ll", b"hell", b"hello"]
+    path = tmp_path / "ranks.tiktoken"
+    path.write_text(
+        "\n".join(f"{base64.b64encode(token).decode()} {rank}" for rank, token in enumerate(ranks))
+    )
+    counter = Tokenizer()
+    counter.load(path)
+
+    assert counter.mode == "bpe"
+    assert counter.count("hello") == 1
+    assert counter.count("hellohe") == 2
+
+
+def test_bpe_long_cjk_run_scales(tmp_path) -> None:
+    # 中日韩字符串在预切分后是一个片段，合并次数随长度线性增长
+    ranks = [bytes([byte]) for byte in range(256)]
+    for char in "今天":
+        encoded = char.encode()
+        ranks += [encoded[:2], encoded]
+    ranks.append("今天".encode())
+    path = tmp_path / "ranks.tiktoken"
+    path.write_text(
+        "\n".join(f"{base64.b64encode(token).decode()} {rank}" for rank, token in enumerate(ranks))
+    )
+    counter = Tokenizer()
+    counter.load(path)
+
+    started = time.perf_counter()
+    assert counter.count("今天" * 1000) == 1000
+    assert time.perf_counter() - started < 0.2
+    assert counter.count("今天今") == 2
+
+
+def test_message_count_is_cached_and_fast() -> None:
+    counter = Tokenizer(cache_size=2)
+    message_id = uuid.uuid4()
+    text = "收到消息：今天的天气怎么样？ Let's plan a hiking trip. " * 20
+
+    started = time.perf_counter()
+    tokens = counter.count_message(message_id, text)
+    assert time.perf_counter() - started < 0.001 * 5
+
+    started = time.perf_counter()
+    assert counter.count_message(message_id, "ignored") == tokens
+    assert time.perf_counter() - started < 0.001
+
+
+def test_trim_history_keeps_newest_messages() -> None:
+    history = [
+        {"id": uuid.uuid4(), "role": "user", "content": "旧消息" * 50},
+        {"id": uuid.uuid4(), "role": "assistant", "content": "好的"},
+        {"id": uuid.uuid4(), "role": "user", "content": "新消息"},
+    ]
+    budget = 40
+
+    messages, used = trim_history(history, budget, system_prompt="system")
+
+    assert [message["content"] for message in messages] == ["system", "好的", "新消息"]
+    assert used == tokenizer.count("system") + 2 + 3 + 3 * MESSAGE_OVERHEAD_TOKENS
+    assert used <= budget
@@ -0,0 +1,221 @@
+import asyncio
+import uuid
+from datetime import datetime
+from typing import Any
+from unittest.mock import AsyncMock, patch
+
+from app.models import Chat, Message, MessageRole
+from app.services import write_behind
+from app.services.write_behind import WriteBehindQueue, _decode_unit
+
+
+class DictRedis:
+    """覆盖层与转存列表用到的 Redis 命令的内存实现。"""
+
+    def __init__(self) -> None:
+        self.strings: dict[str, str] = {}
+        self.hashes: dict[str, dict[str, str]] = {}
+        self.lists: dict[str, list[str]] = {}
+
+    def pipeline(self, transaction: bool = True) -> "DictRedis":
+        return self
+
+    async def __aenter__(self) -> "DictRedis":
+        return self
+
+    async def __aexit__(self, *_exc: object) -> None:
+        return None
+
+    async def execute(self) -> list[Any]:
+        return []
+
+    def set(self, key: str, value: str, ex: int | None = None) -> None:
+        self.strings[key] = value
+
+    def hset(self, key: str, mapping: dict[str, str]) -> None:
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    def expire(self, _key: str, _seconds: int) -> None:
+        return None
+
+    def delete(self, *keys: str) -> None:
+        for key in keys:
+            self.strings.pop(key, None)
+
+    def hdel(self, key: str, *fields: str) -> None:
+        for field in fields:
+            self.hashes.get(key, {}).pop(field, None)
+
+    async def get(self, key: str) -> str | None:
+        return self.strings.get(key)
+
+    async def hvals(self, key: str) -> list[str]:
+        return list(self.hashes.get(key, {}).values())
+
+    async def rpush(self, key: str, *values: str) -> int:
+        self.lists.setdefault(key, []).extend(values)
+        return len(self.lists[key])
+
+    async def lpop(self, key: str, count: int) -> list[str] | None:
+        values = self.lists.get(key, [])
+        popped, self.lists[key] = values[:count], values[count:]
+        return popped or None
+
+    async def llen(self, key: str) -> int:
+        return len(self.lists.get(key, []))
+
+
+def _chat_and_message() -> tuple[Chat, Message]:
+    chat = Chat(
+        id=uuid.uuid4(),
+        user_id=uuid.uuid4(),
+        title="t",
+        created_at=datetime(2025, 1, 1),
+    )
+    message = Message(
+        id=uuid.uuid4(),
+        chat_id=chat.id,
+        role=MessageRole.USER,
+        parts=[{"type": "text", "text": "你好"}],
+        attachments=[],
+        created_at=datetime(2025, 1, 1, 0, 0, 1),
+    )
+    return chat, message
+
+
+def test_full_queue_spills_to_redis_and_round_trips() -> None:
+    queue = WriteBehindQueue(maxsize=1, batch_size=10, flush_interval=0.01)
+    chat, message = _chat_and_message()
+    redis = DictRedis()
+
+    async def run() -> tuple:
+        await queue.submit(chat=chat)
+        await queue.submit(
+            messages=[message], context={"totalTokens": 1}, user_id=chat.user_id
+        )
+        return await queue.pending_chat(chat.id), await queue.pending_messages(chat.id)
+
+    with patch("app.services.write_behind.redis_client", redis):
+        pending_chat, pending_messages = asyncio.run(run())
+
+    [spilled] = redis.lists[queue.redis_key]
+    unit = _decode_unit(spilled)
+    assert unit["messages"][0]["id"] == message.id
+    assert unit["messages"][0]["search_text"] == "你 好"
+    assert unit["context"]["chat_id"] == chat.id
+    # 尚未落库的数据在覆盖层中可读
+    assert pending_chat is chat
+    assert [item.id for item in pending_messages] == [message.id]
+
+
+def test_other_workers_read_the_shared_overlay() -> None:
+    writer = WriteBehindQueue(maxsize=10, batch_size=10, flush_interval=0.01)
+    reader = WriteBehindQueue(maxsize=10, batch_size=10, flush_interval=0.01)
+    chat, message = _chat_and_message()
+
+    async def run() -> tuple:
+        await writer.submit(chat=chat, messages=[message])
+        return await reader.pending_chat(chat.id), await reader.pending_messages(
+            chat.id
+        )
+
+    with patch("app.services.write_behind.redis_client", DictRedis()):
+        pending_chat, pending_messages = asyncio.run(run())
+
+    assert pending_chat.id == chat.id
+    assert pending_chat.user_id == chat.user_id
+    assert [item.id for item in pending_messages] == [message.id]
+    assert pending_messages[0].created_at == message.created_at
+
+
+def test_flushed_units_leave_the_overlay() -> None:
+    queue = WriteBehindQueue(maxsize=10, batch_size=10, flush_interval=0.01)
+    chat, message = _chat_and_message()
+
+    async def run() -> tuple:
+        await queue.submit(chat=chat, messages=[message])
+        await queue._flush(await queue._next_batch())
+        return await queue.pending_chat(chat.id), await queue.pending_messages(chat.id)
+
+    with (
+        patch("app.services.write_behind.redis_client", DictRedis()),
+        patch("app.services.write_behind.async_db_session") as session,
+        patch("app.services.history_cache.invalidate", new=AsyncMock()) as invalidate,
+    ):
+        db = session.return_value.__aenter__.return_value
+        db.execute = AsyncMock()
+        db.commit = AsyncMock()
+        pending_chat, pending_messages = asyncio.run(run())
+
+    assert db.execute.await_count == 2
+    assert pending_chat is None
+    assert pending_messages == []
+    invalidate.assert_awaited_once_with(chat.user_id, "write_behind")
+
+
+def test_failed_units_are_replayed_then_dead_lettered() -> None:
+    queue = WriteBehindQueue(
+        maxsize=10, batch_size=10, flush_interval=0.01, max_replays=1
+    )
+    chat, _ = _chat_and_message()
+    redis = DictRedis()
+
+    async def fail_until_dead() -> None:
+        await queue.submit(chat=chat)
+        batch = await queue._next_batch()
+        # 每轮失败后单元转存 Redis，下一轮从 Redis 读取
+        for _ in range(write_behind.MAX_ATTEMPTS):
+            await queue._flush(batch)
+            batch = await queue._next_batch()
+        assert batch == []
+        assert await queue.pending_chat(chat.id) is not None
+
+        assert await queue.replay_failed() == 1
+        batch = await queue._next_batch()
+        assert batch[0]["replays"] == 1
+        assert batch[0]["attempts"] == 0
+        for _ in range(write_behind.MAX_ATTEMPTS):
+            await queue._flush(batch)
+            batch = await queue._next_batch()
+
+    with (
+        patch("app.services.write_behind.redis_client", redis),
+        patch.object(queue, "_flush_units", new=AsyncMock(return_value=False)),
+    ):
+        asyncio.run(fail_until_dead())
+
+    assert queue.failed_key not in redis.lists or not redis.lists[queue.failed_key]
+    [dead] = redis.lists[queue.dead_key]
+    assert _decode_unit(dead)["chat"]["id"] == chat.id
+    assert redis.strings == {}
+    assert write_behind.dead_units.value() == 1
+
+
+def test_stop_flushes_the_batch_being_collected() -> None:
+    queue = WriteBehindQueue(maxsize=10, batch_size=10, flush_interval=30)
+    chat, message = _chat_and_message()
+
+    async def shutdown_while_collecting() -> None:
+        task = asyncio.create_task(queue.run())
+        await queue.submit(chat=chat)
+        # 后台循环已取出第一个单元，正在等待合并后续写入
+        await asyncio.sleep(0.05)
+        assert queue._queue.empty()
+        await queue.submit(messages=[message])
+        queue.stop()
+        await asyncio.wait_for(task, timeout=1)
+        await queue.drain()
+
+    with (
+        patch("app.services.write_behind.redis_client", DictRedis()),
+        patch("app.services.write_behind.async_db_session") as session,
+        patch("app.services.history_cache.invalidate", new=AsyncMock()),
+    ):
+        db = session.return_value.__aenter__.return_value
+        db.execute = AsyncMock()
+        db.commit = AsyncMock()
+        asyncio.run(shutdown_while_collecting())
+
+    assert db.execute.await_count == 2
+    assert queue._chats == {}
+    assert queue._messages == {}
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+import importlib.util
+from urllib.parse import urlsplit
+
+import httpx
+
+from common.log import log
+from core.config import settings
+
+
+def _origin(url: str | httpx.URL) -> str:
+    """返回 URL 的源（协议、主机与端口），作为连接池的键"""
+    parts = urlsplit(str(url))
+    if not parts.scheme or not parts.hostname:
+        raise ValueError(f'无法从 {url!r} 解析主机')
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    return f'{parts.scheme}://{parts.hostname}:{port}'
+
+
+class HttpClientRegistry:
+    """
+    应用级出站 HTTP 客户端
+
+    每个目标主机复用一个 ``httpx.AsyncClient``，以其连接池上限作为单主机的连接数上限，
+    保持长连接以省去重复的 DNS 解析与 TCP/TLS 握手。
+    """
+
+    def __init__(
+        self,
+        *,
+        http2: bool,
+        max_connections_per_host: int,
+        max_keepalive_connections: int,
+        keepalive_expiry: float,
+        timeout: httpx.Timeout,
+    ) -> None:
+        self.http2 = http2
+        self.max_connections_per_host = max_connections_per_host
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self._clients: dict[str, httpx.AsyncClient] = {}
+
+    def open(self) -> None:
+        """检查 HTTP/2 依赖，未安装 h2 时退回 HTTP/1.1"""
+        if self.http2 and importlib.util.find_spec('h2') is None:
+            log.warning('未安装 h2（httpx[http2]），出站请求使用 HTTP/1.1')
+            self.http2 = False
+
+    def _create(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=self.max_connections_per_host,
+                max_keepalive_connections=min(
+                    self.max_keepalive_connections, self.max_connections_per_host
+                ),
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            timeout=self.timeout,
+        )
+
+    def get(self, url: str | httpx.URL) -> httpx.AsyncClient:
+        """
+        获取目标主机的客户端，首次访问时创建
+
+        :param url: 请求地址
+        :return:
+        """
+        origin = _origin(url)
+        client = self._clients.get(origin)
+        if client is None or client.is_closed:
+            client = self._create()
+            self._clients[origin] = client
+        return client
+
+    async def aclose(self) -> None:
+        """关闭全部客户端及其连接"""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
+
+
+# 创建出站 HTTP 客户端单例
+http_clients = HttpClientRegistry(
+    http2=settings.HTTP_CLIENT_HTTP2,
+    max_connections_per_host=settings.HTTP_CLIENT_MAX_CONNECTIONS_PER_HOST,
+    max_keepalive_connections=settings.HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=settings.HTTP_CLIENT_KEEPALIVE_EXPIRY_SECONDS,
+    timeout=httpx.Timeout(
+        connect=settings.HTTP_CLIENT_CONNECT_TIMEOUT_SECONDS,
+        read=settings.HTTP_CLIENT_READ_TIMEOUT_SECONDS,
+        write=settings.HTTP_CLIENT_WRITE_TIMEOUT_SECONDS,
+        pool=settings.HTTP_CLIENT_POOL_TIMEOUT_SECONDS,
+    ),
+)
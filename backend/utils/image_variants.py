@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+
+def build_variants(source: str, target_dir: str, sizes: dict[str, int], quality: int = 80) -> dict:
+    """
+    为图片生成等比缩放的 WebP 版本，在进程池中执行
+
+    :param source: 原图路径
+    :param target_dir: 输出目录
+    :param sizes: 版本名称到最长边像素的映射，原图更小时不放大
+    :param quality: WebP 质量
+    :return: 原图与各版本的尺寸及文件信息
+    """
+    directory = Path(target_dir)
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        result: dict = {'width': image.width, 'height': image.height, 'variants': {}}
+        for name, longest in sizes.items():
+            variant = image.copy()
+            variant.thumbnail((longest, longest), Image.Resampling.LANCZOS)
+            path = directory / f'{Path(source).stem}-{name}.webp'
+            variant.save(path, 'WEBP', quality=quality, method=4)
+            result['variants'][name] = {
+                'file': path.name,
+                'width': variant.width,
+                'height': variant.height,
+                'bytes': path.stat().st_size,
+            }
+    return result
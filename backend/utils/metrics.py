@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+import bisect
+import threading
+from collections.abc import Sequence
+from typing import Any
+
+LabelKey = tuple[tuple[str, str], ...]
+
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+)
+
+
+def _label_key(labels: dict[str, Any]) -> LabelKey:
+    """将标签转换为可哈希的有序元组"""
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _label_name(key: LabelKey) -> str:
+    """标签的可读形式，如 ``result=hit,route=history``"""
+    return ','.join(f'{name}={value}' for name, value in key)
+
+
+class _Metric:
+    """指标基类"""
+
+    kind = 'metric'
+
+    def __init__(self, name: str, description: str) -> None:
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> dict[str, Any]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, description: str) -> None:
+        super().__init__(name, description)
+        self._values: dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        """
+        增加计数
+
+        :param amount: 增量
+        :param labels: 标签
+        :return:
+        """
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        """读取指定标签的当前值"""
+        return self._values.get(_label_key(labels), 0)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {_label_name(key): value for key, value in self._values.items()}
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值"""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, description: str) -> None:
+        super().__init__(name, description)
+        self._values: dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels: Any) -> None:
+        """设置当前值"""
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        """增加当前值"""
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: Any) -> None:
+        """减少当前值"""
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: Any) -> float:
+        """读取指定标签的当前值"""
+        return self._values.get(_label_key(labels), 0)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {_label_name(key): value for key, value in self._values.items()}
+
+
+class Histogram(_Metric):
+    """分桶直方图，用于耗时等分布类指标"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, description: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, description)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[LabelKey, dict[str, Any]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        """
+        记录一次观测值
+
+        :param value: 观测值
+        :param labels: 标签
+        :return:
+        """
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = {'count': 0, 'sum': 0.0, 'counts': [0] * (len(self.buckets) + 1)}
+                self._series[key] = series
+            series['count'] += 1
+            series['sum'] += value
+            series['counts'][index] += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        result: dict[str, Any] = {}
+        with self._lock:
+            for key, series in self._series.items():
+                cumulative = 0
+                buckets: dict[str, int] = {}
+                for bound, count in zip([*self.buckets, float('inf')], series['counts'], strict=True):
+                    cumulative += count
+                    buckets[str(bound)] = cumulative
+                result[_label_name(key)] = {'count': series['count'], 'sum': series['sum'], 'buckets': buckets}
+        return result
+
+
+class MetricsRegistry:
+    """进程内指标注册表"""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if existing.kind != metric.kind:
+                    raise ValueError(f'Metric {metric.name} already registered as {existing.kind}')
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, description: str) -> Counter:
+        """获取或注册计数器"""
+        return self._register(Counter(name, description))
+
+    def gauge(self, name: str, description: str) -> Gauge:
+        """获取或注册瞬时值"""
+        return self._register(Gauge(name, description))
+
+    def histogram(self, name: str, description: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """获取或注册直方图"""
+        return self._register(Histogram(name, description, buckets))
+
+    def snapshot(self) -> dict[str, Any]:
+        """导出全部指标的当前值"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            metric.name: {'type': metric.kind, 'description': metric.description, 'values': metric.snapshot()}
+            for metric in metrics
+        }
+
+
+# 创建指标注册表单例
+metrics = MetricsRegistry()
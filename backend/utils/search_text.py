@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+import re
+from collections.abc import Sequence
+from typing import Any
+
+# 中日韩字符逐字切分，使 PostgreSQL simple 配置与 FTS5 unicode61 分词器都能按单字检索
+_CJK_PATTERN = re.compile(r'([぀-ヿ㐀-䶿一-鿿가-힯豈-﫿])')
+_SPACE_PATTERN = re.compile(r'\s+')
+
+# 单次查询的最大关键词数
+MAX_QUERY_TERMS = 8
+
+
+def extract_text(parts: Sequence[dict[str, Any]] | None) -> str:
+    """
+    提取消息片段中的文本内容
+
+    :param parts: 消息片段
+    :return:
+    """
+    texts: list[str] = []
+    for part in parts or ():
+        if part.get('type') == 'text':
+            text = str(part.get('text', '')).strip()
+            if text:
+                texts.append(text)
+    return ' '.join(texts)
+
+
+def to_search_text(text: str) -> str:
+    """
+    将文本规范化为索引文本：统一小写，中日韩字符之间插入空格
+
+    :param text: 原始文本
+    :return:
+    """
+    spaced = _CJK_PATTERN.sub(r' \1 ', text.casefold())
+    return _SPACE_PATTERN.sub(' ', spaced).strip()
+
+
+def split_query(query: str) -> list[str]:
+    """
+    按空白切分查询，去重后保留前 ``MAX_QUERY_TERMS`` 个关键词
+
+    :param query: 用户输入的查询
+    :return:
+    """
+    terms: list[str] = []
+    for term in query.split():
+        if term not in terms:
+            terms.append(term)
+    return terms[:MAX_QUERY_TERMS]
+
+
+def build_snippet(text: str, terms: Sequence[str], width: int = 80) -> dict[str, Any]:
+    """
+    截取首个命中位置附近的片段，并返回命中区间供前端高亮
+
+    高亮以字符区间返回而不是拼接 HTML 标签，前端无需处理转义。
+
+    :param text: 原始文本
+    :param terms: 查询关键词
+    :param width: 片段长度
+    :return: ``{"text": str, "highlights": [[start, end], ...]}``
+    """
+    pattern = '|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True) if term)
+    matches = list(re.finditer(pattern, text, re.IGNORECASE)) if pattern else []
+
+    start = 0
+    if matches and len(text) > width:
+        start = min(max(matches[0].start() - width // 4, 0), len(text) - width)
+    end = min(start + width, len(text))
+
+    prefix = '…' if start > 0 else ''
+    suffix = '…' if end < len(text) else ''
+    offset = len(prefix) - start
+    highlights = [
+        [max(match.start(), start) + offset, min(match.end(), end) + offset]
+        for match in matches
+        if match.start() < end and match.end() > start
+    ]
+    return {'text': f'{prefix}{text[start:end]}{suffix}', 'highlights': highlights}
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+import asyncio
+import contextlib
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Any
+
+from msgspec import json
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+
+# 心跳使用 SSE 注释行，浏览器 EventSource 会忽略
+HEARTBEAT = b': ping\n\n'
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'Connection': 'keep-alive',
+    # 关闭 Nginx 等反向代理的响应缓冲
+    'X-Accel-Buffering': 'no',
+}
+
+
+def encode_data(payload: Any) -> bytes:
+    """
+    将帧数据编码为 JSON 字节，已编码的数据原样返回
+
+    :param payload: 帧数据或已编码的 JSON
+    :return:
+    """
+    if isinstance(payload, bytes):
+        return payload
+    if isinstance(payload, str):
+        return payload.encode()
+    return json.encode(payload)
+
+
+def encode_event(
+    payload: Any = None,
+    *,
+    event_id: str | None = None,
+    event: str | None = None,
+    retry: int | None = None,
+) -> bytes:
+    """
+    构造一个 SSE 事件
+
+    :param payload: 帧数据，``bytes``/``str`` 视为已编码的 JSON
+    :param event_id: 事件ID，客户端重连时以 ``Last-Event-ID`` 带回
+    :param event: 事件类型
+    :param retry: 建议的重连间隔（毫秒）
+    :return:
+    """
+    lines: list[bytes] = []
+    if event_id:
+        lines.append(b'id: ' + event_id.encode())
+    if event:
+        lines.append(b'event: ' + event.encode())
+    if retry is not None:
+        lines.append(b'retry: %d' % retry)
+    if payload is not None:
+        # JSON 中的换行已转义，只有外部传入的多行文本需要拆分为多个 data 行
+        lines.extend(b'data: ' + line for line in encode_data(payload).split(b'\n'))
+    return b'\n'.join(lines) + b'\n\n'
+
+
+def encode_comment(comment: str) -> bytes:
+    """构造 SSE 注释行"""
+    return b''.join(b': ' + line.encode() + b'\n' for line in comment.split('\n')) + b'\n'
+
+
+async def with_heartbeat(
+    source: AsyncIterator[bytes],
+    interval: float,
+    *,
+    is_disconnected: Callable[[], Awaitable[bool]] | None = None,
+    poll_interval: float = 1.0,
+) -> AsyncIterator[bytes]:
+    """
+    在事件间隔超过 ``interval`` 秒时插入心跳注释，防止代理断开空闲连接
+
+    传入 ``is_disconnected`` 时，等待事件期间每 ``poll_interval`` 秒检查一次客户端是否断开，
+    断开后停止并关闭事件源。
+
+    :param source: 已编码的事件流
+    :param interval: 心跳间隔（秒），不大于 0 时不发送心跳
+    :param is_disconnected: 检查客户端是否断开的回调
+    :param poll_interval: 检查断开的间隔（秒）
+    :return:
+    """
+    timeouts = [value for value in (interval, poll_interval if is_disconnected else 0) if value > 0]
+    if not timeouts:
+        async for chunk in source:
+            yield chunk
+        return
+
+    iterator = aiter(source)
+    pending: asyncio.Task[bytes] | None = None
+    last_sent = time.monotonic()
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(anext(iterator))
+            done, _ = await asyncio.wait({pending}, timeout=min(timeouts))
+            if not done:
+                if is_disconnected is not None and await is_disconnected():
+                    return
+                if interval > 0 and time.monotonic() - last_sent >= interval:
+                    last_sent = time.monotonic()
+                    yield HEARTBEAT
+                continue
+            pending = None
+            try:
+                chunk = done.pop().result()
+            except StopAsyncIteration:
+                return
+            last_sent = time.monotonic()
+            yield chunk
+    finally:
+        if pending is not None:
+            pending.cancel()
+            with contextlib.suppress(asyncio.CancelledError, StopAsyncIteration):
+                await pending
+        aclose = getattr(iterator, 'aclose', None)
+        if aclose is not None:
+            await aclose()
+
+
+def sse_response(
+    source: AsyncIterator[bytes],
+    *,
+    heartbeat: float = 0,
+    retry: int | None = None,
+    request: Request | None = None,
+) -> StreamingResponse:
+    """
+    构造 SSE 响应
+
+    :param source: 已编码的事件流
+    :param heartbeat: 心跳间隔（秒）
+    :param retry: 首个事件前下发的重连间隔（毫秒）
+    :param request: 当前请求，传入时轮询客户端是否断开
+    :return:
+    """
+
+    async def body() -> AsyncIterator[bytes]:
+        if retry is not None:
+            yield encode_event(retry=retry)
+        is_disconnected = request.is_disconnected if request is not None else None
+        async for chunk in with_heartbeat(source, heartbeat, is_disconnected=is_disconnected):
+            yield chunk
+
+    return StreamingResponse(body(), media_type='text/event-stream', headers=SSE_HEADERS)
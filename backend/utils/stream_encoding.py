@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+import zlib
+from collections.abc import AsyncIterator
+
+
+def accepts_gzip(accept_encoding: str | None) -> bool:
+    """
+    判断客户端是否接受 gzip 编码
+
+    :param accept_encoding: ``Accept-Encoding`` 请求头
+    :return:
+    """
+    if not accept_encoding:
+        return False
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        if coding.strip().lower() not in ('gzip', '*'):
+            continue
+        # 显式声明 q=0 表示拒绝
+        quality = params.strip().removeprefix('q=').strip()
+        if quality and quality.replace('.', '', 1).isdigit() and float(quality) == 0:
+            continue
+        return True
+    return False
+
+
+async def gzip_stream(source: AsyncIterator[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    """
+    以流式 gzip 压缩字节流，每个分块压缩后立即刷出，内存占用与数据总量无关
+
+    :param source: 原始字节流
+    :param level: 压缩级别
+    :return:
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    async for chunk in source:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
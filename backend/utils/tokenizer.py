@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+import base64
+import heapq
+import re
+import threading
+from collections import OrderedDict
+from collections.abc import Hashable
+from functools import lru_cache
+from pathlib import Path
+
+from common.log import log
+
+_CJK = '぀-ヿ㐀-䶿一-鿿가-힯豈-﫿'
+
+# 预切分规则，与 GPT/Qwen 系列分词器的切分方式近似：中日韩字符串、英文单词、三位以内数字、标点与空白
+_PIECE_PATTERN = re.compile(
+    rf"[{_CJK}]+|'(?:s|t|re|ve|m|ll|d)| ?[^\W\d_{_CJK}]+| ?\d{{1,3}}| ?[^\s\w{_CJK}]+|\s+",
+    re.IGNORECASE,
+)
+_CJK_PATTERN = re.compile(rf'[{_CJK}]')
+
+
+def _estimate_piece(piece: str) -> int:
+    """未加载词表时按经验值估算单个片段的词元数"""
+    if _CJK_PATTERN.match(piece):
+        # 常用汉字基本是一字一词元
+        return len(piece)
+    if piece.isspace():
+        return 1 if len(piece) > 1 else 0
+    stripped = piece.lstrip()
+    if stripped[:1].isdigit():
+        return 1
+    if stripped[:1].isalpha() or stripped[:1] == "'":
+        # 常见英文单词为一个词元，长词约每 6 个字符一个词元
+        return max(1, (len(stripped) + 5) // 6)
+    return max(1, (len(stripped) + 1) // 2)
+
+
+def _bpe_merge_count(ranks: dict[bytes, int], piece: bytes) -> int:
+    """
+    按合并优先级对字节序列做 BPE，返回合并后的词元数
+
+    候选相邻对放入最小堆，按（优先级, 位置）取出，与逐轮扫描选取最左侧最小优先级的结果一致；
+    片段以双向链表维护，合并后只需重新计算两侧的相邻对，复杂度为 O(n log n)。
+
+    :param ranks: 词元到合并优先级的映射
+    :param piece: 字节序列
+    :return:
+    """
+    size = len(piece)
+    if size < 2:
+        return size
+    parts = [piece[index : index + 1] for index in range(size)]
+    prev = list(range(-1, size - 1))
+    next_ = list(range(1, size + 1))
+    # 片段被合并或改写时递增，用于识别堆中过期的候选
+    versions = [0] * size
+    heap: list[tuple[int, int, int, int, int]] = []
+
+    def push(left: int) -> None:
+        right = next_[left]
+        if right >= size:
+            return
+        rank = ranks.get(parts[left] + parts[right])
+        if rank is not None:
+            heapq.heappush(heap, (rank, left, right, versions[left], versions[right]))
+
+    for index in range(size - 1):
+        push(index)
+
+    count = size
+    while heap:
+        _, left, right, left_version, right_version = heapq.heappop(heap)
+        if versions[left] != left_version or versions[right] != right_version:
+            continue
+        parts[left] += parts[right]
+        versions[left] += 1
+        # 被并入左侧的片段不再出现在链表中
+        versions[right] += 1
+        following = next_[right]
+        next_[left] = following
+        if following < size:
+            prev[following] = left
+        count -= 1
+        if prev[left] >= 0:
+            push(prev[left])
+        push(left)
+    return count
+
+
+def _bpe_piece_counter(ranks: dict[bytes, int], cache_size: int):
+    """构造基于合并优先级的 BPE 片段计数函数，结果按片段缓存"""
+
+    @lru_cache(maxsize=cache_size)
+    def count(piece: str) -> int:
+        return _bpe_merge_count(ranks, piece.encode())
+
+    return count
+
+
+class Tokenizer:
+    """
+    纯 Python 实现的词元计数器
+
+    加载 tiktoken 格式的词表（每行 ``base64(token) rank``）后按字节级 BPE 计数；
+    未配置词表时退化为按字符类别估算。消息的计数结果以消息ID为键缓存。
+    """
+
+    def __init__(self, cache_size: int = 4096) -> None:
+        self.cache_size = cache_size
+        self._count_piece = lru_cache(maxsize=cache_size)(_estimate_piece)
+        self._messages: OrderedDict[Hashable, int] = OrderedDict()
+        self._lock = threading.Lock()
+        self.mode = 'estimate'
+
+    def load(self, path: str | Path | None, *, cache_size: int | None = None) -> None:
+        """
+        加载 BPE 词表
+
+        :param path: 词表文件路径，为空时使用估算
+        :param cache_size: 缓存条数
+        :return:
+        """
+        if cache_size is not None:
+            self.cache_size = cache_size
+        ranks: dict[bytes, int] = {}
+        if path:
+            with open(path, 'rb') as file:
+                for line in file:
+                    if not line.strip():
+                        continue
+                    token, rank = line.split()
+                    ranks[base64.b64decode(token)] = int(rank)
+        with self._lock:
+            if ranks:
+                self._count_piece = _bpe_piece_counter(ranks, self.cache_size)
+                self.mode = 'bpe'
+            else:
+                self._count_piece = lru_cache(maxsize=self.cache_size)(_estimate_piece)
+                self.mode = 'estimate'
+            self._messages.clear()
+        log.info('分词器已加载：{}（{} 个词元）', self.mode, len(ranks))
+
+    def count(self, text: str) -> int:
+        """
+        计算文本的词元数
+
+        :param text: 文本
+        :return:
+        """
+        count_piece = self._count_piece
+        return sum(count_piece(piece) for piece in _PIECE_PATTERN.findall(text))
+
+    def count_message(self, key: Hashable, text: str) -> int:
+        """
+        计算消息的词元数，结果按消息ID缓存
+
+        :param key: 消息ID
+        :param text: 消息文本
+        :return:
+        """
+        with self._lock:
+            cached = self._messages.get(key)
+            if cached is not None:
+                self._messages.move_to_end(key)
+                return cached
+        tokens = self.count(text)
+        with self._lock:
+            self._messages[key] = tokens
+            if len(self._messages) > self.cache_size:
+                self._messages.popitem(last=False)
+        return tokens
+
+
+# 创建分词器单例
+tokenizer = Tokenizer()